@@ -0,0 +1,217 @@
+import ast
+import json
+import sqlite3
+import logging
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+from database.topology import load_topology
+from database.connection import get_database
+
+def setup_adjacency_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS region_adjacency (
+            region_a INTEGER NOT NULL,
+            region_b INTEGER NOT NULL,
+            border_len REAL NOT NULL,
+            PRIMARY KEY (region_a, region_b)
+        )
+    ''')
+    # Reverse index so lookups by either end of an edge use an index
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_region_adjacency_b ON region_adjacency (region_b, region_a)')
+
+def adjacency_lists(pairs, region_ids):
+    """Expand an edge list into {region_id: sorted neighbour ids} for every region id."""
+    adjacency = {int(region_id): [] for region_id in region_ids}
+    for a, b in np.asarray(pairs, dtype=np.int64).reshape(-1, 2).tolist():
+        adjacency.setdefault(a, []).append(b)
+        adjacency.setdefault(b, []).append(a)
+    return {region_id: sorted(neighbours) for region_id, neighbours in adjacency.items()}
+
+def store_adjacency(db_path, pairs, border_lengths):
+    """
+    Replace the weighted region edge list.
+
+    Parameters:
+        db_path (str): Path to the SQLite database.
+        pairs (ndarray): (k, 2) region ids with region_a < region_b.
+        border_lengths (ndarray): (k,) shared border length of each pair.
+    """
+    def write(conn):
+        cursor = conn.cursor()
+        setup_adjacency_table(cursor)
+        cursor.execute('DELETE FROM region_adjacency')
+        cursor.executemany('INSERT INTO region_adjacency (region_a, region_b, border_len) VALUES (?, ?, ?)',
+                           zip(*np.asarray(pairs, dtype=np.int64).reshape(-1, 2).T.tolist(),
+                               np.asarray(border_lengths, dtype=np.float64).tolist()))
+
+    try:
+        get_database(db_path).write(write)
+        logging.info(f"Stored {len(pairs)} region adjacency edges.")
+    except sqlite3.Error as e:
+        logging.error(f"Error storing region adjacency in DB: {e}")
+
+def update_adjacency(db_path, region_ids, pairs, border_lengths):
+    """
+    Replace the edges of some regions.
+
+    region_adjacency is the only stored adjacency; the legacy
+    regions.adjacent_regions column is no longer written and is only read by
+    the migration that fills region_adjacency.
+
+    Parameters:
+        db_path (str): Path to the SQLite database.
+        region_ids (iterable): Regions whose edges are replaced, including removed ones.
+        pairs (ndarray): (k, 2) new edges of those regions with region_a < region_b.
+        border_lengths (ndarray): (k,) shared border length of each pair.
+
+    Returns:
+        dict: {region_id: sorted neighbour ids} of every existing region the edges touch.
+    """
+    region_ids = sorted(int(region_id) for region_id in region_ids)
+    pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+    placeholders = ', '.join('?' * len(region_ids))
+
+    def write(conn):
+        cursor = conn.cursor()
+        setup_adjacency_table(cursor)
+        touched = set(region_ids) | set(pairs.ravel().tolist())
+        touched.update(value for row in cursor.execute(
+            f'SELECT region_a, region_b FROM region_adjacency WHERE region_a IN ({placeholders}) OR region_b IN ({placeholders})',
+            region_ids + region_ids) for value in row)
+        cursor.execute(f'DELETE FROM region_adjacency WHERE region_a IN ({placeholders}) OR region_b IN ({placeholders})',
+                       region_ids + region_ids)
+        cursor.executemany('INSERT INTO region_adjacency (region_a, region_b, border_len) VALUES (?, ?, ?)',
+                           zip(*pairs.T.tolist(), np.asarray(border_lengths, dtype=np.float64).tolist()))
+
+        touched = sorted(touched)
+        touched_placeholders = ', '.join('?' * len(touched))
+        existing = [row[0] for row in cursor.execute(
+            f'SELECT region_id FROM regions WHERE region_id IN ({touched_placeholders})', touched)]
+        rows = cursor.execute(
+            f'SELECT region_a, region_b FROM region_adjacency WHERE region_a IN ({touched_placeholders}) OR region_b IN ({touched_placeholders})',
+            touched + touched).fetchall()
+        adjacency = adjacency_lists(rows, existing)
+        return {region_id: adjacency[region_id] for region_id in existing}
+
+    try:
+        adjacency = get_database(db_path).write(write)
+        logging.info(f"Replaced region adjacency of {len(region_ids)} regions with {len(pairs)} edges.")
+        return adjacency
+    except sqlite3.Error as e:
+        logging.error(f"Error updating region adjacency in DB: {e}")
+        return {}
+
+def load_adjacency(db_path):
+    """Return (pairs, border_lengths) arrays of the stored weighted edge list; empty on error."""
+    rows = []
+    try:
+        with get_database(db_path).read() as conn:
+            rows = conn.execute('SELECT region_a, region_b, border_len FROM region_adjacency ORDER BY region_a, region_b').fetchall()
+    except sqlite3.Error as e:
+        logging.error(f"Error loading region adjacency from DB: {e}")
+    edges = np.array(rows, dtype=np.float64).reshape(-1, 3)
+    return edges[:, :2].astype(np.int64), edges[:, 2]
+
+def load_adjacency_csr(db_path, num_regions=None):
+    """
+    Load the region graph with one query as a symmetric CSR matrix indexed by region id.
+
+    Row and column 0 are unused so region ids index the matrix directly; entries
+    hold the shared border length.
+    """
+    pairs, border_lengths = load_adjacency(db_path)
+    size = int(max(num_regions or 0, pairs.max(initial=0))) + 1
+    rows, cols = np.concatenate((pairs[:, 0], pairs[:, 1])), np.concatenate((pairs[:, 1], pairs[:, 0]))
+    return csr_matrix((np.concatenate((border_lengths, border_lengths)), (rows, cols)), shape=(size, size))
+
+def adjacency_components(db_path):
+    """Return an array of connected-component ids indexed by region id."""
+    graph = load_adjacency_csr(db_path)
+    _, components = connected_components(graph, directed=False)
+    return components
+
+def neighbour_ids(cursor, region_id):
+    """Return the sorted neighbours of one region from the edge table."""
+    rows = cursor.execute('''
+        SELECT region_b FROM region_adjacency WHERE region_a = ?
+        UNION SELECT region_a FROM region_adjacency WHERE region_b = ?
+        ORDER BY 1
+    ''', (region_id, region_id)).fetchall()
+    return [row[0] for row in rows]
+
+def region_neighbourhood(db_path, region_id, depth=2):
+    """
+    Return {region_id: steps} of every region within depth adjacency steps.
+
+    The walk runs in SQL as a recursive query over both indexes of region_adjacency.
+    Returns an empty dict on error.
+    """
+    try:
+        with get_database(db_path).read() as conn:
+            rows = conn.execute('''
+                WITH RECURSIVE reach(region_id, steps) AS (
+                    SELECT ?, 0
+                    UNION
+                    SELECT CASE WHEN a.region_a = reach.region_id THEN a.region_b ELSE a.region_a END, reach.steps + 1
+                    FROM reach JOIN region_adjacency AS a ON a.region_a = reach.region_id OR a.region_b = reach.region_id
+                    WHERE reach.steps < ?
+                )
+                SELECT region_id, MIN(steps) FROM reach GROUP BY region_id ORDER BY 2, 1
+            ''', (int(region_id), int(depth))).fetchall()
+    except sqlite3.Error as e:
+        logging.error(f"Error walking the neighbourhood of region {region_id}: {e}")
+        return {}
+    return dict(rows)
+
+def parse_adjacent_regions(text):
+    """Parse a legacy adjacent_regions value, stored as JSON or as a Python list literal."""
+    if not text:
+        return []
+    try:
+        return [int(region_id) for region_id in json.loads(text)]
+    except (ValueError, TypeError):
+        return [int(region_id) for region_id in ast.literal_eval(text)]
+
+def copy_adjacent_regions_column(cursor, border_lengths=None):
+    """
+    Fill an empty region_adjacency table from the legacy regions.adjacent_regions column.
+
+    Parameters:
+        cursor (sqlite3.Cursor): Cursor inside the caller's transaction.
+        border_lengths (dict, optional): {(region_a, region_b): length}; missing pairs get 0.
+
+    Returns:
+        int: Number of edges written.
+    """
+    setup_adjacency_table(cursor)
+    if cursor.execute('SELECT 1 FROM region_adjacency LIMIT 1').fetchone():
+        return 0
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info('regions')")]
+    if 'adjacent_regions' not in columns:
+        return 0
+    edges = set()
+    for region_id, text in cursor.execute('SELECT region_id, adjacent_regions FROM regions').fetchall():
+        for neighbour in parse_adjacent_regions(text):
+            if neighbour != region_id:
+                edges.add((min(region_id, neighbour), max(region_id, neighbour)))
+    border_lengths = border_lengths or {}
+    cursor.executemany('INSERT INTO region_adjacency (region_a, region_b, border_len) VALUES (?, ?, ?)',
+                       ((a, b, float(border_lengths.get((a, b), 0.0))) for a, b in sorted(edges)))
+    logging.info(f"Migrated {len(edges)} adjacency edges from regions.adjacent_regions.")
+    return len(edges)
+
+def migrate_adjacent_regions_column(db_path):
+    """
+    Fill an empty region_adjacency table from the legacy regions.adjacent_regions column.
+
+    Border lengths come from the shared topology when the database has one and
+    are 0 otherwise. Returns the number of edges written.
+    """
+    topology = load_topology(db_path)
+    border_lengths = topology.border_lengths() if topology is not None else {}
+    try:
+        return get_database(db_path).write(lambda conn: copy_adjacent_regions_column(conn.cursor(), border_lengths))
+    except sqlite3.Error as e:
+        logging.error(f"Error migrating region adjacency: {e}")
+        return 0
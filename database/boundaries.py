@@ -0,0 +1,218 @@
+import sqlite3
+import logging
+import numpy as np
+from datetime import datetime
+from database.connection import get_database
+from database.geometry import encode_vertices, decode_vertices
+from database.topology import NO_REGION, build_topology, store_topology, read_topology, patch_topology, write_topology_changes
+from database.lod import build_lod
+
+# Name of the version recorded from the generated map before the first save
+ROOT_VERSION = 'original'
+
+def setup_boundary_tables(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS boundary_versions (
+            version_id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE,
+            parent_id INTEGER REFERENCES boundary_versions(version_id),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # Only the regions a version changed relative to its parent; NULL geometry marks a removed region
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS region_revisions (
+            version_id INTEGER NOT NULL REFERENCES boundary_versions(version_id),
+            region_id INTEGER NOT NULL,
+            geometry BLOB,
+            PRIMARY KEY (version_id, region_id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS boundary_head (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            version_id INTEGER NOT NULL REFERENCES boundary_versions(version_id)
+        )
+    ''')
+
+def clear_boundary_versions(cursor):
+    """Forget every version, e.g. when a new map replaces all regions; returns how many there were."""
+    setup_boundary_tables(cursor)
+    cursor.execute('DELETE FROM boundary_head')
+    cursor.execute('DELETE FROM region_revisions')
+    return cursor.execute('DELETE FROM boundary_versions').rowcount
+
+def _head(cursor):
+    row = cursor.execute('SELECT version_id FROM boundary_head WHERE id = 0').fetchone()
+    return row[0] if row else None
+
+def _version_id(cursor, name):
+    if name is None:
+        return _head(cursor)
+    row = cursor.execute('SELECT version_id FROM boundary_versions WHERE name = ?', (name,)).fetchone()
+    if row is None:
+        raise ValueError(f"Unknown boundary version '{name}'")
+    return row[0]
+
+def _resolve(cursor, version_id):
+    """Return {region_id: geometry blob or None} of a version by walking its ancestors."""
+    rows = cursor.execute('''
+        WITH RECURSIVE lineage (version_id, depth) AS (
+            SELECT ?, 0
+            UNION ALL
+            SELECT boundary_versions.parent_id, lineage.depth + 1
+            FROM boundary_versions JOIN lineage ON boundary_versions.version_id = lineage.version_id
+            WHERE boundary_versions.parent_id IS NOT NULL
+        )
+        SELECT region_id, geometry FROM (
+            SELECT region_revisions.region_id, region_revisions.geometry,
+                   ROW_NUMBER() OVER (PARTITION BY region_revisions.region_id ORDER BY lineage.depth) AS newest
+            FROM region_revisions JOIN lineage ON lineage.version_id = region_revisions.version_id
+        )
+        WHERE newest = 1
+    ''', (version_id,))
+    return dict(rows.fetchall())
+
+def _ring_blobs(topology, region_ids=None):
+    rings = topology.region_rings()
+    return {region_id: encode_vertices(ring) for region_id, ring in rings.items() if region_ids is None or region_id in region_ids}
+
+def _ensure_root(cursor):
+    # The first save records the current topology rings as the root every later version builds on
+    head = _head(cursor)
+    if head is not None:
+        return head
+    cursor.execute('INSERT INTO boundary_versions (name, parent_id) VALUES (?, NULL)', (ROOT_VERSION,))
+    head = cursor.lastrowid
+    cursor.executemany('INSERT INTO region_revisions (version_id, region_id, geometry) VALUES (?, ?, ?)',
+                       ((head, region_id, blob) for region_id, blob in _ring_blobs(read_topology(cursor)).items()))
+    cursor.execute('INSERT INTO boundary_head (id, version_id) VALUES (0, ?)', (head,))
+    return head
+
+def save_boundary_version(db_path, vertex_positions=(), name=None):
+    """
+    Move shared vertices and record the result as a new version on top of the current one.
+
+    The topology is the only stored copy of the current boundaries; the
+    version stores the rings of the regions around the moved vertices, read
+    back from the updated topology, where they differ from the current
+    version. The new version becomes the current one.
+
+    Parameters:
+        db_path (str): Path to the SQLite database.
+        vertex_positions (iterable, optional): (vertex_id, x, y) of moved shared vertices.
+        name (str, optional): Version name; an unnamed save that changes
+            nothing creates no version.
+
+    Returns:
+        tuple: (version name, sorted changed region ids); the name is None on error.
+    """
+    vertex_positions = list(vertex_positions)
+    def write(conn):
+        cursor = conn.cursor()
+        setup_boundary_tables(cursor)
+        parent = _ensure_root(cursor)
+        cursor.executemany('UPDATE topo_vertices SET x = ?, y = ? WHERE vertex_id = ?',
+                           ((x, y, vertex_id) for vertex_id, x, y in vertex_positions))
+        current = _resolve(cursor, parent)
+        topology = read_topology(cursor)
+        moved = np.isin(topology.edges, [vertex_id for vertex_id, _, _ in vertex_positions]).any(axis=1)
+        touched = (set(topology.left_region[moved].tolist()) | set(topology.right_region[moved].tolist())) - {NO_REGION}
+        changed = {region_id: blob for region_id, blob in _ring_blobs(topology, touched).items() if current.get(region_id) != blob}
+        if not changed and name is None:
+            return cursor.execute('SELECT name FROM boundary_versions WHERE version_id = ?', (parent,)).fetchone()[0], []
+        version_name = name or f"edit {datetime.now():%Y-%m-%d %H:%M:%S.%f}"
+        cursor.execute('INSERT INTO boundary_versions (name, parent_id) VALUES (?, ?)', (version_name, parent))
+        version_id = cursor.lastrowid
+        cursor.executemany('INSERT INTO region_revisions (version_id, region_id, geometry) VALUES (?, ?, ?)',
+                           ((version_id, region_id, blob) for region_id, blob in changed.items()))
+        cursor.execute('UPDATE boundary_head SET version_id = ? WHERE id = 0', (version_id,))
+        return version_name, sorted(changed)
+
+    try:
+        version_name, changed = get_database(db_path).write(write)
+    except sqlite3.Error as e:
+        logging.error(f"Error saving boundary version: {e}")
+        return None, []
+    logging.info(f"Saved boundary version '{version_name}' with {len(changed)} changed regions.")
+    return version_name, changed
+
+def load_boundary_version(db_path, name=None):
+    """Return {region_id: ring} of a version, the current one by default."""
+    with get_database(db_path).read() as conn:
+        cursor = conn.cursor()
+        version_id = _version_id(cursor, name)
+        if version_id is None:
+            return read_topology(cursor).region_rings()
+        rows = _resolve(cursor, version_id).items()
+    return {region_id: decode_vertices(blob) for region_id, blob in rows if blob is not None}
+
+def list_boundary_versions(db_path):
+    """
+    Return every version in creation order.
+
+    Returns:
+        list: Dicts with name, parent, created_at, changed (number of regions
+        stored by the version) and current.
+    """
+    with get_database(db_path).read() as conn:
+        cursor = conn.cursor()
+        head = _head(cursor)
+        rows = cursor.execute('''
+            SELECT versions.version_id, versions.name, parents.name, versions.created_at,
+                   (SELECT COUNT(*) FROM region_revisions WHERE region_revisions.version_id = versions.version_id)
+            FROM boundary_versions AS versions
+            LEFT JOIN boundary_versions AS parents ON parents.version_id = versions.parent_id
+            ORDER BY versions.version_id
+        ''').fetchall()
+    return [{'name': name, 'parent': parent, 'created_at': created_at, 'changed': changed, 'current': version_id == head}
+            for version_id, name, parent, created_at, changed in rows]
+
+def diff_boundary_versions(db_path, name_a, name_b=None):
+    """Return the sorted ids of regions whose geometry differs between two versions."""
+    with get_database(db_path).read() as conn:
+        cursor = conn.cursor()
+        a = _resolve(cursor, _version_id(cursor, name_a))
+        b = _resolve(cursor, _version_id(cursor, name_b))
+    return sorted(region_id for region_id in a.keys() | b.keys() if a.get(region_id) != b.get(region_id))
+
+def checkout_boundary_version(db_path, name):
+    """
+    Make a stored version the current one.
+
+    Moving the current-version pointer is a single-row update; only the faces
+    of the regions that differ between the two versions are rewritten in the
+    shared topology, in the same transaction. Simplified levels are rebuilt for them and for the regions
+    sharing a vertex with them.
+
+    Returns:
+        list: Sorted ids of the regions that changed.
+    """
+    def write(conn):
+        cursor = conn.cursor()
+        setup_boundary_tables(cursor)
+        head = _ensure_root(cursor)
+        target = _version_id(cursor, name)
+        current, wanted = _resolve(cursor, head), _resolve(cursor, target)
+        changed = sorted(region_id for region_id in current.keys() | wanted.keys() if current.get(region_id) != wanted.get(region_id))
+        cursor.execute('UPDATE boundary_head SET version_id = ? WHERE id = 0', (target,))
+        if not changed:
+            return changed, None, None
+        topology = read_topology(cursor)
+        if len(topology.region_ids) == 0:
+            # Nothing stored to patch yet; derive the topology from every region of the version
+            return changed, build_topology({region_id: decode_vertices(blob) for region_id, blob in wanted.items() if blob is not None}), None
+        lod_ids = topology.regions_around(changed)
+        rings = {region_id: decode_vertices(wanted[region_id]) for region_id in changed if wanted.get(region_id) is not None}
+        topology, changes = patch_topology(topology, rings, changed)
+        write_topology_changes(conn, topology, changes)
+        return changed, topology, lod_ids | topology.regions_around(changed)
+
+    changed, topology, lod_ids = get_database(db_path).write(write)
+    if topology is not None and lod_ids is None:
+        store_topology(db_path, topology)
+        build_lod(db_path, topology)
+    elif topology is not None:
+        build_lod(db_path, topology, region_ids=lod_ids)
+    logging.info(f"Checked out boundary version '{name}'; {len(changed)} regions changed.")
+    return changed
@@ -0,0 +1,219 @@
+import os
+import queue
+import atexit
+import sqlite3
+import logging
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+# journal_mode is stored in the database file; the other pragmas apply per connection
+PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('mmap_size', 256 * 2 ** 20),
+    ('cache_size', -64 * 2 ** 10),  # negative values are KiB
+    ('temp_store', 'MEMORY'),
+    ('busy_timeout', 5000),
+)
+
+def memory_path(name):
+    """Return the path of a named in-memory database shared by all connections of this process."""
+    return f'file:{name}?mode=memory&cache=shared'
+
+def is_memory_path(db_path):
+    return db_path.startswith('file:') and 'mode=memory' in db_path
+
+def configure(conn, read_only=False):
+    """Apply PRAGMAS to a connection; read-only connections also refuse writes."""
+    for name, value in PRAGMAS:
+        conn.execute(f'PRAGMA {name} = {value}')
+    if read_only:
+        conn.execute('PRAGMA query_only = ON')
+    return conn
+
+def connect(db_path, read_only=False, **kwargs):
+    """Open a tuned connection that may be shared between threads."""
+    conn = configure(sqlite3.connect(db_path, check_same_thread=False, uri=db_path.startswith('file:'), **kwargs), read_only)
+    if read_only and is_memory_path(db_path):
+        # Shared-cache connections lock whole tables instead of using WAL snapshots;
+        # readers skip those locks so they never fail a concurrent write
+        conn.execute('PRAGMA read_uncommitted = ON')
+    return conn
+
+class Database:
+    """
+    Pooled readers and a single writer thread for one SQLite file.
+
+    In WAL mode readers never block the writer and see the last committed state,
+    so the GUI can read while the simulation writes. Writes made through it are
+    queued to one thread that owns its only writing connection, so they never
+    contend with each other for the lock. The schema migrations are the one
+    exception: they run on their own connection and wait on busy_timeout.
+
+    A memory_path database lives as long as its Database is open; its readers
+    see writes as they happen rather than a snapshot of the last commit.
+
+    Parameters:
+        db_path (str): Path to the SQLite database.
+        pool_size (int, optional): Largest number of open read connections.
+    """
+
+    def __init__(self, db_path, pool_size=4):
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self.closed = False
+        self._pool = queue.LifoQueue()
+        self._opened = 0
+        # Guards closed together with the reader count and the write queue
+        self._pool_lock = threading.Lock()
+        self._writes = queue.Queue()
+        # Opened first so the file is in WAL mode before any reader connects
+        self._writer_conn = connect(db_path)
+        self._writer = threading.Thread(target=self._write_loop, name=f"sqlite-writer-{os.path.basename(db_path)}", daemon=True)
+        self._writer.start()
+
+    def _acquire(self):
+        if self.closed:
+            raise sqlite3.ProgrammingError(f"Database {self.db_path} is closed")
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+        with self._pool_lock:
+            if self._opened < self.pool_size:
+                self._opened += 1
+                return connect(self.db_path, read_only=True)
+        # Every reader is lent out; wait for one, but give up once the database closes
+        while True:
+            try:
+                return self._pool.get(timeout=0.1)
+            except queue.Empty:
+                if self.closed:
+                    raise sqlite3.ProgrammingError(f"Database {self.db_path} is closed")
+
+    def _release(self, conn):
+        with self._pool_lock:
+            if not self.closed:
+                self._pool.put(conn)
+                return
+            self._opened -= 1
+        conn.close()
+
+    @contextmanager
+    def read(self):
+        """Lend a read-only connection whose queries all see one snapshot."""
+        conn = self._acquire()
+        try:
+            conn.execute('BEGIN')
+            yield conn
+        finally:
+            conn.rollback()
+            self._release(conn)
+
+    def submit(self, work, *args):
+        """
+        Queue work(conn, *args) for the writer thread.
+
+        The work runs in one transaction that is committed when it returns and
+        rolled back when it raises. Work submitted from inside another write
+        runs immediately as part of that transaction.
+
+        Returns:
+            Future: Resolves to the return value of work.
+        """
+        future = Future()
+        if threading.current_thread() is self._writer:
+            try:
+                future.set_result(work(self._writer_conn, *args))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        with self._pool_lock:
+            if self.closed:
+                raise sqlite3.ProgrammingError(f"Database {self.db_path} is closed")
+            self._writes.put((work, args, future))
+        return future
+
+    def write(self, work, *args):
+        """Run work(conn, *args) on the writer thread and wait for its result."""
+        return self.submit(work, *args).result()
+
+    def execute(self, sql, params=()):
+        """Run one write statement; returns the number of changed rows."""
+        return self.write(lambda conn: conn.execute(sql, params).rowcount)
+
+    def executemany(self, sql, rows):
+        return self.write(lambda conn: conn.executemany(sql, rows).rowcount)
+
+    def _write_loop(self):
+        conn = self._writer_conn
+        while True:
+            job = self._writes.get()
+            if job is None:
+                break
+            work, args, future = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                with conn:
+                    result = work(conn, *args)
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+        conn.close()
+
+    def close(self):
+        """
+        Finish queued writes and close every connection.
+
+        Readers lent out to other threads are closed when they are returned,
+        so this never waits for them.
+        """
+        with self._pool_lock:
+            if self.closed:
+                return
+            self.closed = True
+            self._writes.put(None)
+        self._writer.join()
+        while True:
+            with self._pool_lock:
+                try:
+                    conn = self._pool.get_nowait()
+                except queue.Empty:
+                    break
+                self._opened -= 1
+            conn.close()
+
+_databases = {}
+_databases_lock = threading.Lock()
+
+def _key(db_path):
+    return db_path if is_memory_path(db_path) else os.path.abspath(db_path)
+
+def get_database(db_path):
+    """Return the shared Database of a file, opening it on first use."""
+    key = _key(db_path)
+    with _databases_lock:
+        database = _databases.get(key)
+        if database is None or database.closed:
+            database = _databases[key] = Database(db_path)
+    return database
+
+def close_database(db_path):
+    with _databases_lock:
+        database = _databases.pop(_key(db_path), None)
+    if database is not None:
+        database.close()
+
+@atexit.register
+def close_all():
+    with _databases_lock:
+        databases = list(_databases.values())
+        _databases.clear()
+    for database in databases:
+        try:
+            database.close()
+        except sqlite3.Error as e:
+            logging.error(f"Error closing database {database.db_path}: {e}")
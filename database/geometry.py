@@ -0,0 +1,82 @@
+import json
+import struct
+import numpy as np
+
+# Blob layout: magic, format version, dtype code, point count, then the packed
+# little-endian (x, y) coordinate pairs
+GEOMETRY_MAGIC = b'AOCG'
+GEOMETRY_FORMAT_VERSION = 1
+_HEADER = struct.Struct('<4sBBI')
+_DTYPES = {0: np.dtype('<f8'), 1: np.dtype('<f4')}
+_DTYPE_CODES = {dtype.itemsize: code for code, dtype in _DTYPES.items()}
+
+def encode_vertices(coords, dtype=np.float64):
+    """
+    Pack a sequence of (x, y) coordinates into a geometry blob.
+
+    Parameters:
+        coords (array-like): Polygon ring coordinates with shape (n, 2).
+        dtype (numpy dtype, optional): float64 (default) or float32 storage.
+
+    Returns:
+        bytes: Header followed by the raw coordinate buffer.
+    """
+    dtype_code = _DTYPE_CODES[np.dtype(dtype).itemsize]
+    array = np.ascontiguousarray(coords, dtype=_DTYPES[dtype_code]).reshape(-1, 2)
+    header = _HEADER.pack(GEOMETRY_MAGIC, GEOMETRY_FORMAT_VERSION, dtype_code, len(array))
+    return header + array.tobytes()
+
+def decode_vertices(blob):
+    """
+    Decode a geometry blob into an (n, 2) array without copying the coordinates.
+
+    Parameters:
+        blob (bytes): Value of a regions.geometry column.
+
+    Returns:
+        ndarray: Read-only view of the coordinates.
+    """
+    magic, version, dtype_code, count = _HEADER.unpack_from(blob)
+    if magic != GEOMETRY_MAGIC:
+        raise ValueError("Not a geometry blob")
+    if version > GEOMETRY_FORMAT_VERSION:
+        raise ValueError(f"Unsupported geometry format version {version}")
+    return np.frombuffer(blob, dtype=_DTYPES[dtype_code], count=count * 2, offset=_HEADER.size).reshape(count, 2)
+
+def decode_legacy_vertices(value):
+    """Decode either a geometry blob or a legacy JSON vertex string."""
+    if isinstance(value, (bytes, memoryview)):
+        return decode_vertices(bytes(value))
+    return np.array(json.loads(value), dtype=np.float64).reshape(-1, 2)
+
+def decode_to_qpolygonf(blob):
+    """
+    Decode a geometry blob straight into a QPolygonF.
+
+    The coordinates are copied into the polygon's own storage in one block, so no
+    per-point QPointF objects are created on the Python side.
+    """
+    return array_to_qpolygonf(decode_vertices(blob))
+
+def array_to_qpolygonf(coords):
+    """Build a QPolygonF from an (n, 2) coordinate array with a single buffer copy."""
+    from PyQt5.QtCore import QPointF
+    from PyQt5.QtGui import QPolygonF
+
+    coords = np.asarray(coords, dtype=np.float64)
+    polygon = QPolygonF()
+    polygon.fill(QPointF(), len(coords))
+    if len(coords):
+        buffer = polygon.data()
+        buffer.setsize(coords.size * 8)
+        np.frombuffer(buffer, dtype=np.float64)[:] = coords.ravel()
+    return polygon
+
+def qpolygonf_to_array(polygon):
+    """Copy the points of a QPolygonF into an (n, 2) float64 array."""
+    count = polygon.count()
+    if count == 0:
+        return np.empty((0, 2), dtype=np.float64)
+    buffer = polygon.data()
+    buffer.setsize(count * 16)
+    return np.frombuffer(buffer, dtype=np.float64).reshape(count, 2).copy()
@@ -0,0 +1,141 @@
+import sqlite3
+import logging
+import numpy as np
+import shapely
+from database.geometry import encode_vertices, decode_vertices
+from database.connection import get_database
+
+# Simplification tolerance, in map pixels, of each stored level; level 0 is the full topology
+LOD_TOLERANCES = {1: 1.0, 2: 4.0, 3: 16.0}
+
+def _node_vertices(topology):
+    # A vertex ends a chain unless exactly two edges with the same pair of regions meet there
+    num_vertices = len(topology.vertices)
+    stride = int(max(topology.left_region.max(initial=0), topology.right_region.max(initial=0))) + 1
+    pair_keys = np.minimum(topology.left_region, topology.right_region) * stride + np.maximum(topology.left_region, topology.right_region)
+    ends = topology.edges.ravel()
+    keys = np.repeat(pair_keys, 2)
+    degree = np.bincount(ends, minlength=num_vertices)
+    lowest = np.full(num_vertices, np.iinfo(np.int64).max, dtype=np.int64)
+    highest = np.full(num_vertices, np.iinfo(np.int64).min, dtype=np.int64)
+    np.minimum.at(lowest, ends, keys)
+    np.maximum.at(highest, ends, keys)
+    return (degree != 2) | (lowest != highest)
+
+def _face_chains(vertex_ids, is_node):
+    """Split a face ring into (vertex ids, reversed) chains in canonical direction."""
+    vertex_ids = [int(vertex_id) for vertex_id in vertex_ids]
+    nodes = [i for i, vertex_id in enumerate(vertex_ids) if is_node[vertex_id]]
+    if not nodes:
+        # A ring with no junctions is one closed chain starting at its smallest vertex id
+        start = vertex_ids.index(min(vertex_ids))
+        chains = [vertex_ids[start:] + vertex_ids[:start + 1]]
+    else:
+        ring = vertex_ids[nodes[0]:] + vertex_ids[:nodes[0]]
+        splits = [i - nodes[0] for i in nodes] + [len(vertex_ids)]
+        ring.append(ring[0])
+        chains = [ring[splits[i]:splits[i + 1] + 1] for i in range(len(nodes))]
+
+    canonical = []
+    for chain in chains:
+        flip = chain[0] > chain[-1] or (chain[0] == chain[-1] and len(chain) > 2 and chain[1] > chain[-2])
+        canonical.append((tuple(chain[::-1]) if flip else tuple(chain), flip))
+    return canonical
+
+def simplify_topology(topology, tolerances=None, region_ids=None):
+    """
+    Simplify region boundaries at several tolerances without opening gaps.
+
+    Boundaries are split into chains at vertices where three or more regions meet
+    or where the pair of regions on either side changes. Each chain is simplified
+    once in a fixed direction, so both regions along a border get the same result.
+
+    Parameters:
+        topology (Topology): Shared boundary model of the map.
+        tolerances (dict, optional): {lod: tolerance}; defaults to LOD_TOLERANCES.
+        region_ids (iterable, optional): Only build rings for these regions.
+
+    Returns:
+        dict: {lod: {region_id: closed (n, 2) ring}}.
+    """
+    tolerances = LOD_TOLERANCES if tolerances is None else tolerances
+    is_node = _node_vertices(topology)
+    face_vertex_ids = topology.region_vertex_ids()
+    if region_ids is not None:
+        face_vertex_ids = {region_id: face_vertex_ids[region_id] for region_id in region_ids if region_id in face_vertex_ids}
+
+    chain_index, faces = {}, {}
+    for region_id, vertex_ids in face_vertex_ids.items():
+        faces[region_id] = []
+        for chain, flip in _face_chains(vertex_ids, is_node):
+            faces[region_id].append((chain_index.setdefault(chain, len(chain_index)), flip))
+    chains = list(chain_index)
+    if chains:
+        chain_vertices = np.concatenate([np.array(chain, dtype=np.int64) for chain in chains])
+        lines = shapely.linestrings(topology.vertices[chain_vertices], indices=np.repeat(np.arange(len(chains)), [len(chain) for chain in chains]))
+    else:
+        lines = np.empty(0, dtype=object)
+
+    levels = {}
+    for lod in sorted(tolerances):
+        simplified = [np.asarray(shapely.get_coordinates(line)) for line in shapely.simplify(lines, tolerances[lod])]
+        rings = {}
+        for region_id, face in faces.items():
+            parts = [simplified[index][::-1] if flip else simplified[index] for index, flip in face]
+            ring = np.concatenate([part[:-1] for part in parts] + [parts[0][:1]])
+            if len(np.unique(ring, axis=0)) < 3:
+                # Too small to survive this tolerance; keep the finer ring
+                previous = levels.get(max(levels), {}) if levels else {}
+                ring = previous.get(region_id, topology.vertices[np.append(face_vertex_ids[region_id], face_vertex_ids[region_id][:1])])
+            rings[region_id] = ring
+        levels[lod] = rings
+    return levels
+
+def setup_lod_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS region_lod (
+            region_id INTEGER NOT NULL,
+            lod INTEGER NOT NULL,
+            tolerance REAL NOT NULL,
+            geometry BLOB NOT NULL,
+            PRIMARY KEY (region_id, lod)
+        )
+    ''')
+
+def store_lod(db_path, levels, tolerances=None, region_ids=None):
+    """
+    Write simplified rings; with region_ids only those regions' rows are replaced.
+    """
+    tolerances = LOD_TOLERANCES if tolerances is None else tolerances
+    def write(conn):
+        cursor = conn.cursor()
+        setup_lod_table(cursor)
+        if region_ids is None:
+            cursor.execute('DELETE FROM region_lod')
+        else:
+            cursor.executemany('DELETE FROM region_lod WHERE region_id = ?', ((int(region_id),) for region_id in region_ids))
+        cursor.executemany('INSERT INTO region_lod (region_id, lod, tolerance, geometry) VALUES (?, ?, ?, ?)',
+                           ((int(region_id), lod, tolerances[lod], encode_vertices(ring))
+                            for lod, rings in levels.items() for region_id, ring in rings.items()))
+
+    try:
+        get_database(db_path).write(write)
+        logging.info(f"Stored {len(levels)} simplified levels for {len(next(iter(levels.values()), {}))} regions.")
+    except sqlite3.Error as e:
+        logging.error(f"Error storing simplified regions in DB: {e}")
+
+def build_lod(db_path, topology, tolerances=None, region_ids=None):
+    store_lod(db_path, simplify_topology(topology, tolerances, region_ids), tolerances, region_ids)
+
+def load_lod(db_path):
+    """Return ({lod: tolerance}, {lod: {region_id: ring}}) of the stored levels."""
+    tolerances, levels = {}, {}
+    try:
+        with get_database(db_path).read() as conn:
+            cursor = conn.cursor()
+            for region_id, lod, tolerance, geometry in cursor.execute('SELECT region_id, lod, tolerance, geometry FROM region_lod'):
+                tolerances[lod] = tolerance
+                levels.setdefault(lod, {})[region_id] = decode_vertices(geometry)
+    except sqlite3.Error as e:
+        logging.error(f"Error loading simplified regions from DB: {e}")
+    return tolerances, levels
@@ -0,0 +1,142 @@
+import sqlite3
+import logging
+import numpy as np
+from database.connection import get_database
+
+# Columns of region_metrics after region_id, in table order
+METRIC_COLUMNS = ('area', 'land_area', 'perimeter', 'shared_border', 'neighbour_count', 'compactness',
+                  'min_x', 'min_y', 'max_x', 'max_y')
+
+def compute_region_metrics(rings, land_area=None, pairs=None, border_lengths=None):
+    """
+    Compute geometric metrics of every region ring in one vectorised pass.
+
+    Parameters:
+        rings (dict): {region_id: (n, 2) ring coordinates}; rings may be closed.
+        land_area (ndarray, optional): Land pixel count indexed by region id.
+        pairs (ndarray, optional): (k, 2) adjacent region ids.
+        border_lengths (ndarray, optional): (k,) shared border length of each pair.
+
+    Returns:
+        dict: 'region_id' and one array per METRIC_COLUMNS entry, aligned by region.
+            Compactness is the Polsby-Popper score 4 pi area / perimeter^2, which is
+            1 for a disc.
+    """
+    region_ids = np.array(sorted(rings), dtype=np.int64)
+    closed = []
+    for region_id in region_ids:
+        ring = np.asarray(rings[region_id], dtype=np.float64).reshape(-1, 2)
+        if len(ring) and not np.array_equal(ring[0], ring[-1]):
+            ring = np.vstack((ring, ring[:1]))
+        closed.append(ring)
+    metrics = {'region_id': region_ids}
+    if not len(region_ids):
+        metrics.update({column: np.empty(0) for column in METRIC_COLUMNS})
+        return metrics
+
+    lengths = np.array([len(ring) for ring in closed])
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    coords = np.concatenate(closed)
+    # Segment i runs from vertex i to i + 1; the segment leaving a ring's last vertex is dropped
+    x, y = coords[:-1, 0], coords[:-1, 1]
+    next_x, next_y = coords[1:, 0], coords[1:, 1]
+    within = np.ones(len(coords) - 1, dtype=bool)
+    within[(starts + lengths - 1)[:-1]] = False
+    cross = np.where(within, x * next_y - next_x * y, 0.0)
+    segment = np.where(within, np.hypot(next_x - x, next_y - y), 0.0)
+    segment_starts = np.minimum(starts, len(coords) - 2)
+
+    metrics['area'] = np.abs(np.add.reduceat(cross, segment_starts)) / 2
+    metrics['perimeter'] = np.add.reduceat(segment, segment_starts)
+    metrics['min_x'] = np.minimum.reduceat(coords[:, 0], starts)
+    metrics['min_y'] = np.minimum.reduceat(coords[:, 1], starts)
+    metrics['max_x'] = np.maximum.reduceat(coords[:, 0], starts)
+    metrics['max_y'] = np.maximum.reduceat(coords[:, 1], starts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        metrics['compactness'] = np.nan_to_num(4 * np.pi * metrics['area'] / metrics['perimeter'] ** 2)
+
+    if land_area is not None:
+        land_area = np.asarray(land_area, dtype=np.float64)
+        in_range = region_ids < len(land_area)
+        metrics['land_area'] = np.where(in_range, land_area[np.minimum(region_ids, len(land_area) - 1)], 0.0)
+    else:
+        metrics['land_area'] = np.full(len(region_ids), np.nan)
+
+    pairs = np.empty((0, 2), dtype=np.int64) if pairs is None else np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+    border_lengths = np.ones(len(pairs)) if border_lengths is None else np.asarray(border_lengths, dtype=np.float64)
+    size = int(max(region_ids.max(), pairs.max(initial=0))) + 1
+    metrics['shared_border'] = np.bincount(pairs.ravel(), weights=np.repeat(border_lengths, 2), minlength=size)[region_ids]
+    metrics['neighbour_count'] = np.bincount(pairs.ravel(), minlength=size)[region_ids]
+    return metrics
+
+def setup_metrics_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS region_metrics (
+            region_id INTEGER PRIMARY KEY,
+            area REAL NOT NULL,
+            land_area REAL,
+            perimeter REAL NOT NULL,
+            shared_border REAL NOT NULL,
+            neighbour_count INTEGER NOT NULL,
+            compactness REAL NOT NULL,
+            min_x REAL NOT NULL,
+            min_y REAL NOT NULL,
+            max_x REAL NOT NULL,
+            max_y REAL NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_region_metrics_area ON region_metrics (area)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_region_metrics_land_area ON region_metrics (land_area)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_region_metrics_compactness ON region_metrics (compactness)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_region_metrics_bbox ON region_metrics (min_x, max_x, min_y, max_y)')
+
+def store_region_metrics(db_path, metrics, region_ids=None):
+    """
+    Write region metrics; with region_ids only those regions' rows are replaced.
+
+    Ids in region_ids that have no metrics are deleted, so removed regions can be
+    passed along with the changed ones.
+    """
+    columns = ('region_id',) + METRIC_COLUMNS
+    rows = zip(*(np.asarray(metrics[column]).tolist() for column in columns))
+    rows = [tuple(None if isinstance(value, float) and np.isnan(value) else value for value in row) for row in rows]
+
+    def write(conn):
+        cursor = conn.cursor()
+        setup_metrics_table(cursor)
+        if region_ids is None:
+            cursor.execute('DELETE FROM region_metrics')
+        else:
+            cursor.executemany('DELETE FROM region_metrics WHERE region_id = ?', ((int(region_id),) for region_id in region_ids))
+        cursor.executemany(f'INSERT INTO region_metrics ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))})', rows)
+
+    try:
+        get_database(db_path).write(write)
+        logging.info(f"Stored metrics of {len(rows)} regions.")
+    except sqlite3.Error as e:
+        logging.error(f"Error storing region metrics in DB: {e}")
+
+def load_region_metrics(db_path, region_ids=None):
+    """
+    Fetch region metrics with a single query.
+
+    Returns:
+        dict: 'region_id' and one array per METRIC_COLUMNS entry, ordered by region id.
+    """
+    columns = ('region_id',) + METRIC_COLUMNS
+    query = f'SELECT {", ".join(columns)} FROM region_metrics'
+    params = []
+    if region_ids is not None:
+        params = [int(region_id) for region_id in region_ids]
+        query += f' WHERE region_id IN ({", ".join("?" * len(params))})'
+    rows = []
+    try:
+        with get_database(db_path).read() as conn:
+            rows = conn.execute(query + ' ORDER BY region_id', params).fetchall()
+    except sqlite3.Error as e:
+        logging.error(f"Error loading region metrics from DB: {e}")
+    table = np.array(rows, dtype=np.float64).reshape(-1, len(columns))
+    metrics = {column: table[:, i] for i, column in enumerate(columns)}
+    metrics['region_id'] = metrics['region_id'].astype(np.int64)
+    metrics['neighbour_count'] = metrics['neighbour_count'].astype(np.int64)
+    return metrics
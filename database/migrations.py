@@ -0,0 +1,150 @@
+import sqlite3
+import logging
+from contextlib import closing
+from database.connection import connect
+from database.geometry import encode_vertices, decode_legacy_vertices
+from database.topology import setup_topology_tables, read_topology
+from database.lod import setup_lod_table
+from database.metrics import setup_metrics_table
+from database.adjacency import setup_adjacency_table, copy_adjacent_regions_column
+from database.node_regions import setup_node_region_mapping_table, fill_node_region_mapping
+from database.boundaries import setup_boundary_tables
+
+def _columns(cursor, table):
+    return {row[1] for row in cursor.execute(f"PRAGMA table_info('{table}')")}
+
+def _add_column(cursor, table, column, declaration):
+    # Only runs while a migration is pending, so the introspection is paid once per database
+    if column not in _columns(cursor, table):
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {declaration}')
+
+def _create_core_tables(cursor, db_path):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS nodes (
+            node_id INTEGER PRIMARY KEY,
+            current_level INTEGER NOT NULL,
+            current_experience INTEGER NOT NULL,
+            last_update TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS regions (
+            region_id INTEGER PRIMARY KEY,
+            geometry BLOB,
+            x_REAL REAL,
+            y_REAL REAL,
+            adjacent_regions TEXT
+        )
+    ''')
+
+def _add_node_coordinates(cursor, db_path):
+    _add_column(cursor, 'nodes', 'x_coordinate', 'REAL')
+    _add_column(cursor, 'nodes', 'y_coordinate', 'REAL')
+
+def _add_node_hierarchy(cursor, db_path):
+    _add_column(cursor, 'nodes', 'vassal_to', 'INTEGER DEFAULT NULL')
+    _add_column(cursor, 'nodes', 'regent_to', 'INTEGER DEFAULT NULL')
+
+def _add_region_geometry(cursor, db_path):
+    _add_column(cursor, 'regions', 'geometry', 'BLOB')
+    _add_column(cursor, 'regions', 'x_REAL', 'REAL')
+    _add_column(cursor, 'regions', 'y_REAL', 'REAL')
+    _add_column(cursor, 'regions', 'adjacent_regions', 'TEXT')
+    # Convert legacy JSON 'vertices' text into geometry blobs
+    if 'vertices' in _columns(cursor, 'regions'):
+        cursor.execute('SELECT region_id, vertices FROM regions WHERE geometry IS NULL AND vertices IS NOT NULL')
+        converted = [(encode_vertices(decode_legacy_vertices(vertices)), region_id) for region_id, vertices in cursor.fetchall()]
+        cursor.executemany('UPDATE regions SET geometry = ? WHERE region_id = ?', converted)
+        if converted:
+            logging.info(f"Converted {len(converted)} regions from JSON vertices to geometry blobs.")
+
+def _create_derived_tables(cursor, db_path):
+    setup_topology_tables(cursor)
+    setup_lod_table(cursor)
+    setup_metrics_table(cursor)
+    setup_adjacency_table(cursor)
+    setup_node_region_mapping_table(cursor)
+
+def _fill_region_adjacency(cursor, db_path):
+    # Read on the migration's own connection; a second one would not see its open transaction
+    copy_adjacent_regions_column(cursor, read_topology(cursor).border_lengths())
+    fill_node_region_mapping(cursor)
+
+def _index_node_hierarchy(cursor, db_path):
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_nodes_level ON nodes (current_level)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_nodes_vassal_to ON nodes (vassal_to)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_nodes_regent_to ON nodes (regent_to)')
+
+def _create_boundary_tables(cursor, db_path):
+    setup_boundary_tables(cursor)
+
+# Ordered (version, name, function) entries; append new migrations, never edit applied ones
+MIGRATIONS = [
+    (1, 'core tables', _create_core_tables),
+    (2, 'node coordinates', _add_node_coordinates),
+    (3, 'node vassal and regent columns', _add_node_hierarchy),
+    (4, 'region geometry blobs', _add_region_geometry),
+    (5, 'topology, lod, metrics, adjacency and mapping tables', _create_derived_tables),
+    (6, 'region adjacency from adjacent_regions', _fill_region_adjacency),
+    (7, 'node hierarchy indexes', _index_node_hierarchy),
+    (8, 'boundary versions', _create_boundary_tables),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def schema_version(db_path):
+    """Return the applied schema version of the database, 0 for an unversioned one."""
+    try:
+        with closing(connect(db_path)) as conn:
+            return conn.execute('SELECT MAX(version) FROM schema_version').fetchone()[0] or 0
+    except sqlite3.OperationalError:
+        return 0
+
+def migrate(db_path):
+    """
+    Bring the database schema up to SCHEMA_VERSION.
+
+    A database that is already current costs a single version query. Every
+    pending migration runs in its own transaction and is recorded in
+    schema_version, so an interrupted upgrade resumes at the failed step.
+
+    Parameters:
+        db_path (str): Path to the SQLite database; created when missing.
+
+    Returns:
+        int: The schema version of the database afterwards.
+    """
+    conn = connect(db_path, isolation_level=None)
+    try:
+        try:
+            version = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()[0] or 0
+        except sqlite3.OperationalError:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            version = 0
+        if version >= SCHEMA_VERSION:
+            return version
+
+        cursor = conn.cursor()
+        for migration_version, name, migration in MIGRATIONS:
+            if migration_version <= version:
+                continue
+            try:
+                cursor.execute('BEGIN')
+                migration(cursor, db_path)
+                cursor.execute('INSERT INTO schema_version (version, name) VALUES (?, ?)', (migration_version, name))
+                cursor.execute('COMMIT')
+            except sqlite3.Error as e:
+                cursor.execute('ROLLBACK')
+                logging.error(f"Schema migration {migration_version} ({name}) failed: {e}")
+                return version
+            version = migration_version
+            logging.info(f"Applied schema migration {version}: {name}")
+        return version
+    finally:
+        conn.close()
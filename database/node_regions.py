@@ -0,0 +1,54 @@
+import sqlite3
+import logging
+from database.connection import get_database
+
+def setup_node_region_mapping_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS node_region_mapping (
+            mapping_id INTEGER PRIMARY KEY,
+            node_id INTEGER,
+            region_id INTEGER,
+            FOREIGN KEY (node_id) REFERENCES nodes(node_id),
+            FOREIGN KEY (region_id) REFERENCES regions(region_id)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_node_region_mapping_node ON node_region_mapping (node_id, region_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_node_region_mapping_region ON node_region_mapping (region_id, node_id)')
+
+def fill_node_region_mapping(cursor):
+    """Rebuild node_region_mapping inside the caller's transaction; returns the mapped node count."""
+    setup_node_region_mapping_table(cursor)
+    cursor.execute('DELETE FROM node_region_mapping')
+    if not cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'nodes'").fetchone():
+        return 0
+    if not cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'regions'").fetchone():
+        return 0
+    cursor.execute('''
+        INSERT INTO node_region_mapping (node_id, region_id)
+        SELECT nodes.node_id, regions.region_id FROM nodes JOIN regions ON regions.region_id = nodes.node_id
+        ORDER BY nodes.node_id
+    ''')
+    return cursor.rowcount
+
+def store_node_region_mapping(db_path):
+    """
+    Rebuild node_region_mapping in one statement: every node owns the region with its id.
+
+    Returns the number of mapped nodes; 0 when the database has no nodes table yet.
+    """
+    try:
+        mapped = get_database(db_path).write(lambda conn: fill_node_region_mapping(conn.cursor()))
+        logging.info(f"Mapped {mapped} nodes to regions.")
+        return mapped
+    except sqlite3.Error as e:
+        logging.error(f"Error storing node region mapping: {e}")
+        return 0
+
+def load_node_region_mapping(db_path):
+    """Return {node_id: region_id} of every mapped node."""
+    try:
+        with get_database(db_path).read() as conn:
+            return dict(conn.execute('SELECT node_id, region_id FROM node_region_mapping ORDER BY node_id').fetchall())
+    except sqlite3.Error as e:
+        logging.error(f"Error loading node region mapping: {e}")
+        return {}
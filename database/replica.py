@@ -0,0 +1,75 @@
+import sqlite3
+import logging
+import itertools
+from contextlib import closing
+from database.connection import memory_path, get_database, close_database
+
+_replica_ids = itertools.count(1)
+
+class Replica:
+    """
+    In-memory copy of a world database for headless runs.
+
+    The copy is seeded from the source file through the SQLite backup API, so
+    many replicas can run side by side without contending for the file. Its
+    db_path works with every function that goes through get_database, such as
+    load_world, simulate and reset_simulation_data.
+
+    Parameters:
+        source_path (str): Database file the replica is copied from.
+        name (str, optional): Name of the in-memory database; unique per process.
+    """
+
+    def __init__(self, source_path, name=None):
+        self.source_path = source_path
+        self.name = name or f"replica-{next(_replica_ids)}"
+        self.db_path = memory_path(self.name)
+        # Private copy that reset() restores; only ever touched from the writer thread after this
+        self._checkpoint = sqlite3.connect(':memory:', check_same_thread=False)
+        with get_database(source_path).read() as conn:
+            conn.backup(self._checkpoint)
+        self.reset()
+        logging.info(f"Opened replica '{self.name}' of {source_path}.")
+
+    def reset(self):
+        """Restore the replica to its last checkpoint, the source file by default."""
+        get_database(self.db_path).write(lambda conn: self._checkpoint.backup(conn))
+
+    def checkpoint(self):
+        """Make the current state the one reset() returns to."""
+        get_database(self.db_path).write(lambda conn: conn.backup(self._checkpoint))
+
+    def snapshot(self, target_path=None):
+        """
+        Copy the replica to a database file.
+
+        The copy runs on the replica's writer thread, so it holds every write
+        queued before it and none queued after.
+
+        Parameters:
+            target_path (str, optional): File to write; the source file by default.
+        """
+        target_path = target_path or self.source_path
+
+        def write(conn):
+            # backup commits on its own; closing only releases the file
+            with closing(sqlite3.connect(target_path)) as target:
+                conn.backup(target)
+
+        try:
+            get_database(self.db_path).write(write)
+        except sqlite3.Error as e:
+            logging.error(f"Error writing replica '{self.name}' to {target_path}: {e}")
+            return
+        logging.info(f"Wrote replica '{self.name}' to {target_path}.")
+
+    def close(self):
+        """Drop the in-memory database; unsaved changes are lost."""
+        close_database(self.db_path)
+        self._checkpoint.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,180 @@
+import sqlite3
+import logging
+import numpy as np
+from database.connection import get_database
+from database.geometry import decode_vertices
+from database.topology import load_topology
+from database.node_regions import fill_node_region_mapping
+from database.boundaries import clear_boundary_versions
+
+# Stands for NULL in the vassal_to / regent_to arrays; node ids start at 1
+NO_NODE = 0
+
+NODE_STATE_DTYPE = np.dtype([
+    ('node_id', np.int64),
+    ('current_level', np.int64),
+    ('current_experience', np.int64),
+    ('vassal_to', np.int64),
+    ('regent_to', np.int64),
+])
+
+# Fixed statement strings, so the statement cache of the pooled connections reuses them
+SELECT_NODE_STATES = '''
+    SELECT node_id, current_level, current_experience, IFNULL(vassal_to, 0), IFNULL(regent_to, 0)
+    FROM nodes ORDER BY node_id
+'''
+SELECT_NODE_ADJACENCY = '''
+    SELECT region_adjacency.region_a, region_adjacency.region_b
+    FROM region_adjacency
+    JOIN nodes AS node_a ON node_a.node_id = region_adjacency.region_a
+    JOIN nodes AS node_b ON node_b.node_id = region_adjacency.region_b
+'''
+UPDATE_NODE_STATE = '''
+    UPDATE nodes SET current_level = ?, current_experience = ?, vassal_to = NULLIF(?, 0), regent_to = NULLIF(?, 0)
+    WHERE node_id = ?
+'''
+SELECT_NODE_IDS = 'SELECT node_id FROM nodes ORDER BY node_id'
+SELECT_LOD_GEOMETRY = 'SELECT region_id, geometry FROM region_lod WHERE lod = ? ORDER BY region_id'
+DELETE_REGION = 'DELETE FROM regions WHERE region_id = ?'
+# Outlines live only in the topology tables and adjacency only in region_adjacency; the legacy
+# geometry and adjacent_regions columns are left NULL and only read by migrations of old databases
+INSERT_REGION = 'INSERT INTO regions (region_id, x_REAL, y_REAL) VALUES (?, ?, ?)'
+REPLACE_REGION = 'INSERT OR REPLACE INTO regions (region_id, x_REAL, y_REAL) VALUES (?, ?, ?)'
+
+class World:
+    """
+    Simulation state of every node plus the node adjacency graph.
+
+    Parameters:
+        states (ndarray): NODE_STATE_DTYPE records ordered by node id.
+        indptr, indices (ndarray): CSR adjacency over row positions in states;
+            each row's neighbours are in ascending node id order.
+    """
+
+    def __init__(self, states, indptr, indices):
+        self.states = states
+        self.indptr = indptr
+        self.indices = indices
+
+    def __len__(self):
+        return len(self.states)
+
+    def neighbours(self, index):
+        """Row positions of the nodes whose regions border the node at index."""
+        return self.indices[self.indptr[index]:self.indptr[index + 1]]
+
+    def index_of(self, node_id):
+        return int(np.searchsorted(self.states['node_id'], node_id))
+
+def fetch_world(conn):
+    """Read a World with two bulk queries on an open connection."""
+    states = np.array(conn.execute(SELECT_NODE_STATES).fetchall(), dtype=NODE_STATE_DTYPE)
+    pairs = np.array(conn.execute(SELECT_NODE_ADJACENCY).fetchall(), dtype=np.int64).reshape(-1, 2)
+    positions = np.searchsorted(states['node_id'], pairs)
+    # Both directions of every edge, sorted by row then by neighbour
+    rows, cols = np.concatenate((positions[:, 0], positions[:, 1])), np.concatenate((positions[:, 1], positions[:, 0]))
+    order = np.lexsort((cols, rows))
+    indptr = np.concatenate(([0], np.cumsum(np.bincount(rows, minlength=len(states)))))
+    return World(states, indptr, cols[order])
+
+def write_node_states(conn, states):
+    """Write level, experience and hierarchy of every record in one executemany."""
+    conn.executemany(UPDATE_NODE_STATE, zip(states['current_level'].tolist(), states['current_experience'].tolist(),
+                                            states['vassal_to'].tolist(), states['regent_to'].tolist(),
+                                            states['node_id'].tolist()))
+
+def write_current_node_states(conn, states):
+    """
+    Write states only if the stored node ids are still the ones they were read with.
+
+    Returns:
+        bool: False when a seed edit removed or renumbered nodes in the meantime.
+    """
+    node_ids = np.array([row[0] for row in conn.execute(SELECT_NODE_IDS)], dtype=np.int64)
+    if not np.array_equal(node_ids, states['node_id']):
+        return False
+    write_node_states(conn, states)
+    return True
+
+def remove_node(conn, node_id, renamed=None):
+    """
+    Delete a node and clear the links to it; renamed=(old_id, node_id) then moves
+    another node into the freed id, links included.
+    """
+    conn.execute('DELETE FROM nodes WHERE node_id = ?', (node_id,))
+    conn.execute('UPDATE nodes SET vassal_to = NULL WHERE vassal_to = ?', (node_id,))
+    conn.execute('UPDATE nodes SET regent_to = NULL WHERE regent_to = ?', (node_id,))
+    if renamed is not None:
+        old_id, new_id = renamed
+        conn.execute('UPDATE nodes SET node_id = ? WHERE node_id = ?', (new_id, old_id))
+        conn.execute('UPDATE nodes SET vassal_to = ? WHERE vassal_to = ?', (new_id, old_id))
+        conn.execute('UPDATE nodes SET regent_to = ? WHERE regent_to = ?', (new_id, old_id))
+
+def load_world(db_path):
+    """Return the World of a database from one read snapshot, or None on error."""
+    try:
+        with get_database(db_path).read() as conn:
+            return fetch_world(conn)
+    except sqlite3.Error as e:
+        logging.error(f"Error loading world from DB: {e}")
+        return None
+
+def save_node_states(db_path, states):
+    """Persist NODE_STATE_DTYPE records in a single write transaction."""
+    try:
+        get_database(db_path).write(write_node_states, states)
+    except sqlite3.Error as e:
+        logging.error(f"Error saving node states to DB: {e}")
+
+def load_geometry(db_path, lod=0):
+    """
+    Return {region_id: closed ring} at a level of detail.
+
+    Level 0 is the full-resolution shared-vertex topology; higher levels are the
+    simplified rings of region_lod.
+    """
+    if lod == 0:
+        topology = load_topology(db_path)
+        return topology.region_rings() if topology is not None else {}
+    try:
+        with get_database(db_path).read() as conn:
+            return {region_id: decode_vertices(geometry) for region_id, geometry in conn.execute(SELECT_LOD_GEOMETRY, (lod,))}
+    except sqlite3.Error as e:
+        logging.error(f"Error loading level {lod} geometry from DB: {e}")
+        return {}
+
+def save_regions(db_path, rows, deleted_ids=(), replace=False, removed_node=None, renamed=None):
+    """
+    Write region rows and refresh node_region_mapping in one transaction.
+
+    Boundary versions are keyed by region id and describe the regions before
+    this write, so they are dropped with it; the next save starts a new history
+    from the written regions.
+
+    Parameters:
+        rows (list): (region_id, x, y) tuples.
+        deleted_ids (iterable, optional): Regions to delete first.
+        replace (bool, optional): Overwrite existing rows instead of failing on them.
+        removed_node (int, optional): Node whose seed was removed; see remove_node.
+        renamed (tuple, optional): (old_id, new_id) of a region that moved into the
+            removed id; its node moves with it.
+
+    Returns:
+        set: Ids of the written regions; empty when the write failed.
+    """
+    def write(conn):
+        conn.executemany(DELETE_REGION, ((int(region_id),) for region_id in deleted_ids))
+        conn.executemany(REPLACE_REGION if replace else INSERT_REGION, rows)
+        if removed_node is not None:
+            remove_node(conn, removed_node, renamed)
+        fill_node_region_mapping(conn.cursor())
+        return clear_boundary_versions(conn.cursor())
+
+    try:
+        dropped_versions = get_database(db_path).write(write)
+    except sqlite3.Error as e:
+        logging.error(f"Error writing regions to DB: {e}")
+        return set()
+    if dropped_versions:
+        logging.info(f"Dropped {dropped_versions} boundary versions of the replaced regions.")
+    return {row[0] for row in rows}
@@ -0,0 +1,394 @@
+import sqlite3
+import logging
+import numpy as np
+from database.geometry import decode_vertices
+from database.connection import get_database
+
+# Region id used on the outer side of an edge that borders no region
+NO_REGION = 0
+
+def signed_area(ring):
+    x, y = ring[:, 0], ring[:, 1]
+    return 0.5 * (np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1)))
+
+class Topology:
+    """
+    Planar boundary model shared by all regions.
+
+    Attributes:
+        vertices (ndarray): (n, 2) vertex coordinates, indexed by vertex id.
+        edges (ndarray): (m, 2) start and end vertex ids, indexed by edge id.
+        left_region (ndarray): Region on the left of each edge, walking start to end.
+        right_region (ndarray): Region on the right of each edge, or NO_REGION.
+        face_region (ndarray): Region id of every face entry, grouped by region.
+        face_edge (ndarray): Edge id of every face entry, in ring order.
+        face_reversed (ndarray): True where the face walks the edge end to start.
+    """
+
+    def __init__(self, vertices, edges, left_region, right_region, face_region, face_edge, face_reversed):
+        self.vertices = vertices
+        self.edges = edges
+        self.left_region = left_region
+        self.right_region = right_region
+        self.face_region = face_region
+        self.face_edge = face_edge
+        self.face_reversed = face_reversed
+        self.region_ids, self.face_offsets = self._face_offsets()
+
+    def _face_offsets(self):
+        if len(self.face_region) == 0:
+            return np.empty(0, dtype=np.int64), np.zeros(1, dtype=np.int64)
+        change = np.flatnonzero(np.diff(self.face_region)) + 1
+        starts = np.concatenate(([0], change))
+        return self.face_region[starts], np.concatenate((starts, [len(self.face_region)]))
+
+    def region_vertex_ids(self):
+        """Return {region_id: vertex ids in ring order} for every face."""
+        start_vertices = np.where(self.face_reversed, self.edges[self.face_edge, 1], self.edges[self.face_edge, 0])
+        return {int(region_id): start_vertices[self.face_offsets[i]:self.face_offsets[i + 1]]
+                for i, region_id in enumerate(self.region_ids)}
+
+    def region_rings(self):
+        """Return {region_id: closed (n + 1, 2) coordinate ring} for every face."""
+        rings = {}
+        for region_id, vertex_ids in self.region_vertex_ids().items():
+            rings[region_id] = self.vertices[np.append(vertex_ids, vertex_ids[:1])]
+        return rings
+
+    def edge_lengths(self):
+        start, end = self.vertices[self.edges[:, 0]], self.vertices[self.edges[:, 1]]
+        return np.hypot(*(end - start).T)
+
+    def border_lengths(self, region_ids=None):
+        """
+        Return {(region_a, region_b): shared border length} with region_a < region_b,
+        or only the pairs touching region_ids.
+        """
+        shared = (self.left_region != NO_REGION) & (self.right_region != NO_REGION)
+        if region_ids is not None:
+            region_ids = np.fromiter(region_ids, dtype=np.int64)
+            shared &= np.isin(self.left_region, region_ids) | np.isin(self.right_region, region_ids)
+        a = np.minimum(self.left_region[shared], self.right_region[shared])
+        b = np.maximum(self.left_region[shared], self.right_region[shared])
+        lengths = self.edge_lengths()[shared]
+        pairs, inverse = np.unique(np.stack((a, b), axis=1), axis=0, return_inverse=True)
+        totals = np.bincount(inverse.ravel(), weights=lengths, minlength=len(pairs))
+        return {(int(pair[0]), int(pair[1])): float(total) for pair, total in zip(pairs, totals)}
+
+    def regions_around(self, region_ids):
+        """Return region_ids with every region that shares a vertex with one of them."""
+        region_ids = np.fromiter(region_ids, dtype=np.int64)
+        touched = np.isin(self.left_region, region_ids) | np.isin(self.right_region, region_ids)
+        vertex_ids = np.unique(self.edges[touched])
+        around = np.isin(self.edges, vertex_ids).any(axis=1)
+        found = set(self.left_region[around].tolist()) | set(self.right_region[around].tolist()) | set(region_ids.tolist())
+        return found - {NO_REGION}
+
+    def adjacency(self):
+        """Return {region_id: sorted neighbouring region ids} from shared edges."""
+        adjacency = {int(region_id): set() for region_id in self.region_ids}
+        for a, b in self.border_lengths():
+            adjacency[a].add(b)
+            adjacency[b].add(a)
+        return {region_id: sorted(neighbours) for region_id, neighbours in adjacency.items()}
+
+def build_topology(rings, tolerance=1e-6):
+    """
+    Deduplicate the vertices and edges of a set of region rings.
+
+    Parameters:
+        rings (dict): {region_id: (n, 2) ring coordinates}; rings may be closed.
+        tolerance (float, optional): Coordinates closer than this are one vertex.
+
+    Returns:
+        Topology: Shared vertices, edges and the edge ring of every region.
+    """
+    region_ids, ring_coords = [], []
+    for region_id in sorted(rings):
+        ring = np.asarray(rings[region_id], dtype=np.float64).reshape(-1, 2)
+        if len(ring) > 1 and np.array_equal(ring[0], ring[-1]):
+            ring = ring[:-1]
+        if len(ring) < 3:
+            logging.warning(f"Region {region_id} has fewer than three vertices; left out of topology.")
+            continue
+        # Orient every ring counter-clockwise so neighbours walk shared edges in opposite directions
+        if signed_area(ring) < 0:
+            ring = ring[::-1]
+        region_ids.append(region_id)
+        ring_coords.append(ring)
+
+    if not ring_coords:
+        empty = np.empty(0, dtype=np.int64)
+        return Topology(np.empty((0, 2)), np.empty((0, 2), dtype=np.int64), empty, empty, empty, empty, empty.astype(bool))
+
+    lengths = np.array([len(ring) for ring in ring_coords])
+    all_coords = np.concatenate(ring_coords)
+    owner = np.repeat(region_ids, lengths)
+
+    keys = np.round(all_coords / tolerance).astype(np.int64)
+    _, first_index, vertex_of = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    vertex_of = vertex_of.ravel()
+    vertices = all_coords[first_index]
+
+    # Successor of every ring position, wrapping back to the start of its ring
+    ring_starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    successor = np.arange(len(all_coords)) + 1
+    successor[ring_starts + lengths - 1] = ring_starts
+
+    start, end = vertex_of, vertex_of[successor]
+    keep = start != end
+    start, end, owner = start[keep], end[keep], owner[keep]
+    reversed_ = start > end
+
+    num_vertices = len(vertices)
+    edge_keys = np.minimum(start, end) * num_vertices + np.maximum(start, end)
+    unique_edges, edge_of = np.unique(edge_keys, return_inverse=True)
+    edges = np.stack((unique_edges // num_vertices, unique_edges % num_vertices), axis=1)
+
+    left_region = np.full(len(edges), NO_REGION, dtype=np.int64)
+    right_region = np.full(len(edges), NO_REGION, dtype=np.int64)
+    left_region[edge_of[~reversed_]] = owner[~reversed_]
+    right_region[edge_of[reversed_]] = owner[reversed_]
+
+    conflicts = len(owner) - np.count_nonzero(left_region) - np.count_nonzero(right_region)
+    if conflicts:
+        logging.warning(f"{conflicts} edges are walked in the same direction by more than one region.")
+
+    return Topology(vertices, edges, left_region, right_region, owner, edge_of, reversed_)
+
+def _vertex_keys(coords, tolerance):
+    return [tuple(key) for key in np.round(coords / tolerance).astype(np.int64).tolist()]
+
+def _compact(alive):
+    """
+    Renumber live ids to 0..count - 1 by moving the highest live ids into the holes.
+
+    Returns:
+        tuple: (mapping from old to new id, live count, ids that moved).
+    """
+    count = int(np.count_nonzero(alive))
+    mapping = np.arange(len(alive))
+    movers = np.flatnonzero(alive[count:]) + count
+    mapping[movers] = np.flatnonzero(~alive[:count])
+    return mapping, count, movers
+
+def patch_topology(topology, rings, region_ids, tolerance=1e-6):
+    """
+    Replace the faces of some regions without rebuilding the rest of the topology.
+
+    Vertices and edges that stay in use keep their ids. Ids freed by the edit
+    are filled by moving the highest ids down, so ids stay contiguous and only
+    the moved rows change. The result describes the same faces, borders and
+    shared vertices as build_topology over all rings, up to the numbering.
+
+    Parameters:
+        topology (Topology): Current topology.
+        rings (dict): {region_id: ring} of the replaced regions that still exist.
+        region_ids (iterable): Every replaced region, including removed ones.
+        tolerance (float, optional): Coordinates closer than this are one vertex.
+
+    Returns:
+        tuple: (Topology, changes); changes holds the 'vertex_ids', 'edge_ids' and
+        'region_ids' whose rows differ from the stored topology.
+    """
+    region_ids = np.array(sorted({int(region_id) for region_id in region_ids}), dtype=np.int64)
+    local = build_topology({region_id: rings[region_id] for region_id in region_ids.tolist() if region_id in rings}, tolerance)
+
+    replaced_left, replaced_right = np.isin(topology.left_region, region_ids), np.isin(topology.right_region, region_ids)
+    # The new rings can only meet the old topology where the replaced faces were
+    touched_edges = np.flatnonzero(replaced_left | replaced_right)
+    touched_vertices = np.unique(topology.edges[touched_edges])
+    vertex_by_key = dict(zip(_vertex_keys(topology.vertices[touched_vertices], tolerance), touched_vertices.tolist()))
+    edge_by_key = {(min(start, end), max(start, end)): edge_id
+                   for edge_id, (start, end) in zip(touched_edges.tolist(), topology.edges[touched_edges].tolist())}
+
+    num_vertices, num_edges = len(topology.vertices), len(topology.edges)
+    vertex_of = np.empty(len(local.vertices), dtype=np.int64)
+    added_vertices = []
+    for index, key in enumerate(_vertex_keys(local.vertices, tolerance)):
+        vertex_id = vertex_by_key.get(key)
+        if vertex_id is None:
+            vertex_id = num_vertices + len(added_vertices)
+            added_vertices.append(index)
+        vertex_of[index] = vertex_id
+    vertices = np.concatenate((topology.vertices, local.vertices[added_vertices]))
+
+    local_edges = vertex_of[local.edges].reshape(-1, 2)
+    edge_of = np.empty(len(local_edges), dtype=np.int64)
+    added_edges = []
+    for index, (start, end) in enumerate(local_edges.tolist()):
+        edge_id = edge_by_key.get((min(start, end), max(start, end)))
+        if edge_id is None:
+            edge_id = num_edges + len(added_edges)
+            added_edges.append(index)
+        edge_of[index] = edge_id
+    edges = np.concatenate((topology.edges, local_edges[added_edges])).reshape(-1, 2)
+
+    left_region = np.concatenate((np.where(replaced_left, NO_REGION, topology.left_region), np.full(len(added_edges), NO_REGION)))
+    right_region = np.concatenate((np.where(replaced_right, NO_REGION, topology.right_region), np.full(len(added_edges), NO_REGION)))
+    face_edge = edge_of[local.face_edge]
+    walk_start = vertex_of[np.where(local.face_reversed, local.edges[local.face_edge, 1], local.edges[local.face_edge, 0])]
+    face_reversed = walk_start != edges[face_edge, 0]
+    left_region[face_edge[~face_reversed]] = local.face_region[~face_reversed]
+    right_region[face_edge[face_reversed]] = local.face_region[face_reversed]
+
+    kept_faces = ~np.isin(topology.face_region, region_ids)
+    face_region = np.concatenate((topology.face_region[kept_faces], local.face_region))
+    face_edge = np.concatenate((topology.face_edge[kept_faces], face_edge))
+    face_reversed = np.concatenate((topology.face_reversed[kept_faces], face_reversed))
+    order = np.argsort(face_region, kind='stable')
+    face_region, face_edge, face_reversed = face_region[order], face_edge[order], face_reversed[order]
+
+    # Drop the edges no face walks any more and the vertices no edge uses
+    live_edges = (left_region != NO_REGION) | (right_region != NO_REGION)
+    live_vertices = np.zeros(len(vertices), dtype=bool)
+    live_vertices[edges[live_edges].ravel()] = True
+    vertex_mapping, vertex_count, moved_vertices = _compact(live_vertices)
+    edge_mapping, edge_count, moved_edges = _compact(live_edges)
+
+    changed_vertices = np.concatenate((np.arange(num_vertices, len(vertices)), moved_vertices))
+    old_sides = (left_region[:num_edges] != topology.left_region) | (right_region[:num_edges] != topology.right_region)
+    changed_edges = np.concatenate((np.flatnonzero(old_sides), np.arange(num_edges, len(edges)), moved_edges,
+                                    np.flatnonzero(np.isin(edges, moved_vertices).any(axis=1))))
+    changed_edges = changed_edges[live_edges[changed_edges]]
+    changed_regions = np.concatenate((region_ids, face_region[np.isin(face_edge, moved_edges)]))
+
+    compact_vertices = np.empty((vertex_count, 2))
+    compact_vertices[vertex_mapping[live_vertices]] = vertices[live_vertices]
+    compact_edges = np.empty((edge_count, 2), dtype=np.int64)
+    compact_edges[edge_mapping[live_edges]] = vertex_mapping[edges[live_edges]]
+    compact_left = np.empty(edge_count, dtype=np.int64)
+    compact_right = np.empty(edge_count, dtype=np.int64)
+    compact_left[edge_mapping[live_edges]] = left_region[live_edges]
+    compact_right[edge_mapping[live_edges]] = right_region[live_edges]
+
+    patched = Topology(compact_vertices, compact_edges, compact_left, compact_right,
+                       face_region, edge_mapping[face_edge], face_reversed)
+    changes = {
+        'vertex_ids': np.unique(vertex_mapping[changed_vertices[live_vertices[changed_vertices]]]),
+        'edge_ids': np.unique(edge_mapping[changed_edges]),
+        'region_ids': np.unique(changed_regions),
+    }
+    return patched, changes
+
+def setup_topology_tables(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS topo_vertices (
+            vertex_id INTEGER PRIMARY KEY,
+            x REAL NOT NULL,
+            y REAL NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS topo_edges (
+            edge_id INTEGER PRIMARY KEY,
+            start_vertex INTEGER NOT NULL REFERENCES topo_vertices(vertex_id),
+            end_vertex INTEGER NOT NULL REFERENCES topo_vertices(vertex_id),
+            left_region INTEGER NOT NULL,
+            right_region INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS topo_faces (
+            region_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            edge_id INTEGER NOT NULL REFERENCES topo_edges(edge_id),
+            reversed INTEGER NOT NULL,
+            PRIMARY KEY (region_id, position)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_topo_faces_edge ON topo_faces(edge_id)')
+
+def _face_positions(topology):
+    return np.arange(len(topology.face_region)) - np.repeat(topology.face_offsets[:-1], np.diff(topology.face_offsets))
+
+def store_topology(db_path, topology):
+    face_positions = _face_positions(topology)
+    def write(conn):
+        cursor = conn.cursor()
+        setup_topology_tables(cursor)
+        cursor.execute('DELETE FROM topo_faces')
+        cursor.execute('DELETE FROM topo_edges')
+        cursor.execute('DELETE FROM topo_vertices')
+        cursor.executemany('INSERT INTO topo_vertices (vertex_id, x, y) VALUES (?, ?, ?)',
+                           zip(range(len(topology.vertices)), *topology.vertices.T.tolist()))
+        cursor.executemany('INSERT INTO topo_edges (edge_id, start_vertex, end_vertex, left_region, right_region) VALUES (?, ?, ?, ?, ?)',
+                           zip(range(len(topology.edges)), *topology.edges.T.tolist(),
+                               topology.left_region.tolist(), topology.right_region.tolist()))
+        cursor.executemany('INSERT INTO topo_faces (region_id, position, edge_id, reversed) VALUES (?, ?, ?, ?)',
+                           zip(topology.face_region.tolist(), face_positions.tolist(),
+                               topology.face_edge.tolist(), topology.face_reversed.astype(int).tolist()))
+
+    try:
+        get_database(db_path).write(write)
+        logging.info(f"Stored topology with {len(topology.vertices)} vertices, {len(topology.edges)} edges "
+                     f"and {len(topology.region_ids)} faces.")
+    except sqlite3.Error as e:
+        logging.error(f"Error storing topology in DB: {e}")
+
+def write_topology_changes(conn, topology, changes):
+    """Write the rows named by patch_topology changes and drop ids past the end of the topology."""
+    cursor = conn.cursor()
+    setup_topology_tables(cursor)
+    vertex_ids, edge_ids = changes['vertex_ids'], changes['edge_ids']
+    region_ids = changes['region_ids'].tolist()
+    cursor.execute('DELETE FROM topo_vertices WHERE vertex_id >= ?', (len(topology.vertices),))
+    cursor.execute('DELETE FROM topo_edges WHERE edge_id >= ?', (len(topology.edges),))
+    cursor.executemany('INSERT OR REPLACE INTO topo_vertices (vertex_id, x, y) VALUES (?, ?, ?)',
+                       zip(vertex_ids.tolist(), *topology.vertices[vertex_ids].reshape(-1, 2).T.tolist()))
+    cursor.executemany('INSERT OR REPLACE INTO topo_edges (edge_id, start_vertex, end_vertex, left_region, right_region) VALUES (?, ?, ?, ?, ?)',
+                       zip(edge_ids.tolist(), *topology.edges[edge_ids].reshape(-1, 2).T.tolist(),
+                           topology.left_region[edge_ids].tolist(), topology.right_region[edge_ids].tolist()))
+    cursor.executemany('DELETE FROM topo_faces WHERE region_id = ?', ((region_id,) for region_id in region_ids))
+    faces = np.flatnonzero(np.isin(topology.face_region, region_ids))
+    cursor.executemany('INSERT INTO topo_faces (region_id, position, edge_id, reversed) VALUES (?, ?, ?, ?)',
+                       zip(topology.face_region[faces].tolist(), _face_positions(topology)[faces].tolist(),
+                           topology.face_edge[faces].tolist(), topology.face_reversed[faces].astype(int).tolist()))
+
+def store_topology_changes(db_path, topology, changes):
+    try:
+        get_database(db_path).write(write_topology_changes, topology, changes)
+        logging.info(f"Rewrote {len(changes['vertex_ids'])} topology vertices, {len(changes['edge_ids'])} edges "
+                     f"and the faces of {len(changes['region_ids'])} regions.")
+    except sqlite3.Error as e:
+        logging.error(f"Error storing topology changes in DB: {e}")
+
+def read_topology(cursor):
+    """Read the topology tables through an open cursor, e.g. inside a migration."""
+    vertices = np.array(cursor.execute('SELECT x, y FROM topo_vertices ORDER BY vertex_id').fetchall(), dtype=np.float64).reshape(-1, 2)
+    edges = np.array(cursor.execute('SELECT start_vertex, end_vertex, left_region, right_region FROM topo_edges ORDER BY edge_id').fetchall(), dtype=np.int64).reshape(-1, 4)
+    faces = np.array(cursor.execute('SELECT region_id, edge_id, reversed FROM topo_faces ORDER BY region_id, position').fetchall(), dtype=np.int64).reshape(-1, 3)
+    return Topology(vertices, edges[:, :2], edges[:, 2], edges[:, 3], faces[:, 0], faces[:, 1], faces[:, 2].astype(bool))
+
+def load_topology(db_path):
+    try:
+        with get_database(db_path).read() as conn:
+            return read_topology(conn.cursor())
+    except sqlite3.Error as e:
+        logging.error(f"Error loading topology from DB: {e}")
+        return None
+
+def update_vertex_position(db_path, vertex_id, x, y):
+    update_vertex_positions(db_path, [(vertex_id, x, y)])
+
+def update_vertex_positions(db_path, positions):
+    """Move shared vertices; every (vertex_id, x, y) is a single-row update."""
+    try:
+        get_database(db_path).executemany('UPDATE topo_vertices SET x = ?, y = ? WHERE vertex_id = ?',
+                                          ((x, y, vertex_id) for vertex_id, x, y in positions))
+    except sqlite3.Error as e:
+        logging.error(f"Error updating topology vertices in DB: {e}")
+
+def ensure_topology(db_path):
+    """Build the topology tables from regions.geometry if they are still empty."""
+    try:
+        with get_database(db_path).read() as conn:
+            cursor = conn.cursor()
+            if cursor.execute('SELECT 1 FROM topo_faces LIMIT 1').fetchone():
+                return
+            rows = cursor.execute('SELECT region_id, geometry FROM regions WHERE geometry IS NOT NULL').fetchall()
+    except sqlite3.Error as e:
+        logging.error(f"Error checking topology tables: {e}")
+        return
+    if rows:
+        store_topology(db_path, build_topology({region_id: decode_vertices(geometry) for region_id, geometry in rows}))
@@ -1,82 +1,39 @@
 import sqlite3
 import logging
+from config.settings import Settings
+from database.migrations import migrate
+from database.boundaries import ROOT_VERSION, save_boundary_version, checkout_boundary_version
 
 def update_database_schema(db_path):
-    connection = sqlite3.connect(db_path)
-    cursor = connection.cursor()
-
-    # Alter the 'nodes' table to add x and y coordinates separately
-    try:
-        cursor.execute('ALTER TABLE nodes ADD COLUMN x_coordinate REAL')
-    except sqlite3.OperationalError:
-        pass  # Column already exists
-
-    try:
-        cursor.execute('ALTER TABLE nodes ADD COLUMN y_coordinate REAL')
-    except sqlite3.OperationalError:
-        pass  # Column already exists
-
-    # Create the 'regions' table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS regions (
-            region_id INTEGER PRIMARY KEY,
-            vertices TEXT,
-            additional_info TEXT
-        )
-    ''')
-
-    # Create the 'node_region_mapping' table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS node_region_mapping (
-            mapping_id INTEGER PRIMARY KEY,
-            node_id INTEGER,
-            region_id INTEGER,
-            FOREIGN KEY (node_id) REFERENCES nodes(node_id),
-            FOREIGN KEY (region_id) REFERENCES regions(region_id)
-        )
-    ''')
-
-    connection.commit()
-    connection.close()
-
-def update_boundaries_in_database(new_boundaries):
-    try:
-        connection = sqlite3.connect(db_path)
-        cursor = connection.cursor()
-        for boundary in new_boundaries:
-            cursor.execute('''
-                UPDATE regions
-                SET vertices = ?
-                WHERE region_id = ?
-            ''', (boundary['vertices'], boundary['id']))
-        connection.commit()
-        logging.info("Boundaries updated successfully in the database.")
-    except sqlite3.Error as e:
-        logging.error(f"Database error during update: {e}")
-    finally:
-        connection.close()
-
-def revert_boundaries_to_original():
+    # Kept for existing callers; the versioned migrations own the schema now
+    return migrate(db_path)
+
+def migrate_vertices_to_geometry(db_path):
+    return migrate(db_path)
+
+def update_boundaries_in_database(db_path, vertex_positions, version_name=None):
+    """
+    Save moved shared vertices as a new boundary version in one transaction.
+
+    vertex_positions holds (vertex_id, x, y) of every moved vertex; the rings
+    of the regions around them are read back from the topology. Returns the
+    changed region ids, or None when the save failed and nothing was written.
+    """
+    version_name, changed = save_boundary_version(db_path, vertex_positions, version_name)
+    if version_name is None:
+        return None
+    logging.info("Boundaries updated successfully in the database.")
+    return changed
+
+def revert_boundaries_to_original(db_path):
+    """Check out the boundaries the map was generated with; later versions are kept."""
     try:
-        connection = sqlite3.connect(db_path)
-        cursor = connection.cursor()
-        cursor.execute('''
-            SELECT region_id, vertices FROM original_regions
-        ''')
-        original_boundaries = cursor.fetchall()
-        for region_id, vertices in original_boundaries:
-            cursor.execute('''
-                UPDATE regions
-                SET vertices = ?
-                WHERE region_id = ?
-            ''', (vertices, region_id))
-        connection.commit()
+        changed = checkout_boundary_version(db_path, ROOT_VERSION)
         logging.info("Boundaries reverted to original successfully in the database.")
-    except sqlite3.Error as e:
+        return changed
+    except (sqlite3.Error, ValueError) as e:
         logging.error(f"Database error during revert: {e}")
-    finally:
-        connection.close()
+        return []
 
-# Call the function with the path to your database
-db_path = 'E:\\AoC_Sim\\SQLite_Queries\\nodes.db'
-update_database_schema(db_path)
+if __name__ == "__main__":
+    update_database_schema(Settings().get('db_path'))
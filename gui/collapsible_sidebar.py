@@ -10,6 +10,8 @@ class CollapsibleSidebar(QWidget):
     editModeChanged = pyqtSignal(bool)
     keepBoundaryChanges = pyqtSignal()
     discardBoundaryChanges = pyqtSignal()
+    saveBoundaryVersion = pyqtSignal()
+    loadBoundaryVersion = pyqtSignal()
 
     def __init__(self, parent=None):
         super(CollapsibleSidebar, self).__init__(parent)
@@ -48,9 +50,18 @@ class CollapsibleSidebar(QWidget):
         self.contentLayout.addWidget(self.keepChangesButton)
         self.contentLayout.addWidget(self.discardChangesButton)
 
+        self.saveVersionButton = QPushButton('Save Boundary Version')
+        self.saveVersionButton.setFixedSize(button_width, button_height)
+        self.loadVersionButton = QPushButton('Load Boundary Version')
+        self.loadVersionButton.setFixedSize(button_width, button_height)
+        self.contentLayout.addWidget(self.saveVersionButton)
+        self.contentLayout.addWidget(self.loadVersionButton)
+
         self.editRegionBoundariesButton.clicked.connect(self.toggleEditMode)
         self.keepChangesButton.clicked.connect(self.keepBoundaryChangesClicked)
         self.discardChangesButton.clicked.connect(self.discardBoundaryChangesClicked)
+        self.saveVersionButton.clicked.connect(self.saveBoundaryVersion.emit)
+        self.loadVersionButton.clicked.connect(self.loadBoundaryVersion.emit)
 
         self.startButton = QPushButton('Start New Simulation')
         self.startButton.setFixedSize(button_width, button_height)
@@ -84,10 +95,14 @@ class CollapsibleSidebar(QWidget):
             logging.debug(f"Edit mode toggled to {self.editMode}")
             if self.editMode:
                 self.editRegionBoundariesButton.hide()
+                self.saveVersionButton.hide()
+                self.loadVersionButton.hide()
                 self.keepChangesButton.show()
                 self.discardChangesButton.show()
             else:
                 self.editRegionBoundariesButton.show()
+                self.saveVersionButton.show()
+                self.loadVersionButton.show()
                 self.keepChangesButton.hide()
                 self.discardChangesButton.hide()
             self.editModeChanged.emit(self.editMode)
@@ -1,4 +1,4 @@
-from PyQt5.QtWidgets import QGraphicsEllipseItem, QGraphicsPolygonItem, QGraphicsItem
+from PyQt5.QtWidgets import QGraphicsEllipseItem, QGraphicsPolygonItem, QGraphicsItem, QStyleOptionGraphicsItem
 from PyQt5.QtGui import QBrush, QColor, QPen
 from PyQt5.QtCore import Qt, QPointF
 import logging
@@ -43,7 +43,7 @@ class VertexItem(QGraphicsEllipseItem):
         parent_polygon (PolygonItem): The parent polygon to which this vertex belongs.
     """
     
-    def __init__(self, x, y, radius, shared_vertex_manager):
+    def __init__(self, x, y, radius, shared_vertex_manager, vertex_id=None):
         """
         Initialize a VertexItem.
 
@@ -52,6 +52,7 @@ class VertexItem(QGraphicsEllipseItem):
             y (float): The y-coordinate of the vertex.
             radius (float): The radius of the vertex circle.
             shared_vertex_manager (SharedVertexManager): The shared vertex manager.
+            vertex_id (int, optional): The topology vertex this item moves.
         """
         super().__init__(-radius, -radius, radius * 2, radius * 2)  # Create a circle with the given radius
         self.setPos(x, y)  # Set the position of the vertex
@@ -60,6 +61,7 @@ class VertexItem(QGraphicsEllipseItem):
         self.setFlag(QGraphicsEllipseItem.ItemIsMovable)  # Make the vertex movable
         self.setFlag(QGraphicsEllipseItem.ItemSendsGeometryChanges)  # Enable geometry change notifications
         self.shared_vertex_manager = shared_vertex_manager  # Store the shared vertex manager
+        self.vertex_id = vertex_id  # Store the topology vertex id
 
     def itemChange(self, change, value):
         """
@@ -79,7 +81,10 @@ class VertexItem(QGraphicsEllipseItem):
                 try:
                     logging.getLogger().setLevel(logging.CRITICAL)
                     old_pos = self.pos()
-                    self.shared_vertex_manager.update_vertex(old_pos, new_pos)
+                    if self.vertex_id is None:
+                        self.shared_vertex_manager.update_vertex(old_pos, new_pos)
+                    else:
+                        self.shared_vertex_manager.update_vertex(old_pos, new_pos, vertex_id=self.vertex_id)
                 finally:
                     logging.getLogger().setLevel(logging.DEBUG)
                 logging.debug(f"Vertex moved to: {new_pos}")
@@ -95,9 +100,12 @@ class PolygonItem(QGraphicsPolygonItem):
         edit_mode (bool): Indicates whether the polygon is in edit mode.
         vertex_radius (int): The radius of the vertex items.
         vertex_items (list of VertexItem): The list of vertex items in this polygon.
+        vertex_ids (list of int): Topology vertex id of each polygon point, if known.
+        lod_polygons (list of tuples): (tolerance, QPolygonF) simplified outlines, finest first.
+        lod_pixel_error (float): Largest on-screen error, in pixels, allowed for a simplified outline.
     """
 
-    def __init__(self, polygon, region_id=None, shared_vertex_manager=None, parent=None):
+    def __init__(self, polygon, region_id=None, shared_vertex_manager=None, parent=None, vertex_ids=None):
         """
         Initialize a PolygonItem.
 
@@ -106,6 +114,7 @@ class PolygonItem(QGraphicsPolygonItem):
             region_id (int, optional): The identifier for the region.
             shared_vertex_manager (SharedVertexManager, optional): The shared vertex manager.
             parent (QGraphicsItem, optional): The parent QGraphicsItem.
+            vertex_ids (list of int, optional): Topology vertex id of each point in polygon.
         """
         super().__init__(polygon, parent)  # Initialize the base class with the polygon shape and parent
         self.region_id = region_id  # Store the region identifier
@@ -118,9 +127,56 @@ class PolygonItem(QGraphicsPolygonItem):
         self.setPen(QPen(Qt.black, 2))  # Set the pen for the polygon border
         self.vertex_radius = 5  # Set the radius for vertex items
         self.vertex_items = []  # Initialize the list of vertex items
+        self.vertex_ids = list(vertex_ids) if vertex_ids is not None else None  # Store the topology vertex ids
+        self.lod_polygons = []  # Simplified outlines drawn when zoomed out
+        self.lod_pixel_error = 0.75
 
-        for point in self.polygon():
-            self.shared_vertex_manager.add_vertex(point.x(), point.y(), self)  # Add vertices to the shared vertex manager
+        if self.vertex_ids is None:
+            for point in self.polygon():
+                self.shared_vertex_manager.add_vertex(point.x(), point.y(), self)  # Add vertices to the shared vertex manager
+        else:
+            for vertex_id, point in zip(self.vertex_ids, self.polygon()):
+                self.shared_vertex_manager.add_vertex(point.x(), point.y(), self, vertex_id=vertex_id)  # Share vertices by topology id
+
+    def set_lod_polygons(self, lod_polygons):
+        """
+        Set the simplified outlines used for painting at low zoom.
+
+        Parameters:
+            lod_polygons (dict): {tolerance: QPolygonF} in map units.
+        """
+        self.lod_polygons = sorted(lod_polygons.items(), key=lambda level: level[0])
+        self.update()
+
+    def lod_polygon(self, scale):
+        """
+        Return the coarsest outline whose error stays below lod_pixel_error at scale.
+
+        Parameters:
+            scale (float): Screen pixels per map unit.
+
+        Returns:
+            QPolygonF: The outline to paint; the full polygon when editing or zoomed in.
+        """
+        chosen = self.polygon()
+        if self.edit_mode:
+            return chosen
+        for tolerance, polygon in self.lod_polygons:
+            if tolerance * scale > self.lod_pixel_error:
+                break
+            chosen = polygon
+        return chosen
+
+    def paint(self, painter, option, widget=None):
+        """
+        Paint the outline at the level of detail matching the current zoom.
+        """
+        if not self.lod_polygons:
+            super().paint(painter, option, widget)
+            return
+        painter.setPen(self.pen())
+        painter.setBrush(self.brush())
+        painter.drawPolygon(self.lod_polygon(QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())))
 
     def hoverEnterEvent(self, event):
         """
@@ -129,8 +185,7 @@ class PolygonItem(QGraphicsPolygonItem):
         Parameters:
             event (QGraphicsSceneHoverEvent): The hover event.
         """
-        if not self.edit_mode:
-            self.setBrush(self.hover_brush)  # Change brush to hover brush
+        self.set_hovered(True)
         super().hoverEnterEvent(event)  # Call the base class implementation
 
     def hoverLeaveEvent(self, event):
@@ -140,10 +195,19 @@ class PolygonItem(QGraphicsPolygonItem):
         Parameters:
             event (QGraphicsSceneHoverEvent): The hover event.
         """
-        if not self.edit_mode:
-            self.setBrush(self.normal_brush)  # Change brush back to normal brush
+        self.set_hovered(False)
         super().hoverLeaveEvent(event)  # Call the base class implementation
 
+    def set_hovered(self, hovered):
+        """
+        Highlight the polygon while the cursor is over it.
+
+        Parameters:
+            hovered (bool): True to use the hover brush, False for the normal one.
+        """
+        if not self.edit_mode:
+            self.setBrush(self.hover_brush if hovered else self.normal_brush)
+
     def setEditMode(self, mode):
         """
         Set the edit mode for the polygon.
@@ -168,8 +232,9 @@ class PolygonItem(QGraphicsPolygonItem):
         """
         logging.debug("Creating vertex items")
         self.clearVertexItems()  # Clear existing vertex items
-        for point in self.polygon():
-            vertex_item = VertexItem(point.x(), point.y(), self.vertex_radius, self.shared_vertex_manager)  # Create a new vertex item
+        for i, point in enumerate(self.polygon()):
+            vertex_id = self.vertex_ids[i] if self.vertex_ids is not None else None
+            vertex_item = VertexItem(point.x(), point.y(), self.vertex_radius, self.shared_vertex_manager, vertex_id)  # Create a new vertex item
             self.scene().addItem(vertex_item)  # Add the vertex item to the scene
             self.vertex_items.append(vertex_item)  # Add the vertex item to the list
             logging.debug(f"Vertex item created at ({point.x()}, {point.y()})")
@@ -188,10 +253,30 @@ class PolygonItem(QGraphicsPolygonItem):
                 if polygon.at(i) == old_pos:
                     polygon.replace(i, new_pos)  # Replace the old position with the new position
             self.setPolygon(polygon)  # Set the updated polygon
+            self.lod_polygons = []  # Simplified outlines no longer match the edited polygon
             self.updateVertexItems()  # Update all vertex items
         except Exception as e:
             logging.critical(f"Critical error in update_vertex_position: {e}")
 
+    def update_vertex_position_by_id(self, vertex_id, new_pos):
+        """
+        Update every point of the polygon that refers to a topology vertex.
+
+        Parameters:
+            vertex_id (int): The topology vertex id.
+            new_pos (QPointF): The new position of the vertex.
+        """
+        try:
+            polygon = self.polygon()  # Get the current polygon
+            for i, point_vertex_id in enumerate(self.vertex_ids):
+                if point_vertex_id == vertex_id:
+                    polygon.replace(i, new_pos)  # Replace the point that uses this vertex
+            self.setPolygon(polygon)  # Set the updated polygon
+            self.lod_polygons = []  # Simplified outlines no longer match the edited polygon
+            self.updateVertexItems()  # Update all vertex items
+        except Exception as e:
+            logging.critical(f"Critical error in update_vertex_position_by_id: {e}")
+
     def updateVertexItems(self):
         """
         Update the positions of all vertex items to match the polygon.
@@ -1,10 +1,9 @@
 import sys
-import json
-import sqlite3
 import logging
+import numpy as np
 from PyQt5 import QtWidgets, QtCore, QtGui
-from PyQt5.QtCore import Qt, QPointF, QRect, QPropertyAnimation
-from PyQt5.QtGui import QPolygonF, QIcon, QPixmap
+from PyQt5.QtCore import Qt, QPointF, QRect, QPropertyAnimation, pyqtSignal
+from PyQt5.QtGui import QIcon, QPixmap
 from PyQt5.QtWidgets import QGraphicsView, QGraphicsScene, QGraphicsPixmapItem, QPushButton
 from config.settings import Settings
 from gui.vertex_manager import SharedVertexManager
@@ -12,11 +11,16 @@ from gui.graphics_items import PolygonItem
 from gui.simulation_thread import SimulationThread
 from gui.collapsible_sidebar import CollapsibleSidebar
 from simulation.runSimulationNew import SimulationControl
-from database.update_tables_script import update_boundaries_in_database, revert_boundaries_to_original
+from database.update_tables_script import update_boundaries_in_database
+from database.boundaries import save_boundary_version, list_boundary_versions, checkout_boundary_version
+from database.migrations import migrate
+from database.geometry import array_to_qpolygonf
+from database.topology import ensure_topology, load_topology
+from database.lod import LOD_TOLERANCES, build_lod, load_lod, simplify_topology, store_lod
+from map.spatial_index import RegionIndex
 
 settings = Settings()
 db_path = settings.get('db_path')
-original_boundaries_table = settings.get('original_boundaries_table', 'original_regions')
 
 class MyScene(QGraphicsScene):
     def __init__(self, parent=None):
@@ -29,6 +33,9 @@ class MyScene(QGraphicsScene):
             self.added_items.add(item)
 
 class MapGraphicsView(QGraphicsView):
+    sceneMouseMoved = pyqtSignal(QPointF)
+    mouseLeftView = pyqtSignal()
+
     def __init__(self, parent=None):
         super(MapGraphicsView, self).__init__(parent)
         self.scene = MyScene(self)
@@ -59,6 +66,14 @@ class MapGraphicsView(QGraphicsView):
         else:
             self.setDragMode(QGraphicsView.ScrollHandDrag)
 
+    def mouseMoveEvent(self, event):
+        super().mouseMoveEvent(event)
+        self.sceneMouseMoved.emit(self.mapToScene(event.pos()))
+
+    def leaveEvent(self, event):
+        super().leaveEvent(event)
+        self.mouseLeftView.emit()
+
     def wheelEvent(self, event):
         try:
             zoomInFactor = 1.25
@@ -87,6 +102,12 @@ class SimulationApp(QtWidgets.QMainWindow):
         self.control = SimulationControl()
         self.isPaused = False
         self.sidebar = None
+        self.region_index = None
+        self.topology = None
+        self.polygon_items = {}
+        self.hovered_region = 0
+        migrate(self.db_path)
+        ensure_topology(self.db_path)
         self.initUI()
 
     def showEvent(self, event):
@@ -98,32 +119,55 @@ class SimulationApp(QtWidgets.QMainWindow):
 
     def load_and_draw_regions(self):
         try:
-            regions_vertices = self.load_regions_from_db()
-            for region_id, vertices_json in regions_vertices.items():
-                vertices = json.loads(vertices_json)
-                qpoints = [QPointF(x, y) for x, y in vertices]
-                polygon = QPolygonF(qpoints)
-                polygon_item = PolygonItem(polygon, region_id=region_id, shared_vertex_manager=self.shared_vertex_manager)
+            topology = load_topology(self.db_path)
+            if topology is None:
+                return
+            tolerances, levels = load_lod(self.db_path)
+            if not levels:
+                build_lod(self.db_path, topology)
+                tolerances, levels = load_lod(self.db_path)
+            # Start from a fresh manager so reloaded polygons don't share state with removed ones
+            self.shared_vertex_manager = SharedVertexManager()
+            self.topology = topology
+            self.polygon_items = {}
+            self.hovered_region = 0
+            for region_id, vertex_ids in topology.region_vertex_ids().items():
+                ring_ids = np.append(vertex_ids, vertex_ids[:1])
+                polygon = array_to_qpolygonf(topology.vertices[ring_ids])
+                polygon_item = PolygonItem(polygon, region_id=region_id, shared_vertex_manager=self.shared_vertex_manager,
+                                           vertex_ids=ring_ids.tolist())
+                polygon_item.set_lod_polygons({tolerances[lod]: array_to_qpolygonf(rings[region_id])
+                                               for lod, rings in levels.items() if region_id in rings})
+                # Hover is resolved through the region index rather than Qt's per-item scan
+                polygon_item.setAcceptHoverEvents(False)
                 self.mapView.scene.add_item_safe(polygon_item)
+                self.polygon_items[region_id] = polygon_item
+            self.region_index = RegionIndex.from_topology(topology)
         except Exception as e:
             logging.error(f"Error in load_and_draw_regions: {e}")
 
-    def load_regions_from_db(self):
+    def region_at(self, scene_pos):
+        """Return the id of the region under a scene position, or 0 if there is none."""
+        if self.region_index is None:
+            return 0
+        return self.region_index.region_at(scene_pos.x(), scene_pos.y())
+
+    def set_hovered_region(self, region_id):
+        if region_id == self.hovered_region:
+            return
+        previous = self.polygon_items.get(self.hovered_region)
+        if previous is not None:
+            previous.set_hovered(False)
+        current = self.polygon_items.get(region_id)
+        if current is not None:
+            current.set_hovered(True)
+        self.hovered_region = region_id
+
+    def handleSceneMouseMoved(self, scene_pos):
         try:
-            regions_vertices = {}
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT region_id, vertices FROM regions")
-                rows = cursor.fetchall()
-                for region_id, vertices_json in rows:
-                    regions_vertices[region_id] = vertices_json
-            return regions_vertices
-        except sqlite3.Error as e:
-            logging.error(f"Database error: {e}")
-            return {}
+            self.set_hovered_region(self.region_at(scene_pos))
         except Exception as e:
-            logging.error(f"Error in load_regions_from_db: {e}")
-            return {}
+            logging.error(f"Error in handleSceneMouseMoved: {e}")
 
     def initUI(self):
         try:
@@ -131,6 +175,8 @@ class SimulationApp(QtWidgets.QMainWindow):
             self.setGeometry(100, 100, 1200, 800)
             self.mapView = MapGraphicsView(self)
             self.setCentralWidget(self.mapView)
+            self.mapView.sceneMouseMoved.connect(self.handleSceneMouseMoved)
+            self.mapView.mouseLeftView.connect(lambda: self.set_hovered_region(0))
 
             self.hamburgerButton = QPushButton(self)
             self.hamburgerButton.setIcon(QIcon(settings.get('hamburger_icon_path')))
@@ -154,6 +200,8 @@ class SimulationApp(QtWidgets.QMainWindow):
             self.sidebar.editModeChanged.connect(self.mapView.setEditMode)
             self.sidebar.keepBoundaryChanges.connect(self.handleKeepChanges)
             self.sidebar.discardBoundaryChanges.connect(self.handleDiscardChanges)
+            self.sidebar.saveBoundaryVersion.connect(self.handleSaveBoundaryVersion)
+            self.sidebar.loadBoundaryVersion.connect(self.handleLoadBoundaryVersion)
 
             self.shared_vertex_manager = SharedVertexManager()
         except Exception as e:
@@ -213,46 +261,85 @@ class SimulationApp(QtWidgets.QMainWindow):
     def handleKeepChanges(self):
         try:
             logging.debug("Handling keep boundary changes")
-            new_boundaries = self.get_current_boundary_data()
-            update_boundaries_in_database(new_boundaries)
+            # Only the regions and shared vertices touched since the last save are written
+            manager = self.shared_vertex_manager
+            dirty = {region_id for region_id in manager.dirty_regions if region_id in self.polygon_items}
+            if dirty:
+                # The moved vertices are the edit; rings are derived from the topology, as in the database
+                positions = manager.dirty_positions()
+                if update_boundaries_in_database(self.db_path, positions) is None:
+                    # Nothing was written; keep the edits and the dirty sets so they can be kept again or discarded
+                    QtWidgets.QMessageBox.warning(self, 'Keep Changes', "The boundary changes could not be saved; see the log for details.")
+                    return
+                if positions:
+                    vertex_ids = np.array([position[0] for position in positions], dtype=np.int64)
+                    self.topology.vertices[vertex_ids] = [position[1:] for position in positions]
+                if self.region_index is not None:
+                    rings = self.topology.region_rings()
+                    self.region_index.update_regions({region_id: rings[region_id] for region_id in sorted(dirty)})
+                self.refresh_lod(dirty)
+                manager.clear_dirty()
             self.mapView.setEditMode(False)
         except Exception as e:
             logging.error(f"Error in handleKeepChanges: {e}")
 
+    def refresh_lod(self, region_ids=None):
+        # Re-simplify the saved borders so zoomed-out painting matches the edits
+        topology = self.topology if self.topology is not None else load_topology(self.db_path)
+        if topology is None:
+            return
+        levels = simplify_topology(topology, region_ids=region_ids)
+        store_lod(self.db_path, levels, region_ids=region_ids)
+        for region_id in (self.polygon_items if region_ids is None else region_ids):
+            item = self.polygon_items.get(region_id)
+            if item is not None:
+                item.set_lod_polygons({LOD_TOLERANCES[lod]: array_to_qpolygonf(rings[region_id])
+                                       for lod, rings in levels.items() if region_id in rings})
+
     def handleDiscardChanges(self):
         try:
             logging.debug("Handling discard boundary changes")
             
-            # Clear current boundaries from the scene
-            for item in self.mapView.scene.items():
-                if isinstance(item, PolygonItem):
-                    self.mapView.scene.removeItem(item)
-            
-            # Revert to original boundaries
-            revert_boundaries_to_original()
-            
-            # Reload and redraw regions to show original boundaries
-            self.load_and_draw_regions()
+            # Edits are only written on keep, so redrawing the stored boundaries discards them
+            self.reload_regions()
             
             # Exit edit mode
             self.mapView.setEditMode(False)
         except Exception as e:
             logging.error(f"Error in handleDiscardChanges: {e}")
 
-    def get_current_boundary_data(self):
+    def reload_regions(self):
+        for item in self.mapView.scene.items():
+            if isinstance(item, PolygonItem):
+                self.mapView.scene.removeItem(item)
+        self.load_and_draw_regions()
+
+    def handleSaveBoundaryVersion(self):
+        try:
+            name, ok = QtWidgets.QInputDialog.getText(self, 'Save Boundary Version', 'Version name:')
+            if not ok or not name.strip():
+                return
+            if name.strip() in {version['name'] for version in list_boundary_versions(self.db_path)}:
+                QtWidgets.QMessageBox.warning(self, 'Save Boundary Version', f"A version named '{name.strip()}' already exists.")
+                return
+            # Kept edits are already stored, so the named version is a pointer to the current boundaries
+            save_boundary_version(self.db_path, name=name.strip())
+        except Exception as e:
+            logging.error(f"Error in handleSaveBoundaryVersion: {e}")
+
+    def handleLoadBoundaryVersion(self):
         try:
-            current_boundaries = []
-            for item in self.mapView.scene.items():
-                if isinstance(item, PolygonItem):
-                    vertices = [(point.x(), point.y()) for point in item.polygon()]
-                    current_boundaries.append({
-                        "id": item.region_id,
-                        "vertices": json.dumps(vertices)
-                    })
-            return current_boundaries
+            versions = list_boundary_versions(self.db_path)
+            if not versions:
+                QtWidgets.QMessageBox.information(self, 'Load Boundary Version', 'No boundary versions have been saved yet.')
+                return
+            names = [version['name'] for version in versions]
+            current = next((i for i, version in enumerate(versions) if version['current']), 0)
+            name, ok = QtWidgets.QInputDialog.getItem(self, 'Load Boundary Version', 'Version:', names, current, False)
+            if ok and checkout_boundary_version(self.db_path, name):
+                self.reload_regions()
         except Exception as e:
-            logging.error(f"Error in get_current_boundary_data: {e}")
-            return []
+            logging.error(f"Error in handleLoadBoundaryVersion: {e}")
 
 def main():
     try:
@@ -3,21 +3,51 @@ from PyQt5.QtCore import QPointF
 class SharedVertexManager:
     def __init__(self):
         self.vertices = {}  # Dictionary to store vertices with their connected polygons
+        self.positions = {}  # Current (x, y) of every topology vertex, keyed by vertex id
+        self.dirty_vertices = set()  # Vertex ids moved since the last save
+        self.dirty_regions = set()  # Ids of the regions whose outline changed since the last save
 
-    def add_vertex(self, x, y, polygon):
-        key = (x, y)
+    def add_vertex(self, x, y, polygon, vertex_id=None):
+        key = (x, y) if vertex_id is None else vertex_id
         if key not in self.vertices:
             self.vertices[key] = []
+        if vertex_id is not None:
+            self.positions[vertex_id] = (x, y)
+            if polygon in self.vertices[key]:
+                return
         self.vertices[key].append(polygon)
 
-    def update_vertex(self, old_pos, new_pos):
+    def update_vertex(self, old_pos, new_pos, vertex_id=None):
+        if vertex_id is not None:
+            self.update_vertex_by_id(vertex_id, new_pos)
+            return
         old_key = (old_pos.x(), old_pos.y())  # Convert QPointF to tuple
         new_key = (new_pos.x(), new_pos.y())  # Convert QPointF to tuple
         if old_key in self.vertices:
             polygons = self.vertices.pop(old_key)
             self.vertices[new_key] = polygons
+            self.dirty_regions.update(polygon.region_id for polygon in polygons)
             for polygon in polygons:
                 polygon.update_vertex_position(QPointF(old_key[0], old_key[1]), QPointF(new_key[0], new_key[1]))
 
+    def update_vertex_by_id(self, vertex_id, new_pos):
+        new_key = (new_pos.x(), new_pos.y())
+        # The position check also stops the recursion from vertex items being moved by their polygons
+        if self.positions.get(vertex_id) == new_key:
+            return
+        self.positions[vertex_id] = new_key
+        self.dirty_vertices.add(vertex_id)
+        self.dirty_regions.update(polygon.region_id for polygon in self.vertices.get(vertex_id, []))
+        for polygon in self.vertices.get(vertex_id, []):
+            polygon.update_vertex_position_by_id(vertex_id, QPointF(new_pos))
+
+    def dirty_positions(self):
+        """Return (vertex_id, x, y) of every vertex moved since the last save."""
+        return [(vertex_id,) + self.positions[vertex_id] for vertex_id in sorted(self.dirty_vertices)]
+
+    def clear_dirty(self):
+        self.dirty_vertices.clear()
+        self.dirty_regions.clear()
+
     def get_connected_polygons(self, x, y):
         return self.vertices.get((x, y), [])
@@ -0,0 +1,194 @@
+import os
+import logging
+import operator
+import numpy as np
+from PIL import Image, ImageFile
+
+# Uncompressed pixel layouts whose alpha byte can be read straight from the file
+_RAW_ALPHA_MODES = ('RGBA', 'BGRA', 'ARGB', 'ABGR', 'RGBa', 'LA', 'La', 'PA')
+# Image modes PIL can map onto an external buffer, and so decode into a scratch file
+_MAPPED_MODES = ('L', 'P', 'RGBX', 'RGBA', 'I;16', 'I;16L', 'I;16B')
+
+class PackedMask:
+    """
+    Read-only land mask stored as a memory-mapped bitfield, eight pixels per byte.
+
+    Slicing returns boolean numpy arrays and only unpacks the bytes of the
+    requested window, so code that reads the mask in windows or row strips works
+    the same as with a full boolean array while the mask itself stays on disk.
+
+    Parameters:
+        path (str): .npy file of packed rows, shape (height, ceil(width / 8)).
+        width (int): Width of the mask in pixels.
+    """
+
+    ndim = 2
+    dtype = np.dtype(bool)
+
+    def __init__(self, path, width):
+        self.path = path
+        self.packed = np.load(path, mmap_mode='r')
+        self.width = int(width)
+        self.height = self.packed.shape[0]
+        self.shape = (self.height, self.width)
+
+    @classmethod
+    def from_image(cls, image_path, path, strip_rows=1024):
+        """
+        Build the packed mask of an image's non-transparent pixels strip by strip.
+
+        Uncompressed images (raw TIFF strips, 32-bit BMP and similar) are read
+        through a memory map of the file, so only one strip is held at a time.
+        Images without transparency are all land and need no decoding. Formats
+        PIL decodes tile by tile, such as PNG, are decoded once into a
+        memory-mapped scratch file next to the mask, up to four bytes per pixel
+        of disk, and packed from there strip by strip; it is removed afterwards.
+        Anything else (WebP, compressed TIFF, modes without a mappable layout)
+        is decoded in memory with a warning. An all-water result is checked
+        against a full decode and raises ValueError if the image has land.
+
+        Returns:
+            PackedMask: The mask, backed by the new file at path.
+        """
+        max_pixels = Image.MAX_IMAGE_PIXELS
+        Image.MAX_IMAGE_PIXELS = None
+        try:
+            with Image.open(image_path) as image:
+                width, height = image.size
+                packed = np.lib.format.open_memmap(path, mode='w+', dtype=np.uint8, shape=(height, (width + 7) // 8))
+                land = False
+                for y0, alpha in _alpha_strips(image, image_path, strip_rows, path + '.decoded'):
+                    packed[y0:y0 + len(alpha)] = np.packbits(alpha != 0, axis=1)
+                    land = land or alpha.any()
+                packed.flush()
+                del packed
+            if not land and _has_land(image_path):
+                raise ValueError(f"Packing {image_path} produced an all-water mask although the image has opaque pixels.")
+        finally:
+            Image.MAX_IMAGE_PIXELS = max_pixels
+        logging.info(f"Packed land mask of {image_path} written to {path}")
+        return cls(path, width)
+
+    @classmethod
+    def cached(cls, image_path, path, strip_rows=1024):
+        """Open the packed mask at path, rebuilding it when the image is newer."""
+        if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(image_path):
+            with Image.open(image_path) as image:
+                width, height = image.size
+            mask = cls(path, width)
+            if mask.height == height and mask.packed.shape[1] == (width + 7) // 8:
+                return mask
+        return cls.from_image(image_path, path, strip_rows)
+
+    def _range(self, key, size):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(size)
+            if step != 1:
+                raise IndexError("PackedMask only supports contiguous slices")
+            return start, max(stop, start), False
+        index = operator.index(key)
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError(f"Index {key} is out of bounds for size {size}")
+        return index, index + 1, True
+
+    def __getitem__(self, key):
+        rows, cols = key if isinstance(key, tuple) else (key, slice(None))
+        y0, y1, drop_row = self._range(rows, self.height)
+        x0, x1, drop_col = self._range(cols, self.width)
+        block = np.asarray(self.packed[y0:y1, x0 >> 3:(x1 + 7) >> 3])
+        shift = x0 & 7
+        window = np.unpackbits(block, axis=1)[:, shift:shift + x1 - x0].view(bool)
+        if drop_row and drop_col:
+            return bool(window[0, 0])
+        if drop_row:
+            return window[0]
+        if drop_col:
+            return window[:, 0]
+        return window
+
+    def __array__(self, dtype=None, copy=None):
+        # Unpacks the whole mask; only for maps small enough to hold in memory
+        mask = self[:, :]
+        return mask if dtype is None else mask.astype(dtype)
+
+    def count_nonzero(self, strip_rows=1024):
+        return sum(int(np.count_nonzero(self[y0:y0 + strip_rows])) for y0 in range(0, self.height, strip_rows))
+
+def _raw_tiles(image, image_path):
+    # (rows, y0, alpha offset, bytes per pixel, bottom up) of every raw tile, or None;
+    # plugins that decode in load() (WebP) report no tiles and are not raw either
+    if not image.tile:
+        return None
+    width = image.size[0]
+    tiles = []
+    for tile in image.tile:
+        codec, (x0, y0, x1, y1), offset, args = tile[0], tile[1], tile[2], tile[3]
+        if codec != 'raw':
+            return None
+        # Raw decoder arguments are rawmode, optionally followed by stride and orientation
+        args = args if isinstance(args, tuple) else (args,)
+        rawmode, stride, orientation = (tuple(args) + (0, 1)[len(args) - 1:])[:3]
+        if x0 != 0 or x1 != width or rawmode not in _RAW_ALPHA_MODES:
+            return None
+        bytes_per_pixel = len(rawmode)
+        stride = stride or width * bytes_per_pixel
+        rows = np.memmap(image_path, dtype=np.uint8, mode='r', offset=offset, shape=(y1 - y0, stride))
+        tiles.append((rows, y0, rawmode.index('A') if 'A' in rawmode else rawmode.index('a'), bytes_per_pixel, orientation < 0))
+    return tiles
+
+def _alpha_strips(image, image_path, strip_rows, scratch_path):
+    """Yield (first row, alpha rows) strips covering the image from top to bottom; scratch_path holds decoded pixels."""
+    width, height = image.size
+    if 'A' not in image.mode and 'a' not in image.mode and 'transparency' not in image.info:
+        # Fully opaque image: every pixel is land
+        for y0 in range(0, height, strip_rows):
+            yield y0, np.full((min(strip_rows, height - y0), width), 255, dtype=np.uint8)
+        return
+
+    tiles = _raw_tiles(image, image_path)
+    if tiles is not None:
+        for rows, tile_y0, alpha_index, bytes_per_pixel, bottom_up in tiles:
+            for start in range(0, len(rows), strip_rows):
+                stop = min(start + strip_rows, len(rows))
+                if bottom_up:
+                    strip = rows[len(rows) - stop:len(rows) - start][::-1]
+                else:
+                    strip = rows[start:stop]
+                yield tile_y0 + start, np.asarray(strip[:, alpha_index:width * bytes_per_pixel:bytes_per_pixel])
+        return
+
+    # Plugins that replace ImageFile.load decode through their own path and ignore
+    # image memory set up beforehand, so only tile-decoded formats use the scratch file
+    if image.tile and type(image).load is ImageFile.ImageFile.load and image.mode in _MAPPED_MODES:
+        logging.info(f"{image_path} is compressed; decoding it into a scratch file next to the mask.")
+        pixel_bytes = 1 if image.mode in ('L', 'P') else 2 if image.mode.startswith('I;16') else 4
+        pixels = np.memmap(scratch_path, dtype=np.uint8, mode='w+', shape=(height, width * pixel_bytes))
+        try:
+            # frombuffer maps these modes without copying, so the decoders write into the memmap
+            image.im = Image.frombuffer(image.mode, (width, height), pixels, 'raw', image.mode, 0, 1).im
+            image.load()
+            yield from _decoded_alpha_strips(image, strip_rows)
+        finally:
+            image.im = None
+            del pixels
+            os.remove(scratch_path)
+        return
+
+    logging.warning(f"{image_path} ({image.format} {image.mode}) cannot be decoded into a scratch file; decoding it in memory.")
+    image.load()
+    yield from _decoded_alpha_strips(image, strip_rows)
+
+def _decoded_alpha_strips(image, strip_rows):
+    width, height = image.size
+    for y0 in range(0, height, strip_rows):
+        strip = image.crop((0, y0, width, min(y0 + strip_rows, height)))
+        if strip.mode not in ('RGBA', 'LA', 'PA', 'RGBa', 'La'):
+            strip = strip.convert('RGBA')
+        yield y0, np.asarray(strip.getchannel('A' if 'A' in strip.mode else 'a'))
+
+def _has_land(image_path):
+    # Full decode, only used to tell an all-water image from a failed strip decode
+    with Image.open(image_path) as image:
+        return image.convert('RGBA').getchannel('A').getextrema()[1] > 0
@@ -1,20 +1,46 @@
+import os
 import json
+import shutil
 import sqlite3
-import pandas as pd
 import numpy as np
 from PIL import Image
-from scipy.spatial import Voronoi, voronoi_plot_2d
-import matplotlib.pyplot as plt
-from shapely.geometry import Polygon, box, MultiPolygon
+from scipy.spatial import Voronoi, cKDTree
+from shapely.geometry import box
 import cv2
 import logging
+from contextlib import nullcontext
+from map.region_geometry import clip_polygon_to_bounds, compute_land_centroid, rasterize_polygon, process_region_batch
+from map.parallel import RegionPool
+from map.map_cache import MapCache
+from map.bitmask import PackedMask
+from map.label_raster import rasterize_labels, load_label_raster, land_adjacency, ring_window, label_outlines, zonal_stats
+from map.power_diagram import relax_power_diagram, power_cells, label_neighbours
+from map.region_growing import grow_regions
+from map.retessellate import ridge_neighbours, voronoi_finite_polygons_2d, edit_candidates, local_voronoi_cells, apply_cells, relabel_edit
+from map.land_distance import DEFAULT_TRAVEL_COST_K, snap_to_land, multi_source_bfs, seed_contact_graph, travel_cost_matrix, save_travel_costs, load_travel_costs
+from database.topology import build_topology, store_topology, load_topology, patch_topology, store_topology_changes
+from database.adjacency import store_adjacency, update_adjacency, adjacency_lists, load_adjacency
+from database.lod import build_lod
+from database.metrics import compute_region_metrics, store_region_metrics
+from database.repository import save_regions
+from database.migrations import migrate
+from database.boundaries import clear_boundary_versions
+from database.connection import get_database
+
+# Bump whenever a change alters the generated tessellation so cached maps are regenerated
+ALGORITHM_VERSION = 4
 
 class VoronoiMap:
-    def __init__(self, map_image_path, db_path, log_file_path, output_path):
+    def __init__(self, map_image_path, db_path, log_file_path, output_path, streaming=False):
         self.map_image_path = map_image_path
         self.db_path = db_path
         self.log_file_path = log_file_path
         self.output_path = output_path
+        # Keep the land mask as a packed bitfield on disk instead of loading the image.
+        # Only the voronoi relaxation, label raster, adjacency and metrics work on it in
+        # bounded memory; power and growth modes, travel costs and the overlay need the
+        # whole mask or image and raise ValueError
+        self.streaming = streaming
         self.setup_logging()
         self.load_map_image()
         self.initialize_variables()
@@ -23,11 +49,15 @@ class VoronoiMap:
         logging.basicConfig(filename=self.log_file_path, level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
     def load_map_image(self):
-        self.map_image = Image.open(self.map_image_path).convert('RGBA')
-        self.map_width, self.map_height = self.map_image.size
+        if self.streaming:
+            self.map_image = None
+            self.binary_mask = PackedMask.cached(self.map_image_path, os.path.splitext(self.db_path)[0] + '_mask.npy')
+            self.map_height, self.map_width = self.binary_mask.shape
+        else:
+            self.map_image = Image.open(self.map_image_path).convert('RGBA')
+            self.map_width, self.map_height = self.map_image.size
+            self.binary_mask = np.asarray(self.map_image.getchannel('A')) != 0
         self.bounding_box = box(0, 0, self.map_width, self.map_height)
-        binary_mask = np.array([pixel[3] != 0 for pixel in self.map_image.getdata()])
-        self.binary_mask = binary_mask.reshape((self.map_height, self.map_width))
 
     def initialize_variables(self):
         self.points = []
@@ -36,11 +66,30 @@ class VoronoiMap:
         self.num_iterations = 10
         self.movement_threshold = 1.0
         self.regions_to_store = {}
+        self.label_raster_path = os.path.splitext(self.db_path)[0] + '_labels.npy'
+        self.travel_cost_k = None
+        self.travel_cost_dense_limit = 2000
+        self.min_border_length = 2
+        self.seed = None
+        self.generators = None
+        self.seed_neighbours = None
+        self.vor_stale = False
+        self.num_workers = 1
+        # 'voronoi' for plain Voronoi cells, 'power' for weighted cells sized by seed_weights,
+        # 'growth' for regions flooded over land from each seed
+        self.tessellation_mode = 'voronoi'
+        self.seed_weights = None
+        self.quota_tolerance = 0.02
+        self.water_density = 0.02
+        self.tile_size = 256
+        # One dict per relaxation iteration of the last generated map
+        self.iteration_stats = []
 
     def generate_initial_points(self):
+        rng = np.random.default_rng(self.seed)
         attempt = 0
         while len(self.points) < self.num_points and attempt < self.max_attempts:
-            x, y = np.random.randint(0, self.map_width), np.random.randint(0, self.map_height)
+            x, y = rng.integers(0, self.map_width), rng.integers(0, self.map_height)
             if self.is_point_on_land(x, y):
                 self.points.append([x, y])
             attempt += 1
@@ -57,147 +106,17 @@ class VoronoiMap:
         return self.binary_mask[y, x]
 
     def clip_to_map_bounds(self, polygon):
-        logging.debug(f"Original polygon: {polygon}")
-
-        try:
-            clipped_polygon = polygon.intersection(self.bounding_box)
-            logging.debug(f"Clipped polygon: {clipped_polygon}")
-
-            if clipped_polygon.is_empty:
-                logging.info(f"Clipping resulted in an empty polygon: Original {polygon}")
-                return None
-            else:
-                if clipped_polygon.geom_type == 'LineString' or clipped_polygon.geom_type == 'Point':
-                    logging.warning(f"Clipping resulted in a degenerate polygon: {clipped_polygon}")
-                    return None
-
-                cleaned_polygon = clipped_polygon.buffer(0)
-
-                if isinstance(cleaned_polygon, MultiPolygon):
-                    num_polygons = len(cleaned_polygon.geoms)
-                    polygon_areas = [p.area for p in cleaned_polygon.geoms]
-                    logging.info(f"Clipped MultiPolygon with {num_polygons} polygons, areas: {polygon_areas}")
-                    largest_polygon = max(cleaned_polygon, key=lambda p: p.area)
-                    return largest_polygon
-
-                return cleaned_polygon
-        except Exception as e:
-            logging.error(f"Error in clipping polygon: {e}")
-            return None
+        return clip_polygon_to_bounds(polygon, self.bounding_box)
 
     def compute_efficient_land_centroid(self, polygon, region_id=None):
-        rasterized_polygon = self.rasterize_polygon(polygon)
-        overlap = rasterized_polygon & self.binary_mask
-        y_indices, x_indices = np.nonzero(overlap)
-
-        if len(x_indices) == 0 or len(y_indices) == 0:
-            logging.info(f"Region {region_id} processing: No overlap with land. Using fallback methods.")
-            logging.info(f"Region {region_id} vertices: {polygon.exterior.coords[:]}")
-            logging.info(f"Region {region_id} area: {polygon.area}")
-
-            x_center, y_center = np.mean(polygon.exterior.coords, axis=0)
-
-            if np.isnan(x_center) or np.isnan(y_center):
-                logging.info(f"Region {region_id}: Geometric center failed. Using bounding box midpoint.")
-                bounds = polygon.bounds
-                x_center, y_center = (bounds[0] + bounds[2]) / 2, (bounds[1] + bounds[3]) / 2
-
-            if np.isnan(x_center) or np.isnan(y_center):
-                logging.info(f"Region {region_id}: Bounding box center failed. Using first vertex.")
-                x_center, y_center = polygon.exterior.coords[0]
-
-            return x_center, y_center
-
-        centroid_x, centroid_y = np.mean(x_indices), np.mean(y_indices)
-        return centroid_x, centroid_y
+        return compute_land_centroid(polygon, self.binary_mask, region_id=region_id)
 
     def rasterize_polygon(self, polygon):
-        rasterized = np.zeros_like(self.binary_mask, dtype=np.uint8)
-        int_coords = lambda x, y: (int(round(x)), int(round(y)))
-        polygon_coords = np.array([int_coords(*point) for point in polygon.exterior.coords])
-
-        cv2.fillPoly(rasterized, [polygon_coords], 1)
-        return rasterized
-    
-    def voronoi_finite_polygons_2d(self, vor, radius=None):
-        """
-        Reconstruct infinite voronoi regions in a 2D diagram to finite
-        regions.
-        Parameters
-        ----------
-        vor : Voronoi
-            Input diagram
-        radius : float, optional
-            Distance to 'points at infinity'.
-        Returns
-        -------
-        regions : list of tuples
-            Indices of vertices in each revised Voronoi regions.
-        vertices : list of tuples
-            Coordinates for revised Voronoi vertices. Same as coordinates
-            of input vertices, with 'points at infinity' appended to the
-            end.
-        """
-
-        if vor.points.shape[1] != 2:
-            raise ValueError("Requires 2D input")
-
-        new_regions = []
-        new_vertices = vor.vertices.tolist()
-
-        center = vor.points.mean(axis=0)
-        if radius is None:
-            radius = vor.points.ptp().max() * 2
-
-        # Construct a map containing all ridges for a given point
-        all_ridges = {}
-        for (p1, p2), (v1, v2) in zip(vor.ridge_points, vor.ridge_vertices):
-            all_ridges.setdefault(p1, []).append((p2, v1, v2))
-            all_ridges.setdefault(p2, []).append((p1, v1, v2))
+        return rasterize_polygon(polygon, self.binary_mask.shape)
 
-        # Reconstruct infinite regions
-        for p1, region in enumerate(vor.point_region):
-            vertices = vor.regions[region]
+    def voronoi_finite_polygons_2d(self, vor, radius=None, center=None):
+        return voronoi_finite_polygons_2d(vor, radius=radius, center=center)
 
-            if all(v >= 0 for v in vertices):
-                # finite region
-                new_regions.append(vertices)
-                continue
-
-            # reconstruct a non-finite region
-            ridges = all_ridges[p1]
-            new_region = [v for v in vertices if v >= 0]
-
-            for p2, v1, v2 in ridges:
-                if v2 < 0:
-                    v1, v2 = v2, v1
-                if v1 >= 0:
-                    # finite ridge: already in the region
-                    continue
-
-                # Compute the missing endpoint of an infinite ridge
-                t = vor.points[p2] - vor.points[p1]  # tangent
-                t /= np.linalg.norm(t)
-                n = np.array([-t[1], t[0]])  # normal
-
-                midpoint = vor.points[[p1, p2]].mean(axis=0)
-                direction = np.sign(np.dot(midpoint - center, n)) * n
-                far_point = vor.vertices[v2] + direction * radius
-
-                new_region.append(len(new_vertices))
-                new_vertices.append(far_point.tolist())
-
-            # sort region counterclockwise
-            vs = np.asarray([new_vertices[v] for v in new_region])
-            c = vs.mean(axis=0)
-            angles = np.arctan2(vs[:, 1] - c[1], vs[:, 0] - c[0])
-            new_region = np.array(new_region)[np.argsort(angles)]
-
-            # finish
-            new_regions.append(new_region.tolist())
-
-        return new_regions, np.asarray(new_vertices)
-    
     def find_adjacent_regions(self, finite_regions):
         adjacency_list = {}
         for i, region1 in enumerate(finite_regions):
@@ -212,8 +131,18 @@ class VoronoiMap:
 
 
     def run_voronoi_process(self):
+        if self.streaming and self.tessellation_mode != 'voronoi':
+            raise ValueError(f"Tessellation mode '{self.tessellation_mode}' needs the whole mask in memory; streaming supports 'voronoi' only.")
+        if self.tessellation_mode == 'power':
+            self.run_power_process()
+            return
+        if self.tessellation_mode == 'growth':
+            self.run_growth_process()
+            return
         self.generate_initial_points()
         self.vor = Voronoi(self.points)  # Save the Voronoi object as an attribute
+        self.generators = None
+        self.iteration_stats = []
 
         # Use voronoi_finite_polygons_2d to get finite regions and vertices
         finite_regions, finite_vertices = self.voronoi_finite_polygons_2d(self.vor)
@@ -224,105 +153,286 @@ class VoronoiMap:
         # Find adjacent regions
         self.adjacent_regions = self.find_adjacent_regions(finite_regions)
 
-        for iteration in range(self.num_iterations):
-            logging.info(f"Iteration {iteration + 1}/{self.num_iterations}")
-            new_points = np.empty_like(self.points)
-
-            for idx, point in enumerate(self.points):
-                original_region_index = self.vor.point_region[idx]
-                if original_region_index not in region_mapping:
-                    logging.debug(f"Region {idx} skipped due to invalid region indices.")
-                    continue
-
-                finite_region_index = region_mapping[original_region_index]
-                region = finite_regions[finite_region_index]
-                polygon = Polygon([finite_vertices[i] for i in region])
-
-                clipped_polygon = self.clip_to_map_bounds(polygon)
-
-                if clipped_polygon:
-                    centroid = self.compute_efficient_land_centroid(clipped_polygon, region_id=idx)
+        if self.num_workers > 1:
+            pool_context = RegionPool(self.binary_mask, self.bounding_box.bounds, num_workers=self.num_workers,
+                                      tile_size=self.tile_size, log_file_path=self.log_file_path)
+        else:
+            pool_context = nullcontext()
+
+        with pool_context as pool:
+            for iteration in range(self.num_iterations):
+                logging.info(f"Iteration {iteration + 1}/{self.num_iterations}")
+                # Seeds without a land centroid this iteration stay where they are
+                new_points = np.copy(self.points)
+                centroid_offsets = []
+
+                tasks = []
+                for idx in range(len(self.points)):
+                    original_region_index = self.vor.point_region[idx]
+                    if original_region_index not in region_mapping:
+                        logging.debug(f"Region {idx} skipped due to invalid region indices.")
+                        continue
+
+                    finite_region_index = region_mapping[original_region_index]
+                    region = finite_regions[finite_region_index]
+                    tasks.append((idx, [finite_vertices[i] for i in region]))
+
+                if pool is not None:
+                    results = pool.map_regions(tasks)
+                else:
+                    results = process_region_batch(tasks, self.binary_mask, self.bounding_box)
+
+                for idx, centroid, clipped_coords in results:
+                    point = self.points[idx]
                     if centroid:
                         new_point = np.array(centroid)
+                        centroid_offsets.append(np.linalg.norm(new_point - point))
                         if np.linalg.norm(new_point - point) < self.movement_threshold:
                             new_points[idx] = new_point
                         else:
                             new_points[idx] = point
-                        self.regions_to_store[idx] = json.dumps([list(p) for p in clipped_polygon.exterior.coords])
-
-            self.points = np.copy(new_points)
-            movement = np.linalg.norm(self.points - self.vor.points, axis=1)
-            if not np.any(movement >= self.movement_threshold):
-                logging.info("Early termination due to convergence.")
-                break
-
-
-    def plot_and_save_voronoi(self):
-        missing_regions = self.get_missing_regions_from_log()
-        fig, ax = plt.subplots(figsize=(self.map_width / 100, self.map_height / 100))
-        ax.imshow(self.map_image)
-        voronoi_plot_2d(self.vor, ax=ax, show_vertices=False, line_colors='black', point_size=2)  # Use the stored Voronoi diagram
-        for region_index in missing_regions:
-            adjusted_index = region_index - 1
-            if adjusted_index + 1 in self.vor.point_region:  # Use the stored Voronoi diagram
-                region = self.vor.regions[self.vor.point_region[adjusted_index + 1]]
-                if not -1 in region and region:
-                    polygon = [self.vor.vertices[i] for i in region]
-                    ax.fill(*zip(*polygon), color='red', alpha=0.4)
-                    logging.debug(f"Highlighting region {region_index}")
-        ax.invert_yaxis()
-        plt.savefig(self.output_path, bbox_inches='tight')
-        plt.close()
-        logging.info(f"Voronoi overlay saved to {self.output_path}")
+                        self.regions_to_store[idx] = np.array(clipped_coords, dtype=np.float64)
 
-    def get_missing_regions_from_log(self):
-        missing_regions = []
-        with open(self.log_file_path, 'r') as log_file:
-            for line in log_file:
-                if "Missing regions in DB:" in line:
-                    missing_regions = [int(x.strip()) for x in line.split(':')[1].split(',')]
-        return missing_regions
+                # Movement is what the seeds moved this iteration; the centroid offset is how far they are from converged
+                movement = np.linalg.norm(new_points - self.points, axis=1)
+                self.points = new_points
+                self.iteration_stats.append({'iteration': iteration + 1, 'mean_movement': float(movement.mean()),
+                                             'max_movement': float(movement.max()),
+                                             'mean_centroid_offset': float(np.mean(centroid_offsets)) if centroid_offsets else 0.0})
+                if not np.any(movement >= self.movement_threshold):
+                    logging.info("Early termination due to convergence.")
+                    break
+
+
+    def run_power_process(self):
+        """
+        Build a power diagram whose cells cover land in proportion to seed_weights.
+
+        Seeds and weights are relaxed on a raster of weighted nearest seeds; the
+        stored regions are the exact power cells of the final seeds.
+        """
+        self.generate_initial_points()
+        self.points = self.points.astype(np.float64)
+        importance = np.ones(len(self.points)) if self.seed_weights is None else np.asarray(self.seed_weights, dtype=np.float64)
+        if len(importance) != len(self.points):
+            logging.error(f"Expected {len(self.points)} seed weights, got {len(importance)}; using equal weights.")
+            importance = np.ones(len(self.points))
+
+        self.points, self.power_weights, labels, self.iteration_stats = relax_power_diagram(
+            self.binary_mask, self.points, importance, num_iterations=self.num_iterations,
+            tolerance=self.quota_tolerance, water_density=self.water_density)
+        self.vor = Voronoi(self.points)
+        self.generators = None
+
+        direct, candidates = label_neighbours(labels, len(self.points))
+        cells = power_cells(self.points, self.power_weights, candidates, self.bounding_box.bounds)
+        self.regions_to_store = {idx: ring for idx, ring in cells.items()}
+        self.adjacent_regions = adjacency_lists([(a + 1, b + 1) for a, neighbours in enumerate(direct) for b in neighbours if a < b],
+                                                range(1, len(self.points) + 1))
+        logging.info(f"Power diagram with {len(cells)} cells after {len(self.iteration_stats)} iterations.")
+
+    def run_growth_process(self):
+        """
+        Build regions by growing every seed over connected land.
+
+        The region outlines follow pixel edges of the grown label raster, which
+        is also kept as the map's label raster.
+        """
+        self.generate_initial_points()
+        seeds, self.growth_labels, self.iteration_stats = grow_regions(
+            self.binary_mask, self.points, num_iterations=self.num_iterations, movement_threshold=self.movement_threshold)
+        self.points = seeds.astype(np.float64)
+        self.vor = Voronoi(self.points)
+        self.generators = None
+
+        self.regions_to_store = {region_id - 1: ring for region_id, ring in label_outlines(self.growth_labels).items()}
+        pairs, _ = land_adjacency(self.growth_labels, self.binary_mask, self.min_border_length)
+        self.adjacent_regions = adjacency_lists(pairs, range(1, len(self.points) + 1))
+        logging.info(f"Grew {len(self.regions_to_store)} regions after {len(self.iteration_stats)} iterations.")
+
+    def cache_key(self):
+        if not hasattr(self, 'image_hash'):
+            self.image_hash = MapCache.hash_image(self.map_image_path)
+        options = {}
+        if self.tessellation_mode != 'voronoi':
+            weights = None if self.seed_weights is None else np.asarray(self.seed_weights, dtype=np.float64).tolist()
+            options = {'tessellation_mode': self.tessellation_mode, 'seed_weights': weights,
+                       'quota_tolerance': self.quota_tolerance, 'water_density': self.water_density}
+        return MapCache.make_key(self.image_hash, self.seed, self.num_points, self.num_iterations, ALGORITHM_VERSION, **options)
+
+    def save_to_cache(self, cache):
+        key, params = self.cache_key()
+        region_indices = np.array(sorted(self.regions_to_store), dtype=np.int64)
+        rings = [self.regions_to_store[idx] for idx in region_indices]
+        region_offsets = np.cumsum([0] + [len(ring) for ring in rings])
+        cache.put(key, params, {
+            'initial_points': self.current_voronoi().points,
+            'points': self.points,
+            'region_indices': region_indices,
+            'region_offsets': region_offsets,
+            'region_coords': np.concatenate(rings) if rings else np.empty((0, 2)),
+            'adjacent_regions': np.array(json.dumps(self.adjacent_regions)),
+        })
+        return key
+
+    def load_from_cache(self, cache, key=None):
+        if key is None:
+            key, _ = self.cache_key()
+        arrays = cache.get(key)
+        if arrays is None:
+            return False
+
+        self.vor = Voronoi(arrays['initial_points'])
+        self.generators = None
+        self.points = arrays['points']
+        offsets = arrays['region_offsets']
+        coords = arrays['region_coords']
+        self.regions_to_store = {int(idx): coords[offsets[i]:offsets[i + 1]] for i, idx in enumerate(arrays['region_indices'])}
+        self.adjacent_regions = {int(region_id): adjacent for region_id, adjacent in json.loads(str(arrays['adjacent_regions'])).items()}
+        self.num_points = len(self.points)
+        self.iteration_stats = []
+        self.growth_labels = None
+        logging.info(f"Loaded {len(self.regions_to_store)} regions from cached map {key}.")
+        return True
+
+    def run_cached_voronoi_process(self, cache):
+        """Return (cache key or None without a seed, whether the map came from the cache)."""
+        if self.seed is None:
+            logging.info("No seed set; map cannot be cached.")
+            self.run_voronoi_process()
+            return None, False
+        hit = self.load_from_cache(cache)
+        if not hit:
+            self.run_voronoi_process()
+            self.save_to_cache(cache)
+        key, _ = self.cache_key()
+        return key, hit
+
+    def switch_to_cached_map(self, cache, key):
+        if not self.load_from_cache(cache, key):
+            logging.error(f"Cached map {key} not found.")
+            return False
+        self.setup_regions_table()
+        self.store_voronoi_regions_to_db()
+        self.build_label_raster(cache, key)
+        self.validate_and_correct_adjacency()
+        self.store_region_metrics()
+        return True
+
+    def artifact_path(self, suffix):
+        # Derived map artifacts are kept next to the database they belong to
+        return os.path.splitext(self.db_path)[0] + suffix
+
+    @staticmethod
+    def cached_artifact_name(suffix, variant=None):
+        # Artifacts that also depend on settings outside the cache key are stored per variant
+        name = suffix.lstrip('_')
+        return name if variant is None else f"{variant}_{name}"
+
+    def restore_cached_artifacts(self, cache, key, suffixes, variant=None):
+        if cache is None or key is None:
+            return False
+        cached_paths = [cache.artifact_path(key, self.cached_artifact_name(suffix, variant)) for suffix in suffixes]
+        if not all(os.path.exists(path) for path in cached_paths):
+            return False
+        for suffix, cached_path in zip(suffixes, cached_paths):
+            shutil.copyfile(cached_path, self.artifact_path(suffix))
+        return True
+
+    def store_cached_artifacts(self, cache, key, suffixes, variant=None):
+        if cache is None or key is None:
+            return
+        for suffix in suffixes:
+            if os.path.exists(self.artifact_path(suffix)):
+                shutil.copyfile(self.artifact_path(suffix), cache.artifact_path(key, self.cached_artifact_name(suffix, variant)))
+        cache.refresh_size(key)
+
+    def build_label_raster(self, cache=None, key=None):
+        # The raster holds each pixel's region id
+        if not self.restore_cached_artifacts(cache, key, ['_labels.npy']):
+            if self.tessellation_mode == 'growth' and getattr(self, 'growth_labels', None) is not None:
+                # Grown regions are defined by their pixels; the outlines leave out holes
+                np.save(self.label_raster_path, self.growth_labels)
+            else:
+                rings = {idx + 1: coords for idx, coords in self.regions_to_store.items()}
+                rasterize_labels(rings, self.binary_mask.shape, self.label_raster_path)
+            self.store_cached_artifacts(cache, key, ['_labels.npy'])
+        self.label_raster = load_label_raster(self.label_raster_path)
+        return self.label_raster
+
+    def build_travel_costs(self, cache=None, key=None):
+        if self.streaming:
+            raise ValueError("Travel costs flood the whole map in memory and are not built in streaming mode.")
+        # Row i of the travel-cost table belongs to region i + 1
+        prefix = os.path.splitext(self.db_path)[0]
+        suffixes = ['_land_distance.npy', '_travel_costs.npy']
+        if self.travel_cost_k is None and len(self.points) <= self.travel_cost_dense_limit:
+            variant = 'dense'
+        else:
+            variant = f"k{min(self.travel_cost_k or DEFAULT_TRAVEL_COST_K, len(self.points))}"
+            suffixes.append('_travel_neighbours.npy')
+
+        if not self.restore_cached_artifacts(cache, key, suffixes, variant):
+            seeds = snap_to_land(self.binary_mask, self.points)
+            distance, labels = multi_source_bfs(self.binary_mask, seeds)
+            np.save(self.artifact_path('_land_distance.npy'), distance)
+            graph = seed_contact_graph(distance, labels, len(seeds))
+            costs, neighbours = travel_cost_matrix(graph, k=self.travel_cost_k, dense_limit=self.travel_cost_dense_limit)
+            save_travel_costs(prefix, costs, neighbours)
+            self.store_cached_artifacts(cache, key, suffixes, variant)
+            logging.info(f"Computed land travel costs between {len(seeds)} nodes.")
+
+        self.land_distance = np.load(self.artifact_path('_land_distance.npy'), mmap_mode='r')
+        self.travel_costs, self.travel_neighbours = load_travel_costs(prefix)
+        return self.travel_costs, self.travel_neighbours
+
+    def plot_and_save_voronoi(self, missing_regions=None):
+        if self.map_image is None:
+            raise ValueError("The overlay is drawn on the full map image, which streaming mode does not load.")
+        if missing_regions is None:
+            missing_regions = getattr(self, 'missing_regions', set())
+
+        # Composite borders, highlighted regions and seeds straight onto the map pixels
+        canvas = np.array(self.map_image)
+        vor = self.current_voronoi()
+        if self.tessellation_mode == 'voronoi':
+            finite_regions, finite_vertices = self.voronoi_finite_polygons_2d(vor)
+            rings = {idx + 1: np.round(finite_vertices[region]).astype(np.int32) for idx, region in enumerate(finite_regions)}
+        else:
+            rings = {idx + 1: np.round(ring).astype(np.int32) for idx, ring in self.regions_to_store.items()}
+
+        highlighted = [rings[region_id] for region_id in sorted(missing_regions) if region_id in rings]
+        if highlighted:
+            overlay = canvas.copy()
+            cv2.fillPoly(overlay, highlighted, (255, 0, 0, 255))
+            cv2.addWeighted(overlay, 0.4, canvas, 0.6, 0, dst=canvas)
+            logging.debug(f"Highlighting regions {sorted(missing_regions)}")
+
+        cv2.polylines(canvas, list(rings.values()), isClosed=True, color=(0, 0, 0, 255), thickness=1, lineType=cv2.LINE_AA)
+        for x, y in np.round(vor.points).astype(np.int32):
+            cv2.circle(canvas, (int(x), int(y)), 2, (0, 0, 0, 255), -1)
+
+        Image.fromarray(canvas).save(self.output_path)
+        logging.info(f"Voronoi overlay saved to {self.output_path}")
 
     def store_voronoi_regions_to_db(self):
-        written_regions = set()
         logging.info(f"Storing {len(self.regions_to_store)} regions.")
-        try:
-            with sqlite3.connect(self.db_path) as connection:
-                cursor = connection.cursor()
-                for idx, region_json in self.regions_to_store.items():
-                    log_idx = idx + 1  # Create a separate variable for logging
-                    logging.info(f"Processing region {log_idx} for DB storage.")
-                    centroid = self.points[idx]
-                    x_real, y_real = centroid[0], centroid[1]
-
-                    adjacent_region_ids = json.dumps(self.adjacent_regions[idx + 1])
-
-                    if region_json and isinstance(region_json, str) and len(region_json) > 0:
-                        try:
-                            json.loads(region_json)
-                            if not (np.isnan(x_real) or np.isnan(y_real)):
-                                cursor.execute('''
-                                    INSERT INTO regions (region_id, vertices, x_REAL, y_REAL, adjacent_regions)
-                                    VALUES (?, ?, ?, ?, ?)
-                                ''', (idx + 1, region_json, x_real, y_real, adjacent_region_ids))
-
-                                if cursor.rowcount > 0:
-                                    written_regions.add(idx + 1)
-                                    logging.info(f"Region {log_idx} successfully written to DB.")
-                                else:
-                                    logging.warning(f"Failed to write region {idx} to DB.")
-                            else:
-                                logging.warning(f"Invalid centroid coordinates for region {idx}.")
-                        except json.JSONDecodeError:
-                            logging.error(f"Invalid JSON format for region {idx}.")
-                    else:
-                        logging.warning(f"Empty or invalid region data for region {idx}.")
-
-                connection.commit()
-        except sqlite3.Error as e:
-            logging.error(f"Database connection error: {e}")
-        except Exception as e:
-            logging.error(f"General error: {e}")
+        rows = []
+        for idx, region_coords in self.regions_to_store.items():
+            centroid = self.points[idx]
+            x_real, y_real = centroid[0], centroid[1]
+
+            if region_coords is not None and len(region_coords) > 0:
+                if not np.all(np.isfinite(region_coords)):
+                    logging.error(f"Invalid vertex coordinates for region {idx}.")
+                elif not (np.isnan(x_real) or np.isnan(y_real)):
+                    rows.append((idx + 1, float(x_real), float(y_real)))
+                else:
+                    logging.warning(f"Invalid centroid coordinates for region {idx}.")
+            else:
+                logging.warning(f"Empty or invalid region data for region {idx}.")
+        # One executemany; node_region_mapping is refreshed in the same transaction
+        written_regions = save_regions(self.db_path, rows)
 
         missing_regions = set(range(1, self.num_points + 1)) - written_regions
         if missing_regions:
@@ -330,67 +440,228 @@ class VoronoiMap:
         else:
             logging.info("All regions successfully written to DB.")
 
-    def validate_and_correct_adjacency(self):
-        with sqlite3.connect(self.db_path) as conn:
-            # Load the regions data into a DataFrame
-            df = pd.read_sql_query("SELECT * FROM regions", conn)
-
-        # Convert vertices and adjacent_regions from JSON to lists
-        df['vertices'] = df['vertices'].apply(json.loads)
-        df['adjacent_regions'] = df['adjacent_regions'].apply(json.loads)
-
-        # Create a dictionary to hold the correct set of adjacent regions
-        correct_adjacency = {row['region_id']: [] for index, row in df.iterrows()}
+        # Shared vertices and edges of the written regions
+        self.topology = build_topology({region_id: self.regions_to_store[region_id - 1] for region_id in written_regions})
+        store_topology(self.db_path, self.topology)
+        build_lod(self.db_path, self.topology)
 
-        # Recheck adjacency based on shared vertices
-        for index, row in df.iterrows():
-            region_id = row['region_id']
-            vertices = set(tuple(v) for v in row['vertices'])
+        self.missing_regions = missing_regions
+        return missing_regions
 
-            for index2, row2 in df.iterrows():
-                if region_id != row2['region_id']:
-                    other_vertices = set(tuple(v) for v in row2['vertices'])
-                    if vertices & other_vertices:  # Check for shared vertices
-                        correct_adjacency[region_id].append(row2['region_id'])
+    def validate_and_correct_adjacency(self):
+        # Regions are adjacent when their land pixels touch. Without a label raster,
+        # fall back to regions sharing an edge of the stored topology.
+        if getattr(self, 'label_raster', None) is not None:
+            pairs, border_lengths = land_adjacency(self.label_raster, self.binary_mask, self.min_border_length)
+        else:
+            topology = load_topology(self.db_path)
+            if topology is None:
+                return
+            shared_borders = topology.border_lengths()
+            pairs = np.array(list(shared_borders), dtype=np.int64).reshape(-1, 2)
+            border_lengths = np.array(list(shared_borders.values()), dtype=np.float64)
+
+        store_adjacency(self.db_path, pairs, border_lengths)
+        # Seed edits merge update_adjacency results into these lists, so they hold the stored adjacency too
+        self.adjacent_regions = adjacency_lists(pairs, range(1, len(self.points) + 1))
+
+    def store_region_metrics(self, region_ids=None):
+        """
+        Compute and store area, land area, perimeter, shared border, compactness and
+        bounding box of every region, or only of region_ids.
+        """
+        rings = {idx + 1: ring for idx, ring in self.regions_to_store.items()
+                 if region_ids is None or idx + 1 in region_ids}
+        rings = {region_id: ring for region_id, ring in rings.items() if region_id not in getattr(self, 'missing_regions', set())}
+
+        land_area = None
+        labels = getattr(self, 'label_raster', None)
+        if labels is not None and rings:
+            if region_ids is None:
+                land_area = zonal_stats(labels, mask=self.binary_mask)['count']
+            else:
+                # Pixels of a region lie inside its ring's bounding box
+                x0, y0, x1, y1 = ring_window(list(rings.values()), labels.shape)
+                land_area = zonal_stats(np.asarray(labels[y0:y1, x0:x1]), mask=self.binary_mask[y0:y1, x0:x1])['count']
+
+        pairs, border_lengths = load_adjacency(self.db_path)
+        metrics = compute_region_metrics(rings, land_area, pairs, border_lengths)
+        store_region_metrics(self.db_path, metrics, region_ids)
+        return metrics
+
+    def current_voronoi(self):
+        # Seed edits update regions in place; the full diagram is rebuilt only when asked for
+        if self.vor_stale:
+            self.vor = Voronoi(self.generators)
+            self.vor_stale = False
+        return self.vor
+
+    def ensure_seed_state(self):
+        if self.tessellation_mode != 'voronoi':
+            raise ValueError("Seed edits re-tessellate Voronoi maps only; regenerate power diagrams instead.")
+        if self.generators is None:
+            self.generators = np.array(self.vor.points, dtype=np.float64)
+            self.seed_neighbours = ridge_neighbours(self.vor.ridge_points, len(self.generators))
+            self.points = np.array(self.points, dtype=np.float64)
+
+    def move_seed(self, region_id, x, y):
+        """Move the seed of a region and update the regions around it."""
+        self.ensure_seed_state()
+        index = region_id - 1
+        generators = self.generators.copy()
+        generators[index] = (x, y)
+        self.points[index] = (x, y)
+        return self.retessellate(generators, {index}, set(self.seed_neighbours[index]))
+
+    def add_seed(self, x, y):
+        """Add a seed as region len(points) + 1 and update the regions around it."""
+        self.ensure_seed_state()
+        index = len(self.generators)
+        generators = np.vstack((self.generators, [(x, y)]))
+        self.points = np.vstack((self.points, [(x, y)]))
+        self.seed_neighbours.append(set())
+        return self.retessellate(generators, {index}, set())
+
+    def remove_seed(self, region_id):
+        """
+        Remove the seed of a region and let its neighbours take over its area.
 
-        # Update the DataFrame with the correct adjacency information
-        df['adjacent_regions'] = df['region_id'].apply(lambda x: correct_adjacency[x])
+        The last region moves into the freed id so region ids stay contiguous.
+        """
+        self.ensure_seed_state()
+        index, last = region_id - 1, len(self.generators) - 1
+        generators = self.generators.copy()
+        removed_ring = self.regions_to_store.pop(index, None)
+        previous = set(self.seed_neighbours[index]) - {index}
+        for neighbour in previous:
+            self.seed_neighbours[neighbour].discard(index)
+
+        renamed = None
+        if index != last:
+            for neighbour in self.seed_neighbours[last]:
+                self.seed_neighbours[neighbour].discard(last)
+                self.seed_neighbours[neighbour].add(index)
+            self.seed_neighbours[index] = self.seed_neighbours[last]
+            if last in self.regions_to_store:
+                self.regions_to_store[index] = self.regions_to_store.pop(last)
+            self.points[index] = self.points[last]
+            generators[index] = generators[last]
+            previous = {index if neighbour == last else neighbour for neighbour in previous}
+            renamed = (last + 1, index + 1)
+
+        self.seed_neighbours.pop()
+        self.points = self.points[:-1]
+        self.adjacent_regions.pop(last + 1, None)
+        return self.retessellate(generators[:-1], set(), previous, removed_ring=removed_ring,
+                                 removed_id=region_id, renamed=renamed)
+
+    def local_voronoi_cells(self, generators, tree, changed, previous, candidates):
+        return local_voronoi_cells(generators, tree, changed, previous, candidates, self.bounding_box)
+
+    def retessellate(self, generators, changed, previous, removed_ring=None, removed_id=None, renamed=None):
+        """
+        Update the regions whose Voronoi cells change after a seed edit and write
+        only their rows, label pixels and adjacency edges.
+
+        Parameters:
+            generators (ndarray): (n, 2) generator points after the edit.
+            changed (set): Indices of seeds that were moved or added.
+            previous (set): Indices of seeds that neighboured the edited seeds before the edit.
+            removed_ring (ndarray, optional): Ring of a removed region.
+            removed_id (int, optional): Region id of a removed region.
+            renamed (tuple, optional): (old_id, new_id) of a region that changed id only.
+
+        Returns:
+            list: Region ids whose geometry was recomputed.
+        """
+        tree = cKDTree(generators)
+        candidates = edit_candidates(tree, generators, self.seed_neighbours, changed, previous)
+        cells, neighbours = self.local_voronoi_cells(generators, tree, changed, previous, candidates)
+        edited_ids = {index + 1 for index in cells} | {region_id for region_id in (removed_id,) + tuple(renamed or ()) if region_id is not None}
+        # Shared borders also change for the land neighbours of edited regions, before and after the edit
+        metric_ids = edited_ids | {neighbour for region_id in edited_ids for neighbour in self.adjacent_regions.get(region_id, [])}
+
+        old_rings = [self.regions_to_store[index] for index in cells if index in self.regions_to_store]
+        if removed_ring is not None:
+            old_rings.append(removed_ring)
+        dropped_ids = apply_cells(cells, neighbours, self.seed_neighbours, self.regions_to_store)
+        for index, polygon in cells.items():
+            if polygon is None:
+                continue
+            centroid = np.array(compute_land_centroid(polygon, self.binary_mask, region_id=index + 1))
+            if np.linalg.norm(centroid - self.points[index]) < self.movement_threshold:
+                self.points[index] = centroid
+
+        self.generators = generators
+        self.num_points = len(generators)
+        self.vor_stale = True
+        changed_ids = {index + 1 for index in cells} - dropped_ids
+        if removed_id is not None and removed_id > self.num_points:
+            dropped_ids.add(removed_id)
+        if renamed is not None:
+            dropped_ids.add(renamed[0])
+
+        row_ids = changed_ids | ({renamed[1]} if renamed is not None else set())
+        self.write_region_rows(sorted(row_ids), sorted(dropped_ids - row_ids), removed_id, renamed)
+        # Only the faces of rewritten and dropped regions change; the rest of the topology keeps its rows
+        replaced_ids = row_ids | dropped_ids
+        if getattr(self, 'topology', None) is None:
+            self.topology = load_topology(self.db_path)
+        self.topology, topology_changes = patch_topology(self.topology, {region_id: self.regions_to_store[region_id - 1] for region_id in row_ids},
+                                                         replaced_ids)
+        store_topology_changes(self.db_path, self.topology, topology_changes)
+        # Simplified borders change for the rewritten regions and the regions sharing a border with them
+        lod_ids = row_ids | dropped_ids | {neighbour + 1 for region_id in row_ids for neighbour in self.seed_neighbours[region_id - 1]}
+        build_lod(self.db_path, self.topology, region_ids=lod_ids)
+
+        if getattr(self, 'label_raster', None) is not None and os.path.exists(self.label_raster_path):
+            self.update_label_raster(changed_ids, old_rings, removed_id, renamed)
+        else:
+            shared_borders = self.topology.border_lengths(replaced_ids)
+            pairs = np.array(list(shared_borders), dtype=np.int64).reshape(-1, 2)
+            border_lengths = np.array(list(shared_borders.values()), dtype=np.float64)
+            self.adjacent_regions.update(update_adjacency(self.db_path, replaced_ids, pairs, border_lengths))
+
+        metric_ids |= lod_ids | {neighbour for region_id in edited_ids for neighbour in self.adjacent_regions.get(region_id, [])}
+        self.store_region_metrics(metric_ids)
+
+        # Travel costs cover the old seed set; build_travel_costs recomputes them
+        self.land_distance = self.travel_costs = self.travel_neighbours = None
+        logging.info(f"Re-tessellated {len(cells)} regions around the edited seed.")
+        return sorted(changed_ids)
+
+    def write_region_rows(self, region_ids, deleted_ids=(), removed_id=None, renamed=None):
+        rows = [(region_id, float(self.points[region_id - 1][0]), float(self.points[region_id - 1][1])) for region_id in region_ids]
+        if save_regions(self.db_path, rows, deleted_ids, replace=True, removed_node=removed_id, renamed=renamed) or not rows:
+            logging.info(f"Rewrote {len(region_ids)} region rows and deleted {len(deleted_ids)}.")
+
+    def update_label_raster(self, changed_ids, old_rings, removed_id=None, renamed=None):
+        labels = np.load(self.label_raster_path, mmap_mode='r+')
+        pairs, lengths = relabel_edit(labels, self.binary_mask, self.regions_to_store, self.seed_neighbours,
+                                      changed_ids, old_rings, removed_id, renamed)
+        labels.flush()
+        del labels
+        self.label_raster = load_label_raster(self.label_raster_path)
+
+        keep = lengths >= self.min_border_length
+        replaced_ids = set(changed_ids) | {region_id for region_id in (removed_id,) if region_id is not None}
+        if renamed is not None:
+            replaced_ids |= set(renamed)
+        self.adjacent_regions.update(update_adjacency(self.db_path, replaced_ids, pairs[keep], lengths[keep]))
 
-        # Update the database with the corrected adjacent regions
-        with sqlite3.connect(self.db_path) as conn:
-            for index, row in df.iterrows():
-                adjacent_json = json.dumps(row['adjacent_regions'])
-                conn.execute("UPDATE regions SET adjacent_regions = ? WHERE region_id = ?", (adjacent_json, row['region_id']))
-            conn.commit()
+    def setup_regions_table(self):
+        # The schema is owned by the migrations; a new map only replaces the rows
+        migrate(self.db_path)
 
+        def clear_regions(conn):
+            conn.execute('DELETE FROM regions')
+            clear_boundary_versions(conn.cursor())
 
-    def setup_regions_table(self):
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("DROP TABLE IF EXISTS regions")
-                cursor.execute('''
-                    CREATE TABLE regions (
-                        region_id INTEGER PRIMARY KEY,
-                        vertices TEXT,
-                        x_REAL REAL,
-                        y_REAL REAL,
-                        adjacent_regions TEXT
-                    )
-                ''')
-                conn.commit()
+            get_database(self.db_path).write(clear_regions)
         except sqlite3.Error as e:
             logging.error(f"Error setting up the regions table in DB: {e}")
 
 if __name__ == "__main__":
-    map_image_path = 'E:/AoCSim/Assets/Map_of_Verra_cleanup_notext_nowater.png'
-    db_path = 'E:\\AoCSim\\SQLite_Queries\\nodes.db'
-    log_file_path = 'voronoi_log.log'
-    output_path = 'E:/AoCSim/Assets/voronoi_overlay_map.png'
-
-    voronoi_map = VoronoiMap(map_image_path, db_path, log_file_path, output_path)
-    voronoi_map.setup_regions_table()
-    voronoi_map.run_voronoi_process()
-    voronoi_map.store_voronoi_regions_to_db()
-    voronoi_map.validate_and_correct_adjacency()
-    voronoi_map.plot_and_save_voronoi()
\ No newline at end of file
+    from map.generate_map import main
+    main()
@@ -0,0 +1,194 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import tracemalloc
+from contextlib import contextmanager
+from config import Settings
+from map.createNodes import VoronoiMap, ALGORITHM_VERSION
+from map.map_cache import MapCache
+
+# resource is Unix-only; without it phases report no memory figures
+try:
+    import resource
+except ImportError:
+    resource = None
+
+def _maxrss_mb(who):
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+def _reset_peak_rss():
+    # Linux resets the process high-water mark when 5 is written to clear_refs
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        return True
+    except OSError:
+        return False
+
+class PhaseTimer:
+    """
+    Records wall time and peak resident memory of each named phase of a run.
+
+    Peak RSS covers everything the process maps, including numpy buffers,
+    memory maps and native libraries, and worker processes are reported
+    separately. Where the kernel cannot reset the high-water mark per phase,
+    the peak is the largest since the run started. With trace_python set,
+    tracemalloc also records the peak of Python allocations per phase; it slows
+    allocation-heavy phases down, so it is off unless asked for.
+
+    Parameters:
+        trace_python (bool): Also trace Python allocations with tracemalloc.
+    """
+
+    def __init__(self, trace_python=False):
+        self.phases = []
+        self.trace_python = trace_python
+
+    @contextmanager
+    def phase(self, name):
+        per_phase = resource is not None and _reset_peak_rss()
+        if self.trace_python:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        logging.info(f"Phase '{name}' started.")
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            record = {'name': name, 'seconds': round(seconds, 4)}
+            if resource is not None:
+                record['peak_rss_mb'] = round(_maxrss_mb(resource.RUSAGE_SELF), 2)
+                record['children_peak_rss_mb'] = round(_maxrss_mb(resource.RUSAGE_CHILDREN), 2)
+                record['peak_rss_per_phase'] = per_phase
+            if self.trace_python:
+                record['python_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 2)
+            self.phases.append(record)
+            logging.info(f"Phase '{name}' took {seconds:.2f}s, peak RSS {record.get('peak_rss_mb', 0.0):.1f} MB.")
+
+def parse_args(argv=None):
+    settings = Settings()
+    parser = argparse.ArgumentParser(description="Generate the node map from a land image and store it in the database.")
+    parser.add_argument('--image', default=settings.get('map_image_path'), help="Map image; transparent pixels are water.")
+    parser.add_argument('--db', default=settings.get('db_path'), help="SQLite database the regions are written to.")
+    parser.add_argument('--seed', type=int, default=None, help="Random seed; required for the map cache.")
+    parser.add_argument('--points', type=int, default=100, help="Number of regions.")
+    parser.add_argument('--iterations', type=int, default=10, help="Relaxation iterations.")
+    parser.add_argument('--mode', choices=['voronoi', 'power', 'growth'], default='voronoi', help="Tessellation mode.")
+    parser.add_argument('--seed-weights', default=None, help="JSON file with one importance weight per region (power mode).")
+    parser.add_argument('--workers', type=int, default=1, help="Worker processes for the relaxation.")
+    parser.add_argument('--cache-dir', default=None, help="Map cache directory; no caching when omitted.")
+    parser.add_argument('--overlay', default=None, help="Write the region overlay image to this path.")
+    parser.add_argument('--no-travel-costs', action='store_true', help="Skip the land travel-cost tables.")
+    parser.add_argument('--streaming', action='store_true',
+                        help="Keep the land mask as a packed bitfield on disk for very large images (voronoi mode, no travel costs or overlay).")
+    parser.add_argument('--trace-python-memory', action='store_true',
+                        help="Also record peak Python allocations per phase with tracemalloc (slows the run down).")
+    parser.add_argument('--report', default=None, help="Write the JSON run report to this path.")
+    parser.add_argument('--log-file', default='voronoi_log.log', help="Log file of the run.")
+    args = parser.parse_args(argv)
+    if args.streaming and (args.mode != 'voronoi' or args.overlay):
+        parser.error("--streaming supports --mode voronoi only and cannot draw --overlay")
+    return args
+
+def run(args):
+    """
+    Generate a map with the given command-line options.
+
+    Returns:
+        dict: The run report with parameters, per-phase timings, iteration
+        statistics and the regions that failed to store.
+    """
+    timer = PhaseTimer(trace_python=args.trace_python_memory)
+    if args.trace_python_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        with timer.phase('setup'):
+            voronoi_map = VoronoiMap(args.image, args.db, args.log_file, args.overlay, streaming=args.streaming)
+            voronoi_map.seed = args.seed
+            voronoi_map.num_points = args.points
+            voronoi_map.num_iterations = args.iterations
+            voronoi_map.num_workers = args.workers
+            voronoi_map.tessellation_mode = args.mode
+            if args.seed_weights:
+                with open(args.seed_weights, 'r') as weights_file:
+                    voronoi_map.seed_weights = json.load(weights_file)
+            voronoi_map.setup_regions_table()
+            cache = MapCache(args.cache_dir) if args.cache_dir else None
+
+        with timer.phase('relax'):
+            if cache is not None:
+                cache_key, cache_hit = voronoi_map.run_cached_voronoi_process(cache)
+            else:
+                cache_key, cache_hit = None, False
+                voronoi_map.run_voronoi_process()
+        with timer.phase('store'):
+            missing_regions = voronoi_map.store_voronoi_regions_to_db()
+        with timer.phase('label_raster'):
+            voronoi_map.build_label_raster(cache, cache_key)
+        with timer.phase('validate'):
+            voronoi_map.validate_and_correct_adjacency()
+        with timer.phase('metrics'):
+            voronoi_map.store_region_metrics()
+        if not (args.no_travel_costs or args.streaming):
+            with timer.phase('travel_costs'):
+                voronoi_map.build_travel_costs(cache, cache_key)
+        if args.overlay:
+            with timer.phase('plot'):
+                voronoi_map.plot_and_save_voronoi(missing_regions)
+    finally:
+        if args.trace_python_memory:
+            tracemalloc.stop()
+
+    return {
+        'parameters': {
+            'image': args.image,
+            'db': args.db,
+            'seed': args.seed,
+            'num_points': args.points,
+            'num_iterations': args.iterations,
+            'mode': args.mode,
+            'workers': args.workers,
+            'streaming': args.streaming,
+            'algorithm_version': ALGORITHM_VERSION,
+        },
+        'environment': {'python': platform.python_version(), 'platform': platform.platform()},
+        'map_size': [voronoi_map.map_width, voronoi_map.map_height],
+        'cache_key': cache_key,
+        'cached': cache_hit,
+        'num_regions': len(voronoi_map.regions_to_store),
+        'missing_regions': sorted(missing_regions),
+        'iterations': voronoi_map.iteration_stats,
+        'phases': timer.phases,
+        'total_seconds': round(time.perf_counter() - started, 4),
+    }
+
+def write_report(report, path):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as report_file:
+        json.dump(report, report_file, indent=2)
+    os.replace(temp_path, path)
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run(args)
+    if args.report:
+        write_report(report, args.report)
+
+    for phase in report['phases']:
+        print(f"{phase['name']:<14}{phase['seconds']:>10.2f}s{phase.get('peak_rss_mb', 0.0):>10.1f} MB")
+    print(f"{'total':<14}{report['total_seconds']:>10.2f}s")
+    if report['missing_regions']:
+        print(f"{len(report['missing_regions'])} regions were not stored: {report['missing_regions']}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
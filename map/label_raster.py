@@ -0,0 +1,282 @@
+import logging
+import numpy as np
+import cv2
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+# Label of pixels not covered by any region
+NO_REGION = 0
+
+def rasterize_labels(rings, shape, path=None):
+    """
+    Burn every region ring into an integer raster of region ids.
+
+    Parameters:
+        rings (dict): {region_id: (n, 2) ring coordinates}.
+        shape (tuple): (height, width) of the map.
+        path (str, optional): Write the raster to this .npy file as a memmap.
+
+    Returns:
+        ndarray: int32 raster indexed [y, x].
+    """
+    if path is not None:
+        labels = np.lib.format.open_memmap(path, mode='w+', dtype=np.int32, shape=shape)
+        labels[:] = NO_REGION
+    else:
+        labels = np.zeros(shape, dtype=np.int32)
+
+    for region_id in sorted(rings):
+        coords = np.round(np.asarray(rings[region_id], dtype=np.float64)).astype(np.int32)
+        cv2.fillPoly(labels, [coords], int(region_id))
+
+    if path is not None:
+        labels.flush()
+        logging.info(f"Label raster written to {path}")
+    return labels
+
+def load_label_raster(path):
+    """Open a label raster read-only without loading it into memory."""
+    return np.load(path, mmap_mode='r')
+
+def _row_chunks(height, chunk_rows):
+    for start in range(0, height, chunk_rows):
+        yield slice(start, min(start + chunk_rows, height))
+
+def zonal_stats(labels, layer=None, num_labels=None, mask=None, chunk_rows=1024):
+    """
+    Per-region count, sum and mean of a raster layer.
+
+    The whole map is processed with np.bincount in row chunks, so memory use is
+    bounded by chunk_rows even for memory-mapped inputs.
+
+    Parameters:
+        labels (ndarray): Region id raster.
+        layer (ndarray, optional): Values to aggregate; counts only if omitted.
+        num_labels (int, optional): Length of the result arrays (max label + 1).
+        mask (ndarray, optional): Boolean raster; only True pixels are counted.
+        chunk_rows (int, optional): Rows processed per chunk.
+
+    Returns:
+        dict: 'count', 'sum' and 'mean' arrays indexed by region id.
+    """
+    if num_labels is None:
+        num_labels = int(max(labels[rows].max() for rows in _row_chunks(labels.shape[0], chunk_rows))) + 1
+
+    count = np.zeros(num_labels, dtype=np.float64)
+    total = np.zeros(num_labels, dtype=np.float64)
+    for rows in _row_chunks(labels.shape[0], chunk_rows):
+        chunk_labels = np.asarray(labels[rows]).ravel()
+        chunk_weights = None if layer is None else np.asarray(layer[rows], dtype=np.float64).ravel()
+        if mask is not None:
+            chunk_mask = np.asarray(mask[rows]).ravel().astype(bool)
+            chunk_labels = chunk_labels[chunk_mask]
+            if chunk_weights is not None:
+                chunk_weights = chunk_weights[chunk_mask]
+        count += np.bincount(chunk_labels, minlength=num_labels)
+        if chunk_weights is not None:
+            total += np.bincount(chunk_labels, weights=chunk_weights, minlength=num_labels)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / count
+    return {'count': count, 'sum': total, 'mean': mean}
+
+def region_centroids(labels, mask=None, num_labels=None, chunk_rows=1024):
+    """Return (num_labels, 2) pixel centroids of every region, optionally over mask pixels only."""
+    height, width = labels.shape
+    x_layer = np.broadcast_to(np.arange(width, dtype=np.float64), (height, width))
+    y_layer = np.broadcast_to(np.arange(height, dtype=np.float64)[:, None], (height, width))
+    x_stats = zonal_stats(labels, x_layer, num_labels=num_labels, mask=mask, chunk_rows=chunk_rows)
+    y_stats = zonal_stats(labels, y_layer, num_labels=len(x_stats['count']), mask=mask, chunk_rows=chunk_rows)
+    return np.stack((x_stats['mean'], y_stats['mean']), axis=1)
+
+def land_fraction(labels, land_mask, num_labels=None, chunk_rows=1024):
+    """Return the fraction of each region's pixels that are land."""
+    return zonal_stats(labels, land_mask, num_labels=num_labels, chunk_rows=chunk_rows)['mean']
+
+def land_adjacency(labels, land_mask, min_border_length=1, chunk_rows=1024):
+    """
+    Find regions that touch across land and the length of each shared land border.
+
+    Two regions are adjacent when a land pixel of one is a 4-neighbour of a land
+    pixel of the other, so corner-only contacts and contacts across water are
+    ignored. Border length is the number of such pixel edges.
+
+    Parameters:
+        labels (ndarray): Region id raster.
+        land_mask (ndarray): Boolean land raster of the same shape.
+        min_border_length (int, optional): Drop contacts shorter than this, such as
+            single-pixel touches where polygon corners meet after rounding.
+        chunk_rows (int, optional): Rows processed per chunk.
+
+    Returns:
+        tuple: (pairs, border_lengths) where pairs is a (k, 2) array of region ids
+        with region_a < region_b.
+    """
+    height = labels.shape[0]
+    stride = np.int64(int(max(labels[rows].max() for rows in _row_chunks(height, chunk_rows))) + 1)
+    chunk_keys, chunk_counts = [], []
+
+    for rows in _row_chunks(height, chunk_rows):
+        # One extra row so contacts across the chunk boundary are counted once
+        stop = min(rows.stop + 1, height)
+        chunk_labels = np.asarray(labels[rows.start:stop])
+        chunk_land = np.asarray(land_mask[rows.start:stop]).astype(bool) & (chunk_labels != NO_REGION)
+        own_rows = rows.stop - rows.start
+
+        contacts = [
+            (chunk_labels[:own_rows, :-1], chunk_labels[:own_rows, 1:],
+             chunk_land[:own_rows, :-1] & chunk_land[:own_rows, 1:]),
+            (chunk_labels[:-1], chunk_labels[1:], chunk_land[:-1] & chunk_land[1:]),
+        ]
+        for a, b, both_land in contacts:
+            touching = both_land & (a != b)
+            a, b = a[touching].astype(np.int64), b[touching].astype(np.int64)
+            keys = np.minimum(a, b) * stride + np.maximum(a, b)
+            keys, counts = np.unique(keys, return_counts=True)
+            chunk_keys.append(keys)
+            chunk_counts.append(counts)
+
+    keys = np.concatenate(chunk_keys) if chunk_keys else np.empty(0, dtype=np.int64)
+    counts = np.concatenate(chunk_counts) if chunk_counts else np.empty(0, dtype=np.int64)
+    keys, inverse = np.unique(keys, return_inverse=True)
+    border_lengths = np.bincount(inverse.ravel(), weights=counts, minlength=len(keys))
+    keep = border_lengths >= min_border_length
+    pairs = np.stack((keys[keep] // stride, keys[keep] % stride), axis=1)
+    return pairs, border_lengths[keep]
+
+def _crack_edges(labels):
+    # Directed pixel sides between a region pixel and a differently labelled 4-neighbour.
+    # Corner (x, y) has vertex id y * (width + 1) + x; every side keeps its pixel on the
+    # right, so direction (d + 1) % 4 is a right turn after direction d.
+    height, width = labels.shape
+    padded = np.pad(np.asarray(labels), 1, constant_values=NO_REGION)
+    inner = padded[1:-1, 1:-1]
+    neighbours = [padded[:-2, 1:-1], padded[1:-1, 2:], padded[2:, 1:-1], padded[1:-1, :-2]]
+    # (start corner, end corner) offsets of the top, right, bottom and left sides
+    corners = [((0, 0), (1, 0)), ((1, 0), (1, 1)), ((1, 1), (0, 1)), ((0, 1), (0, 0))]
+    edge_labels, directions, starts, ends, across = [], [], [], [], []
+    for direction, (neighbour, (start, end)) in enumerate(zip(neighbours, corners)):
+        ys, xs = np.nonzero((inner != NO_REGION) & (inner != neighbour))
+        edge_labels.append(inner[ys, xs].astype(np.int64))
+        directions.append(np.full(len(xs), direction, dtype=np.int8))
+        starts.append((ys + start[1]) * (width + 1) + xs + start[0])
+        ends.append((ys + end[1]) * (width + 1) + xs + end[0])
+        across.append(neighbour[ys, xs].astype(np.int64))
+    return tuple(np.concatenate(parts) for parts in (edge_labels, directions, starts, ends, across))
+
+def label_outlines(labels):
+    """
+    Trace the outer boundary of every region of a label raster along pixel edges.
+
+    Rings run along pixel corners, so neighbouring regions share exactly the same
+    vertices along their common border. A vertex is kept where the boundary turns
+    or where the region on the other side changes, which keeps every junction
+    needed by the shared topology. Where a region touches itself only at a corner
+    the trace turns back into the same pixel, so the parts become separate rings;
+    holes and all but the largest part of a region are left out.
+
+    Parameters:
+        labels (ndarray): Region id raster; NO_REGION pixels belong to no region.
+
+    Returns:
+        dict: {region_id: closed (n, 2) float64 ring in pixel-corner coordinates}.
+    """
+    height, width = labels.shape
+    edge_labels, directions, starts, ends, across = _crack_edges(labels)
+    num_edges = len(edge_labels)
+    if num_edges == 0:
+        return {}
+    num_vertices = np.int64((height + 1) * (width + 1))
+
+    # Follow each side to the side of the same region leaving its end corner. Two
+    # sides leave a corner where the region touches itself diagonally; take the right turn.
+    start_keys = edge_labels * num_vertices + starts
+    order = np.argsort(start_keys, kind='stable')
+    sorted_keys = start_keys[order]
+    end_keys = edge_labels * num_vertices + ends
+    first = np.searchsorted(sorted_keys, end_keys, side='left')
+    choices = np.searchsorted(sorted_keys, end_keys, side='right') - first
+    successor = order[first]
+    pinched = np.flatnonzero(choices == 2)
+    if len(pinched):
+        other = order[first[pinched] + 1]
+        right_turn = (directions[pinched] + 1) % 4
+        successor[pinched] = np.where(directions[other] == right_turn, other, successor[pinched])
+
+    graph = csr_matrix((np.ones(num_edges, dtype=np.int8), (np.arange(num_edges), successor)), shape=(num_edges, num_edges))
+    _, ring_of = connected_components(graph, directed=True, connection='weak')
+
+    # Rank every side within its ring by pointer jumping from the ring's first side
+    ring_starts = np.full(ring_of.max() + 1, num_edges, dtype=np.int64)
+    np.minimum.at(ring_starts, ring_of, np.arange(num_edges))
+    last = successor == ring_starts[ring_of]
+    remaining = np.where(last, 0, 1).astype(np.int64)
+    pointer = np.where(last, np.arange(num_edges), successor)
+    while True:
+        moving = pointer != pointer[pointer]
+        if not moving.any():
+            break
+        remaining = remaining + remaining[pointer]
+        pointer = pointer[pointer]
+
+    predecessor = np.empty(num_edges, dtype=np.int64)
+    predecessor[successor] = np.arange(num_edges)
+    keep = (directions[predecessor] != directions) | (across[predecessor] != across)
+
+    xs, ys = starts % (width + 1), starts // (width + 1)
+    end_xs, end_ys = ends % (width + 1), ends // (width + 1)
+    areas = np.bincount(ring_of, weights=(xs * end_ys - end_xs * ys).astype(np.float64))
+    ring_labels = np.zeros(len(areas), dtype=np.int64)
+    ring_labels[ring_of] = edge_labels
+
+    # Outer boundaries have positive area and holes negative; the largest ring is kept
+    by_size = np.lexsort((-areas, ring_labels))
+    outer = by_size[np.concatenate(([True], ring_labels[by_size][1:] != ring_labels[by_size][:-1]))]
+    multipart = np.bincount(ring_labels[areas > 0])
+    if np.any(multipart > 1):
+        logging.debug(f"{np.count_nonzero(multipart > 1)} regions have more than one part; only the largest is kept.")
+
+    selected = keep & np.isin(ring_of, outer)
+    edge_ids = np.flatnonzero(selected)
+    edge_ids = edge_ids[np.lexsort((-remaining[edge_ids], ring_of[edge_ids]))]
+    coords = np.stack((xs[edge_ids], ys[edge_ids]), axis=1).astype(np.float64)
+    ring_ids = ring_of[edge_ids]
+    bounds = np.flatnonzero(np.concatenate(([True], ring_ids[1:] != ring_ids[:-1], [True])))
+    outlines = {}
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        ring = coords[start:stop]
+        outlines[int(ring_labels[ring_ids[start]])] = np.vstack((ring, ring[:1]))
+    return outlines
+
+def relabel_window(labels, rings, region_ids, window):
+    """
+    Re-burn regions inside a window of a writable label raster.
+
+    Pixels currently labelled with one of region_ids, or covered by one of their
+    new rings, are redrawn. rings should also hold the neighbours of region_ids so
+    shared border pixels resolve to the highest id, as in rasterize_labels.
+
+    Parameters:
+        labels (ndarray): Writable region id raster.
+        rings (dict): {region_id: ring coordinates} of the redrawn regions and their neighbours.
+        region_ids (iterable): Ids whose pixels are redrawn, including ids that no longer exist.
+        window (tuple): (x0, y0, x1, y1) pixel window holding every old and new pixel of region_ids.
+    """
+    x0, y0, x1, y1 = window
+    region_ids = np.array(sorted(region_ids), dtype=np.int64)
+    current = np.asarray(labels[y0:y1, x0:x1])
+    canvas = np.zeros(current.shape, dtype=np.int32)
+    offset = np.array([x0, y0], dtype=np.int32)
+    for region_id in sorted(rings):
+        coords = np.round(np.asarray(rings[region_id], dtype=np.float64)).astype(np.int32) - offset
+        cv2.fillPoly(canvas, [coords], int(region_id))
+    redraw = np.isin(current, region_ids) | np.isin(canvas, region_ids)
+    labels[y0:y1, x0:x1][redraw] = canvas[redraw]
+
+def ring_window(rings, shape, margin=0):
+    """Return the (x0, y0, x1, y1) pixel window covering a set of rings, clipped to the raster."""
+    coords = np.concatenate([np.asarray(ring, dtype=np.float64).reshape(-1, 2) for ring in rings])
+    height, width = shape
+    x0, y0 = np.maximum(np.floor(coords.min(axis=0)).astype(np.int64) - margin, 0)
+    x1, y1 = np.minimum(np.ceil(coords.max(axis=0)).astype(np.int64) + margin + 1, [width, height])
+    return int(x0), int(y0), int(x1), int(y1)
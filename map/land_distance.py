@@ -0,0 +1,192 @@
+import os
+import logging
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+# 8-connected neighbour offsets as (dy, dx); every step costs one unit, diagonals included,
+# so a step count d stands for a Euclidean length between d and sqrt(2) * d pixels
+NEIGHBOUR_OFFSETS = [(0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1)]
+
+# Destinations kept per seed when the dense matrix is too large
+DEFAULT_TRAVEL_COST_K = 32
+
+def snap_to_land(land_mask, seeds, max_radius=256):
+    """
+    Move each seed to the nearest land pixel within max_radius (Chebyshev distance).
+
+    Returns:
+        ndarray: (n, 2) integer pixel coordinates; seeds with no land nearby keep
+        their rounded position.
+    """
+    height, width = land_mask.shape
+    seeds = np.clip(np.round(np.asarray(seeds, dtype=np.float64)).astype(np.int64), 0, [width - 1, height - 1])
+    snapped = seeds.copy()
+    for i, (x, y) in enumerate(seeds):
+        if land_mask[y, x]:
+            continue
+        radius = 1
+        while radius <= max_radius:
+            y0, y1 = max(y - radius, 0), min(y + radius + 1, height)
+            x0, x1 = max(x - radius, 0), min(x + radius + 1, width)
+            window_y, window_x = np.nonzero(land_mask[y0:y1, x0:x1])
+            if len(window_x):
+                nearest = np.argmin((window_x + x0 - x) ** 2 + (window_y + y0 - y) ** 2)
+                snapped[i] = (window_x[nearest] + x0, window_y[nearest] + y0)
+                break
+            radius *= 2
+        else:
+            logging.warning(f"Seed {i + 1} at ({x}, {y}) has no land within {max_radius} pixels.")
+    return snapped
+
+def multi_source_bfs(land_mask, seeds):
+    """
+    Grow geodesic distance fronts over land from every seed at once.
+
+    The search runs on flat pixel indices: each step expands the whole frontier
+    in the eight neighbour directions with array operations.
+
+    Parameters:
+        land_mask (ndarray): Boolean land raster indexed [y, x].
+        seeds (ndarray): (n, 2) integer pixel coordinates; seed i gets label i + 1.
+
+    Returns:
+        tuple: (distance, labels) rasters. distance is the number of 8-connected
+        steps to the nearest seed (-1 where unreachable) and labels holds the
+        1-based index of that seed (0 where unreachable).
+    """
+    height, width = land_mask.shape
+    padded_width = width + 2
+    # A one-pixel water border keeps neighbour offsets from wrapping between rows
+    land = np.zeros((height + 2, padded_width), dtype=bool)
+    land[1:-1, 1:-1] = land_mask
+    land = land.ravel()
+
+    labels = np.zeros(land.size, dtype=np.int32)
+    distance = np.full(land.size, -1, dtype=np.int32)
+
+    seeds = np.asarray(seeds, dtype=np.int64).reshape(-1, 2)
+    frontier = (seeds[:, 1] + 1) * padded_width + (seeds[:, 0] + 1)
+    seed_labels = np.arange(1, len(seeds) + 1, dtype=np.int32)
+    on_land = land[frontier]
+    if not np.all(on_land):
+        logging.warning(f"{np.count_nonzero(~on_land)} seeds are not on land and were skipped.")
+    frontier, seed_labels = frontier[on_land], seed_labels[on_land]
+    frontier, first = np.unique(frontier, return_index=True)
+    labels[frontier] = seed_labels[first]
+    distance[frontier] = 0
+
+    offsets = [dy * padded_width + dx for dy, dx in NEIGHBOUR_OFFSETS]
+    step = 0
+    while frontier.size:
+        step += 1
+        reached = []
+        for offset in offsets:
+            neighbours = frontier + offset
+            free = land[neighbours] & (labels[neighbours] == 0)
+            neighbours, sources = neighbours[free], frontier[free]
+            neighbours, first = np.unique(neighbours, return_index=True)
+            labels[neighbours] = labels[sources[first]]
+            distance[neighbours] = step
+            reached.append(neighbours)
+        frontier = np.concatenate(reached)
+
+    shape = (height + 2, padded_width)
+    return distance.reshape(shape)[1:-1, 1:-1], labels.reshape(shape)[1:-1, 1:-1]
+
+def seed_contact_graph(distance, labels, num_seeds, chunk_rows=1024):
+    """
+    Connect seeds whose distance fronts meet, weighted by the shortest land path
+    through the meeting point.
+
+    This is the land analogue of a Delaunay graph: travel costs taken from it
+    approximate, rather than equal, the geodesic distance between two seeds.
+    Every edge is the length of a real land path, so graph costs never
+    underestimate the step distance. A route that crosses the cell of an
+    intermediate seed c is instead charged the way in to c and back out, so it
+    overestimates by at most 2 * r_c per crossed cell, where r_c is the largest
+    value of distance inside that cell. Neighbouring seeds, whose fronts meet
+    directly, are exact up to the choice of meeting pixel.
+
+    Returns:
+        csr_matrix: Symmetric (num_seeds, num_seeds) graph indexed by seed index.
+    """
+    height = labels.shape[0]
+    stride = np.int64(num_seeds + 1)
+    chunk_keys, chunk_costs = [], []
+
+    for start in range(0, height, chunk_rows):
+        own_rows = min(chunk_rows, height - start)
+        stop = min(start + own_rows + 1, height)
+        chunk_labels = labels[start:stop]
+        chunk_distance = distance[start:stop]
+        # Right, down, down-right and down-left cover every 8-neighbour pair once
+        pairs = [
+            ((slice(0, own_rows), slice(0, -1)), (slice(0, own_rows), slice(1, None))),
+            ((slice(0, -1), slice(None)), (slice(1, None), slice(None))),
+            ((slice(0, -1), slice(0, -1)), (slice(1, None), slice(1, None))),
+            ((slice(0, -1), slice(1, None)), (slice(1, None), slice(0, -1))),
+        ]
+        for first, second in pairs:
+            a, b = chunk_labels[first], chunk_labels[second]
+            meeting = (a > 0) & (b > 0) & (a != b)
+            cost = chunk_distance[first][meeting].astype(np.int64) + chunk_distance[second][meeting] + 1
+            a, b = a[meeting].astype(np.int64), b[meeting].astype(np.int64)
+            chunk_keys.append(np.minimum(a, b) * stride + np.maximum(a, b))
+            chunk_costs.append(cost)
+
+    keys = np.concatenate(chunk_keys) if chunk_keys else np.empty(0, dtype=np.int64)
+    costs = np.concatenate(chunk_costs) if chunk_costs else np.empty(0, dtype=np.int64)
+    order = np.lexsort((costs, keys))
+    keys, costs = keys[order], costs[order]
+    cheapest = np.concatenate(([True], keys[1:] != keys[:-1])) if len(keys) else np.empty(0, dtype=bool)
+    keys, costs = keys[cheapest], costs[cheapest].astype(np.float64)
+
+    a, b = keys // stride - 1, keys % stride - 1
+    rows, cols = np.concatenate((a, b)), np.concatenate((b, a))
+    return csr_matrix((np.concatenate((costs, costs)), (rows, cols)), shape=(num_seeds, num_seeds))
+
+def travel_cost_matrix(graph, k=None, dense_limit=2000, batch_size=256):
+    """
+    Shortest land travel cost between seeds over a seed_contact_graph.
+
+    Costs are in 8-connected steps and carry the approximation described in
+    seed_contact_graph; they are not per-seed geodesic distance fields.
+
+    Returns:
+        tuple: (costs, neighbours). With at most dense_limit seeds and no k, costs is
+        the dense (n, n) float32 matrix and neighbours is None. Otherwise costs and
+        neighbours are (n, k) tables of the k cheapest destinations of every seed.
+    """
+    num_seeds = graph.shape[0]
+    if k is None and num_seeds <= dense_limit:
+        return dijkstra(graph, directed=False).astype(np.float32), None
+
+    k = min(k or DEFAULT_TRAVEL_COST_K, num_seeds)
+    costs = np.empty((num_seeds, k), dtype=np.float32)
+    neighbours = np.empty((num_seeds, k), dtype=np.int32)
+    for start in range(0, num_seeds, batch_size):
+        sources = np.arange(start, min(start + batch_size, num_seeds))
+        batch = dijkstra(graph, directed=False, indices=sources)
+        nearest = np.argsort(batch, axis=1, kind='stable')[:, :k]
+        neighbours[sources] = nearest
+        costs[sources] = np.take_along_axis(batch, nearest, axis=1)
+    return costs, neighbours
+
+def save_travel_costs(path_prefix, costs, neighbours=None):
+    np.save(path_prefix + '_travel_costs.npy', costs)
+    neighbours_path = path_prefix + '_travel_neighbours.npy'
+    if neighbours is not None:
+        np.save(neighbours_path, neighbours)
+    elif os.path.exists(neighbours_path):
+        # A dense matrix replaces any k-nearest table left by an earlier run
+        os.remove(neighbours_path)
+
+def load_travel_costs(path_prefix):
+    """Memory-map saved travel costs; returns (costs, neighbours or None)."""
+    costs = np.load(path_prefix + '_travel_costs.npy', mmap_mode='r')
+    try:
+        neighbours = np.load(path_prefix + '_travel_neighbours.npy', mmap_mode='r')
+    except FileNotFoundError:
+        neighbours = None
+    return costs, neighbours
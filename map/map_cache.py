@@ -0,0 +1,140 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import numpy as np
+
+class MapCache:
+    """
+    Content-addressed store of generated tessellations.
+
+    Each entry lives in its own directory named after the cache key, and an
+    index.json file records the generation parameters, size and last access time
+    of every entry so the cache can be listed and evicted in LRU order.
+    """
+
+    INDEX_FILE = 'index.json'
+    TESSELLATION_FILE = 'tessellation.npz'
+
+    def __init__(self, cache_dir, max_bytes=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.index_path = os.path.join(self.cache_dir, self.INDEX_FILE)
+        self.index = self.load_index()
+
+    @staticmethod
+    def hash_image(image_path, chunk_size=1 << 20):
+        digest = hashlib.sha256()
+        with open(image_path, 'rb') as image_file:
+            for chunk in iter(lambda: image_file.read(chunk_size), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def make_key(image_hash, seed, num_points, num_iterations, algorithm_version, **options):
+        params = {
+            'image_hash': image_hash,
+            'seed': seed,
+            'num_points': num_points,
+            'num_iterations': num_iterations,
+            'algorithm_version': algorithm_version,
+        }
+        # Extra generation settings; omitted ones leave existing keys unchanged
+        params.update(options)
+        return hashlib.sha256(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest(), params
+
+    def load_index(self):
+        try:
+            with open(self.index_path, 'r') as index_file:
+                return json.load(index_file)
+        except FileNotFoundError:
+            return {}
+        except json.JSONDecodeError:
+            logging.warning(f"Map cache index {self.index_path} is corrupt. Starting with an empty index.")
+            return {}
+
+    def save_index(self):
+        temp_path = self.index_path + '.tmp'
+        with open(temp_path, 'w') as index_file:
+            json.dump(self.index, index_file, indent=2)
+        os.replace(temp_path, self.index_path)
+
+    def entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def entry_path(self, key, file_name=TESSELLATION_FILE):
+        return os.path.join(self.entry_dir(key), file_name)
+
+    def entry_size(self, key):
+        total = 0
+        for root, _, files in os.walk(self.entry_dir(key)):
+            for file_name in files:
+                total += os.path.getsize(os.path.join(root, file_name))
+        return total
+
+    def contains(self, key):
+        return key in self.index and os.path.exists(self.entry_path(key))
+
+    def get(self, key):
+        """Return the arrays stored under key, or None on a cache miss."""
+        if not self.contains(key):
+            return None
+        with np.load(self.entry_path(key), allow_pickle=False) as data:
+            arrays = {name: data[name] for name in data.files}
+        self.index[key]['last_used'] = time.time()
+        self.save_index()
+        logging.info(f"Map cache hit for {key}.")
+        return arrays
+
+    def put(self, key, params, arrays):
+        os.makedirs(self.entry_dir(key), exist_ok=True)
+        np.savez(self.entry_path(key), **arrays)
+        now = time.time()
+        self.index[key] = {
+            'params': params,
+            'created': self.index.get(key, {}).get('created', now),
+            'last_used': now,
+            'size': self.entry_size(key),
+        }
+        self.save_index()
+        logging.info(f"Stored map {key} in cache ({self.index[key]['size']} bytes).")
+        if self.max_bytes is not None:
+            self.evict(self.max_bytes, keep=key)
+
+    def artifact_path(self, key, file_name):
+        """Path for a side artifact stored next to the tessellation of an entry."""
+        os.makedirs(self.entry_dir(key), exist_ok=True)
+        return self.entry_path(key, file_name)
+
+    def refresh_size(self, key):
+        if key in self.index:
+            self.index[key]['size'] = self.entry_size(key)
+            self.save_index()
+
+    def list(self):
+        """Return (key, metadata) pairs, most recently used first."""
+        return sorted(self.index.items(), key=lambda item: item[1]['last_used'], reverse=True)
+
+    def total_size(self):
+        return sum(entry['size'] for entry in self.index.values())
+
+    def remove(self, key):
+        shutil.rmtree(self.entry_dir(key), ignore_errors=True)
+        if self.index.pop(key, None) is not None:
+            self.save_index()
+            logging.info(f"Removed map {key} from cache.")
+
+    def evict(self, max_bytes, keep=None):
+        """Drop least recently used entries until the cache fits in max_bytes."""
+        evicted = []
+        for key, _ in reversed(self.list()):
+            if self.total_size() <= max_bytes:
+                break
+            if key == keep:
+                continue
+            self.remove(key)
+            evicted.append(key)
+        return evicted
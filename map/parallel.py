@@ -0,0 +1,100 @@
+import os
+import logging
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from shapely.geometry import box
+from map.region_geometry import process_region_batch
+from map.bitmask import PackedMask
+
+# Per-process state, populated by _init_worker in each pool process
+_worker_mask = None
+_worker_bounding_box = None
+
+def _init_worker(mask_path, shape, bounds, log_file_path, packed=False):
+    global _worker_mask, _worker_bounding_box
+    if log_file_path:
+        logging.basicConfig(filename=log_file_path, level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    # Read-only memmap: every worker shares the parent's page cache instead of
+    # receiving its own pickled copy of the mask
+    if packed:
+        _worker_mask = PackedMask(mask_path, shape[1])
+    else:
+        _worker_mask = np.memmap(mask_path, dtype=np.uint8, mode='r', shape=shape)
+    _worker_bounding_box = box(*bounds)
+
+def _process_batch(batch):
+    return process_region_batch(batch, _worker_mask, _worker_bounding_box)
+
+class RegionPool:
+    """
+    Process pool that clips regions and computes their land centroids in
+    spatially grouped batches.
+
+    The land mask is written once to a temporary memory-mapped file which the
+    workers open read-only. Results are merged in region index order, so the
+    output is identical to running process_region_batch serially.
+    """
+
+    def __init__(self, binary_mask, bounds, num_workers=None, tile_size=256, log_file_path=None):
+        self.binary_mask = binary_mask
+        self.bounds = bounds
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.tile_size = tile_size
+        self.log_file_path = log_file_path
+        self.mask_path = None
+        self.executor = None
+
+    def __enter__(self):
+        packed = isinstance(self.binary_mask, PackedMask)
+        if packed:
+            # A packed mask is already a file the workers can map
+            mask_path = self.binary_mask.path
+        else:
+            fd, self.mask_path = tempfile.mkstemp(suffix='.mask')
+            os.close(fd)
+            shared_mask = np.memmap(self.mask_path, dtype=np.uint8, mode='w+', shape=self.binary_mask.shape)
+            shared_mask[:] = self.binary_mask
+            shared_mask.flush()
+            del shared_mask
+            mask_path = self.mask_path
+
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.num_workers,
+            initializer=_init_worker,
+            initargs=(mask_path, self.binary_mask.shape, self.bounds, self.log_file_path, packed),
+        )
+        logging.info(f"Started region pool with {self.num_workers} workers.")
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        if self.mask_path is not None:
+            try:
+                os.remove(self.mask_path)
+            except OSError as e:
+                logging.warning(f"Could not remove shared mask file {self.mask_path}: {e}")
+            self.mask_path = None
+        return False
+
+    def make_batches(self, tasks):
+        # Group regions by the tile containing their vertex mean so each
+        # batch touches a compact window of the mask
+        if not tasks:
+            return []
+        anchors = np.array([np.mean(coords, axis=0) for _, coords in tasks])
+        anchors = np.nan_to_num(anchors)
+        tile_x = np.floor(anchors[:, 0] / self.tile_size).astype(np.int64)
+        tile_y = np.floor(anchors[:, 1] / self.tile_size).astype(np.int64)
+        order = np.lexsort((np.arange(len(tasks)), tile_x, tile_y))
+        num_batches = min(len(tasks), self.num_workers * 4)
+        return [[tasks[i] for i in chunk] for chunk in np.array_split(order, num_batches) if len(chunk)]
+
+    def map_regions(self, tasks):
+        results = []
+        for batch_results in self.executor.map(_process_batch, self.make_batches(tasks)):
+            results.extend(batch_results)
+        results.sort(key=lambda result: result[0])
+        return results
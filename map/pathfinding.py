@@ -0,0 +1,253 @@
+import heapq
+import logging
+from collections import OrderedDict
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from map.land_distance import snap_to_land
+
+SQRT2 = np.sqrt(2.0)
+
+# Cache lookup result for keys that were never stored; cached routes may be None
+_MISSING = object()
+
+def pad_walkable(allowed):
+    """
+    Flatten a boolean raster inside a blocked one-pixel border.
+
+    Returns:
+        tuple: (walkable, padded_width) as taken by astar_padded.
+    """
+    height, width = allowed.shape
+    padded_width = width + 2
+    # The border removes bounds checks from the A* inner loop
+    walkable = np.zeros((height + 2, padded_width), dtype=bool)
+    walkable[1:-1, 1:-1] = allowed
+    return walkable.ravel(), padded_width
+
+def astar(allowed, start, goal):
+    """
+    8-connected A* over a boolean raster with an octile-distance heuristic.
+
+    Parameters:
+        allowed (ndarray): Boolean raster of walkable pixels, indexed [y, x].
+        start (tuple): (x, y) start pixel.
+        goal (tuple): (x, y) goal pixel.
+
+    Returns:
+        ndarray: (n, 2) pixel path from start to goal, or None if unreachable.
+    """
+    walkable, padded_width = pad_walkable(allowed)
+    return astar_padded(walkable, padded_width, start, goal)
+
+def astar_padded(walkable, padded_width, start, goal):
+    """A* on a raster already prepared by pad_walkable, so repeated searches skip the copy."""
+    start_index = (start[1] + 1) * padded_width + start[0] + 1
+    goal_index = (goal[1] + 1) * padded_width + goal[0] + 1
+    if not (walkable[start_index] and walkable[goal_index]):
+        return None
+
+    goal_x, goal_y = goal[0] + 1, goal[1] + 1
+    steps = [(1, 1.0), (-1, 1.0), (padded_width, 1.0), (-padded_width, 1.0),
+             (padded_width + 1, SQRT2), (padded_width - 1, SQRT2), (-padded_width + 1, SQRT2), (-padded_width - 1, SQRT2)]
+
+    def heuristic(index):
+        dx, dy = abs(index % padded_width - goal_x), abs(index // padded_width - goal_y)
+        return max(dx, dy) + (SQRT2 - 1.0) * min(dx, dy)
+
+    came_from = {start_index: -1}
+    cost_so_far = {start_index: 0.0}
+    open_heap = [(heuristic(start_index), 0.0, start_index)]
+    while open_heap:
+        _, cost, current = heapq.heappop(open_heap)
+        if current == goal_index:
+            break
+        if cost > cost_so_far[current]:
+            continue
+        for offset, step_cost in steps:
+            neighbour = current + offset
+            if not walkable[neighbour]:
+                continue
+            new_cost = cost + step_cost
+            if new_cost < cost_so_far.get(neighbour, np.inf):
+                cost_so_far[neighbour] = new_cost
+                came_from[neighbour] = current
+                heapq.heappush(open_heap, (new_cost + heuristic(neighbour), new_cost, neighbour))
+    else:
+        return None
+
+    path = []
+    index = goal_index
+    while index != -1:
+        path.append((index % padded_width - 1, index // padded_width - 1))
+        index = came_from[index]
+    return np.array(path[::-1], dtype=np.int32)
+
+class Pathfinder:
+    """
+    Routes between node seeds over the land mask.
+
+    Short routes run A* on the land pixels directly. Routes between seeds further
+    apart than hierarchical_distance first find a chain of neighbouring regions on
+    the region graph and then run A* only inside that corridor. Finished routes are
+    kept in an LRU cache keyed by (from, to), so repeated queries are dictionary
+    lookups. Pairs with no land route are cached as None the same way.
+    """
+
+    def __init__(self, land_mask, seeds, labels=None, adjacency_pairs=None, travel_costs=None,
+                 travel_neighbours=None, cache_size=4096, hierarchical_distance=256, corridor_margin=128):
+        self.land_mask = land_mask
+        # Padded once so whole-map searches don't copy the mask per query
+        self.walkable, self.padded_width = pad_walkable(np.asarray(land_mask).astype(bool))
+        self.seeds = snap_to_land(land_mask, seeds)
+        self.labels = labels
+        # Without neighbours the costs are the dense (n, n) matrix; with them they are
+        # k-nearest rows sorted by cost, which can also be square when k >= n
+        self.travel_costs = travel_costs
+        self.travel_neighbours = travel_neighbours
+        self.cache_size = cache_size
+        self.hierarchical_distance = hierarchical_distance
+        self.corridor_margin = corridor_margin
+        self.route_cache = OrderedDict()
+        self.predecessor_cache = OrderedDict()
+        self.region_graph = None
+        if adjacency_pairs is not None and len(adjacency_pairs):
+            self.region_graph = self.build_region_graph(adjacency_pairs)
+
+    @classmethod
+    def from_voronoi_map(cls, voronoi_map, adjacency_pairs=None, **kwargs):
+        return cls(voronoi_map.binary_mask, voronoi_map.points,
+                   labels=getattr(voronoi_map, 'label_raster', None),
+                   adjacency_pairs=adjacency_pairs,
+                   travel_costs=getattr(voronoi_map, 'travel_costs', None),
+                   travel_neighbours=getattr(voronoi_map, 'travel_neighbours', None), **kwargs)
+
+    def build_region_graph(self, adjacency_pairs):
+        # Node ids are 1-based region ids; edges are weighted by seed distance
+        pairs = np.asarray(adjacency_pairs, dtype=np.int64).reshape(-1, 2) - 1
+        weights = np.hypot(*(self.seeds[pairs[:, 0]] - self.seeds[pairs[:, 1]]).T).astype(np.float64)
+        num_nodes = len(self.seeds)
+        rows, cols = np.concatenate((pairs[:, 0], pairs[:, 1])), np.concatenate((pairs[:, 1], pairs[:, 0]))
+        return csr_matrix((np.concatenate((weights, weights)), (rows, cols)), shape=(num_nodes, num_nodes))
+
+    def _cache_get(self, cache, key):
+        value = cache.get(key, _MISSING)
+        if value is not _MISSING:
+            cache.move_to_end(key)
+        return value
+
+    def _cache_put(self, cache, key, value):
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > self.cache_size:
+            cache.popitem(last=False)
+
+    def region_route(self, from_id, to_id):
+        """Return the region ids along the cheapest region-graph path, or None."""
+        if self.region_graph is None:
+            return None
+        predecessors = self._cache_get(self.predecessor_cache, from_id)
+        if predecessors is _MISSING:
+            _, predecessors = dijkstra(self.region_graph, directed=False, indices=from_id - 1, return_predecessors=True)
+            self._cache_put(self.predecessor_cache, from_id, predecessors)
+
+        route = [to_id - 1]
+        while route[-1] != from_id - 1:
+            previous = predecessors[route[-1]]
+            if previous < 0:
+                return None
+            route.append(previous)
+        return [index + 1 for index in reversed(route)]
+
+    def _corridor_route(self, from_id, to_id, start, goal):
+        regions = self.region_route(from_id, to_id)
+        if regions is None:
+            return None
+        region_ids = np.array(regions)
+        # Search only the window spanning the corridor seeds
+        corners = self.seeds[region_ids - 1]
+        height, width = self.land_mask.shape
+        margin = self.corridor_margin
+        x0, y0 = np.maximum(corners.min(axis=0) - margin, 0)
+        x1, y1 = np.minimum(corners.max(axis=0) + margin + 1, [width, height])
+        window_labels = np.asarray(self.labels[y0:y1, x0:x1])
+        allowed = np.asarray(self.land_mask[y0:y1, x0:x1]).astype(bool) & np.isin(window_labels, region_ids)
+        path = astar(allowed, (start[0] - x0, start[1] - y0), (goal[0] - x0, goal[1] - y0))
+        if path is None:
+            return None
+        return path + np.array([x0, y0], dtype=np.int32)
+
+    def route(self, from_id, to_id):
+        """
+        Return the pixel route between two node seeds.
+
+        Parameters:
+            from_id (int): 1-based region id of the start node.
+            to_id (int): 1-based region id of the destination node.
+
+        Returns:
+            ndarray: (n, 2) pixel path, or None when the seeds are not connected by land.
+        """
+        key = (from_id, to_id)
+        cached = self._cache_get(self.route_cache, key)
+        if cached is not _MISSING:
+            return cached
+        reverse = self._cache_get(self.route_cache, (to_id, from_id))
+        if reverse is not _MISSING:
+            path = None if reverse is None else reverse[::-1]
+            self._cache_put(self.route_cache, key, path)
+            return path
+
+        path = self._search(from_id, to_id)
+        if path is not None:
+            path.setflags(write=False)
+        self._cache_put(self.route_cache, key, path)
+        return path
+
+    def travel_cost(self, from_id, to_id):
+        """Stored land travel cost between two nodes, or None when the table does not hold the pair."""
+        if self.travel_costs is None:
+            return None
+        if self.travel_neighbours is None:
+            return float(self.travel_costs[from_id - 1, to_id - 1])
+        column = np.flatnonzero(np.asarray(self.travel_neighbours[from_id - 1]) == to_id - 1)
+        return float(self.travel_costs[from_id - 1, column[0]]) if len(column) else None
+
+    def _search(self, from_id, to_id):
+        cost = self.travel_cost(from_id, to_id)
+        if cost is not None and np.isinf(cost):
+            return None
+
+        start, goal = self.seeds[from_id - 1], self.seeds[to_id - 1]
+        path = None
+        if self.labels is not None and np.abs(goal - start).max() > self.hierarchical_distance:
+            path = self._corridor_route(from_id, to_id, start, goal)
+            if path is None:
+                logging.debug(f"Corridor search failed for {from_id} -> {to_id}; searching the whole map.")
+        if path is None:
+            path = astar_padded(self.walkable, self.padded_width, tuple(start), tuple(goal))
+        return path
+
+    def routes(self, pairs):
+        """Route a batch of (from_id, to_id) pairs; duplicate pairs are searched once."""
+        results = {}
+        for pair in dict.fromkeys(tuple(int(node_id) for node_id in pair) for pair in pairs):
+            results[pair] = self.route(*pair)
+        return [results[tuple(int(node_id) for node_id in pair)] for pair in pairs]
+
+    def route_costs(self, pairs):
+        """
+        Vectorised travel costs for (from_id, to_id) pairs.
+
+        With a k-nearest table, pairs whose destination is not among the k cheapest
+        destinations of the start node cost NaN.
+        """
+        if self.travel_costs is None:
+            raise ValueError("route_costs needs travel costs; build them with build_travel_costs")
+        pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2) - 1
+        costs = np.asarray(self.travel_costs)
+        if self.travel_neighbours is None:
+            return costs[pairs[:, 0], pairs[:, 1]]
+        matches = np.asarray(self.travel_neighbours)[pairs[:, 0]] == pairs[:, 1:]
+        columns = matches.argmax(axis=1)
+        return np.where(matches.any(axis=1), costs[pairs[:, 0], columns], np.nan)
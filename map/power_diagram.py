@@ -0,0 +1,218 @@
+import logging
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.linalg import spsolve
+from map.label_raster import land_adjacency, region_centroids
+
+def power_labels(shape, seeds, weights, tile_size=64):
+    """
+    Label every pixel with the seed of least power distance |p - s|^2 - w.
+
+    Each tile only compares the seeds that can win somewhere inside it: a seed is
+    skipped when its smallest power distance to the tile exceeds the largest power
+    distance of some other seed.
+
+    Parameters:
+        shape (tuple): (height, width) of the raster.
+        seeds (ndarray): (n, 2) seed coordinates.
+        weights (ndarray): (n,) power weights.
+        tile_size (int, optional): Side of the square tiles.
+
+    Returns:
+        ndarray: int32 raster of 1-based seed labels indexed [y, x].
+    """
+    height, width = shape
+    seeds = np.asarray(seeds, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+    seed_x, seed_y = seeds[:, 0], seeds[:, 1]
+    labels = np.empty(shape, dtype=np.int32)
+
+    for y0 in range(0, height, tile_size):
+        y1 = min(y0 + tile_size, height)
+        near_y = np.maximum(np.maximum(y0 - seed_y, seed_y - (y1 - 1)), 0)
+        far_y = np.maximum(np.abs(seed_y - y0), np.abs(seed_y - (y1 - 1)))
+        ys = np.arange(y0, y1, dtype=np.float64)
+        for x0 in range(0, width, tile_size):
+            x1 = min(x0 + tile_size, width)
+            near_x = np.maximum(np.maximum(x0 - seed_x, seed_x - (x1 - 1)), 0)
+            far_x = np.maximum(np.abs(seed_x - x0), np.abs(seed_x - (x1 - 1)))
+            lower = near_x ** 2 + near_y ** 2 - weights
+            upper = far_x ** 2 + far_y ** 2 - weights
+            candidates = np.flatnonzero(lower <= upper.min())
+
+            xs = np.arange(x0, x1, dtype=np.float64)
+            distance = ((xs[None, None, :] - seed_x[candidates, None, None]) ** 2
+                        + (ys[None, :, None] - seed_y[candidates, None, None]) ** 2
+                        - weights[candidates, None, None])
+            labels[y0:y1, x0:x1] = candidates[np.argmin(distance, axis=0)] + 1
+    return labels
+
+def _contact_lengths(labels, land_mask, water_density, num_seeds):
+    # Border length of every touching pair, with water borders counted at water_density
+    pairs, lengths = land_adjacency(labels, np.ones(labels.shape, dtype=bool))
+    lengths = water_density * lengths.astype(np.float64)
+    if water_density < 1:
+        land_pairs, land_lengths = land_adjacency(labels, land_mask)
+        stride = num_seeds + 1
+        position = np.searchsorted(pairs[:, 0] * stride + pairs[:, 1], land_pairs[:, 0] * stride + land_pairs[:, 1])
+        lengths[position] += (1 - water_density) * land_lengths
+    return pairs - 1, lengths
+
+def _newton_direction(labels, land_mask, water_density, seeds, residual):
+    """
+    Solve for the weight change that closes the area residual to first order.
+
+    Raising w_i by d moves its border with j by d / (2 |s_i - s_j|), so the
+    Jacobian of the cell measures is a graph Laplacian weighted by border length
+    over seed distance.
+    """
+    num_seeds = len(seeds)
+    pairs, lengths = _contact_lengths(labels, land_mask, water_density, num_seeds)
+    a, b = pairs[:, 0], pairs[:, 1]
+    coupling = lengths / (2 * np.maximum(np.hypot(*(seeds[a] - seeds[b]).T), 1e-9))
+    jacobian = csr_matrix((np.concatenate((-coupling, -coupling)), (np.concatenate((a, b)), np.concatenate((b, a)))),
+                          shape=(num_seeds, num_seeds))
+    diagonal = -np.asarray(jacobian.sum(axis=1)).ravel()
+    # Empty or fully enclosed cells get the growth rate of a disc so the system stays solvable
+    diagonal = np.where(diagonal > 0, diagonal, np.pi / 2) * (1 + 1e-6)
+    jacobian = jacobian + csr_matrix((diagonal, (np.arange(num_seeds), np.arange(num_seeds))), shape=(num_seeds, num_seeds))
+    return spsolve(jacobian.tocsc(), residual)
+
+def solve_power_weights(land_mask, seeds, targets, water_density, tolerance=0.02, max_steps=15, tile_size=64):
+    """
+    Find power weights whose cells hold the target measure, with the seeds fixed.
+
+    The measure counts land pixels as 1 and water pixels as water_density. Damped
+    Newton steps are halved until no cell shrinks below half the smallest
+    starting or target measure and the residual drops.
+
+    Returns:
+        tuple: (weights, labels, measures).
+    """
+    num_seeds = len(seeds)
+    density = np.where(land_mask, 1.0, water_density)
+    weights = np.zeros(num_seeds)
+    labels = power_labels(land_mask.shape, seeds, weights, tile_size)
+    measures = np.bincount(labels.ravel(), weights=density.ravel(), minlength=num_seeds + 1)[1:]
+
+    for _ in range(max_steps):
+        if np.max(np.abs(measures - targets) / targets) < tolerance:
+            break
+        residual = np.linalg.norm(measures - targets)
+        floor = 0.5 * min(measures.min(), targets.min())
+        direction = _newton_direction(labels, land_mask, water_density, seeds, targets - measures)
+        if not np.all(np.isfinite(direction)):
+            break
+        step = 1.0
+        for _ in range(8):
+            trial_weights = weights + step * direction
+            trial_labels = power_labels(land_mask.shape, seeds, trial_weights, tile_size)
+            trial_measures = np.bincount(trial_labels.ravel(), weights=density.ravel(), minlength=num_seeds + 1)[1:]
+            if trial_measures.min() >= floor and np.linalg.norm(trial_measures - targets) <= (1 - step / 4) * residual:
+                break
+            step /= 2
+        else:
+            break
+        weights, labels, measures = trial_weights - trial_weights.mean(), trial_labels, trial_measures
+    return weights, labels, measures
+
+def relax_power_diagram(land_mask, seeds, importance, num_iterations=8, tolerance=0.02, water_density=0.02, tile_size=64):
+    """
+    Move seeds and solve power weights until every cell holds its share of land.
+
+    Region i should cover importance[i] / sum(importance) of the land. Each
+    iteration solves the weights for the current seeds and then moves every seed
+    to the land centroid of its cell. Water counts towards the quotas at a weight
+    that halves every iteration down to water_density, which keeps cells from
+    jumping across straits while the seeds are still far from their final places.
+
+    Returns:
+        tuple: (seeds, weights, labels, stats) where stats has one dict per
+        iteration with the largest relative land quota error and mean seed movement.
+    """
+    seeds = np.asarray(seeds, dtype=np.float64).copy()
+    importance = np.asarray(importance, dtype=np.float64)
+    num_seeds = len(seeds)
+    land = np.asarray(land_mask).astype(bool)
+    land_targets = np.count_nonzero(land) * importance / importance.sum()
+    stats = []
+
+    for iteration in range(num_iterations):
+        density = max(water_density, 0.5 ** (iteration + 1))
+        targets = (np.count_nonzero(land) + density * np.count_nonzero(~land)) * importance / importance.sum()
+        weights, labels, _ = solve_power_weights(land, seeds, targets, density, tolerance, tile_size=tile_size)
+
+        areas = np.bincount(labels[land], minlength=num_seeds + 1)[1:]
+        quota_error = float(np.max(np.abs(areas - land_targets) / land_targets))
+        stats.append({'iteration': iteration + 1, 'quota_error': quota_error, 'mean_movement': 0.0})
+        logging.info(f"Power iteration {iteration + 1}: largest land quota error {quota_error:.3f}")
+        if iteration == num_iterations - 1 or (density == water_density and quota_error < tolerance):
+            break
+
+        centroids = region_centroids(labels, mask=land, num_labels=num_seeds + 1)[1:]
+        occupied = areas > 0
+        stats[-1]['mean_movement'] = float(np.hypot(*(centroids[occupied] - seeds[occupied]).T).mean()) if occupied.any() else 0.0
+        seeds[occupied] = centroids[occupied]
+
+    return seeds, weights, labels, stats
+
+def clip_half_plane(polygon, normal, offset):
+    """Keep the part of a convex polygon where normal . p <= offset."""
+    if len(polygon) == 0:
+        return polygon
+    side = polygon @ normal - offset
+    inside = side <= 0
+    if inside.all():
+        return polygon
+    if not inside.any():
+        return polygon[:0]
+    clipped = []
+    for i in range(len(polygon)):
+        j = (i + 1) % len(polygon)
+        if inside[i]:
+            clipped.append(polygon[i])
+        if inside[i] != inside[j]:
+            t = side[i] / (side[i] - side[j])
+            clipped.append(polygon[i] + t * (polygon[j] - polygon[i]))
+    return np.array(clipped)
+
+def power_cells(seeds, weights, neighbours, bounds):
+    """
+    Exact power cells clipped to the map rectangle.
+
+    Parameters:
+        seeds (ndarray): (n, 2) seed coordinates.
+        weights (ndarray): (n,) power weights.
+        neighbours (list of sets): Candidate neighbour indices of every seed.
+        bounds (tuple): (min_x, min_y, max_x, max_y) of the map.
+
+    Returns:
+        dict: {index: closed (k, 2) ring} for every non-empty cell.
+    """
+    min_x, min_y, max_x, max_y = bounds
+    rectangle = np.array([[min_x, min_y], [max_x, min_y], [max_x, max_y], [min_x, max_y]], dtype=np.float64)
+    squared = np.einsum('ij,ij->i', seeds, seeds)
+    cells = {}
+    for i in range(len(seeds)):
+        polygon = rectangle
+        # A seed without raster pixels has no known neighbours; clip against every seed
+        candidates = neighbours[i] or set(range(len(seeds))) - {i}
+        for j in sorted(candidates):
+            # |p - s_i|^2 - w_i <= |p - s_j|^2 - w_j
+            polygon = clip_half_plane(polygon, 2 * (seeds[j] - seeds[i]),
+                                      squared[j] - squared[i] - weights[j] + weights[i])
+        if len(polygon) >= 3:
+            cells[i] = np.vstack((polygon, polygon[:1]))
+    return cells
+
+def label_neighbours(labels, num_labels, depth=2):
+    """Neighbour sets of 0-based labels that touch on the raster, widened to depth steps."""
+    pairs, _ = land_adjacency(labels, np.ones(labels.shape, dtype=bool))
+    direct = [set() for _ in range(num_labels)]
+    for a, b in (pairs - 1).tolist():
+        direct[a].add(b)
+        direct[b].add(a)
+    neighbours = [set(items) for items in direct]
+    for _ in range(depth - 1):
+        neighbours = [items.union(*(direct[j] for j in items)) - {i} for i, items in enumerate(neighbours)]
+    return direct, neighbours
@@ -0,0 +1,104 @@
+import numpy as np
+from shapely.geometry import Polygon, MultiPolygon
+import cv2
+import logging
+
+def clip_polygon_to_bounds(polygon, bounding_box):
+    logging.debug(f"Original polygon: {polygon}")
+
+    try:
+        clipped_polygon = polygon.intersection(bounding_box)
+        logging.debug(f"Clipped polygon: {clipped_polygon}")
+
+        if clipped_polygon.is_empty:
+            logging.info(f"Clipping resulted in an empty polygon: Original {polygon}")
+            return None
+        else:
+            if clipped_polygon.geom_type == 'LineString' or clipped_polygon.geom_type == 'Point':
+                logging.warning(f"Clipping resulted in a degenerate polygon: {clipped_polygon}")
+                return None
+
+            cleaned_polygon = clipped_polygon.buffer(0)
+
+            if isinstance(cleaned_polygon, MultiPolygon):
+                num_polygons = len(cleaned_polygon.geoms)
+                polygon_areas = [p.area for p in cleaned_polygon.geoms]
+                logging.info(f"Clipped MultiPolygon with {num_polygons} polygons, areas: {polygon_areas}")
+                largest_polygon = max(cleaned_polygon.geoms, key=lambda p: p.area)
+                return largest_polygon
+
+            return cleaned_polygon
+    except Exception as e:
+        logging.error(f"Error in clipping polygon: {e}")
+        return None
+
+def rasterize_polygon(polygon, shape):
+    rasterized = np.zeros(shape, dtype=np.uint8)
+    int_coords = lambda x, y: (int(round(x)), int(round(y)))
+    polygon_coords = np.array([int_coords(*point) for point in polygon.exterior.coords])
+
+    cv2.fillPoly(rasterized, [polygon_coords], 1)
+    return rasterized
+
+def compute_land_centroid(polygon, binary_mask, region_id=None, tile_size=2048):
+    # Rasterize the polygon's bounding window in tiles of at most tile_size pixels a side,
+    # so memory stays bounded however large the region is. A window of one tile matches a
+    # full-map fill; across tile borders cv2 restarts the clipped outline, which can move
+    # edge pixels there by one
+    polygon_coords = np.round(np.asarray(polygon.exterior.coords)).astype(np.int32)
+    height, width = binary_mask.shape
+    x0, y0 = np.maximum(polygon_coords.min(axis=0), 0)
+    x1, y1 = np.minimum(polygon_coords.max(axis=0) + 1, [width, height])
+    count, sum_x, sum_y = 0, 0, 0
+    for ty in range(y0, y1, tile_size):
+        for tx in range(x0, x1, tile_size):
+            ty1, tx1 = min(ty + tile_size, y1), min(tx + tile_size, x1)
+            rasterized_tile = np.zeros((ty1 - ty, tx1 - tx), dtype=np.uint8)
+            cv2.fillPoly(rasterized_tile, [polygon_coords - np.array([tx, ty], dtype=np.int32)], 1)
+            overlap = rasterized_tile & np.asarray(binary_mask[ty:ty1, tx:tx1])
+            tile_y, tile_x = np.nonzero(overlap)
+            count += len(tile_x)
+            sum_x += int(tile_x.sum()) + int(tx) * len(tile_x)
+            sum_y += int(tile_y.sum()) + int(ty) * len(tile_y)
+
+    if count == 0:
+        logging.info(f"Region {region_id} processing: No overlap with land. Using fallback methods.")
+        logging.info(f"Region {region_id} vertices: {polygon.exterior.coords[:]}")
+        logging.info(f"Region {region_id} area: {polygon.area}")
+
+        x_center, y_center = np.mean(polygon.exterior.coords, axis=0)
+
+        if np.isnan(x_center) or np.isnan(y_center):
+            logging.info(f"Region {region_id}: Geometric center failed. Using bounding box midpoint.")
+            bounds = polygon.bounds
+            x_center, y_center = (bounds[0] + bounds[2]) / 2, (bounds[1] + bounds[3]) / 2
+
+        if np.isnan(x_center) or np.isnan(y_center):
+            logging.info(f"Region {region_id}: Bounding box center failed. Using first vertex.")
+            x_center, y_center = polygon.exterior.coords[0]
+
+        return x_center, y_center
+
+    centroid_x, centroid_y = sum_x / count, sum_y / count
+    return centroid_x, centroid_y
+
+def process_region_batch(batch, binary_mask, bounding_box):
+    """
+    Clip each region of a batch to the map bounds and compute its land centroid.
+
+    Parameters:
+        batch (list of tuples): (region index, polygon vertex coordinates) pairs.
+        binary_mask (ndarray): Land mask of the map, indexed [y, x].
+        bounding_box (Polygon): Map bounds used for clipping.
+
+    Returns:
+        list of tuples: (region index, centroid, clipped exterior coordinates) for
+        every region whose clipped polygon is valid.
+    """
+    results = []
+    for idx, coords in batch:
+        clipped_polygon = clip_polygon_to_bounds(Polygon(coords), bounding_box)
+        if clipped_polygon:
+            centroid = compute_land_centroid(clipped_polygon, binary_mask, region_id=idx)
+            results.append((idx, centroid, [list(p) for p in clipped_polygon.exterior.coords]))
+    return results
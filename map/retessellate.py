@@ -0,0 +1,279 @@
+import logging
+import numpy as np
+from scipy.spatial import Voronoi, QhullError
+from shapely.geometry import Polygon
+from map.region_geometry import clip_polygon_to_bounds
+from map.label_raster import land_adjacency, relabel_window, ring_window
+
+def ridge_neighbours(ridge_points, count):
+    """Return a list of neighbour index sets from Voronoi ridge_points."""
+    neighbours = [set() for _ in range(count)]
+    for a, b in np.asarray(ridge_points, dtype=np.int64).reshape(-1, 2).tolist():
+        neighbours[a].add(b)
+        neighbours[b].add(a)
+    return neighbours
+
+def neighbourhood(neighbours, indices, depth=1):
+    """Return indices together with every seed up to depth neighbour steps away."""
+    reached = set(indices)
+    frontier = set(indices)
+    for _ in range(depth):
+        frontier = {neighbour for index in frontier for neighbour in neighbours[index]} - reached
+        reached |= frontier
+    return reached
+
+def cell_violations(tree, generators, index, coords, tolerance=1e-6):
+    """
+    Check a clipped cell computed from a subset of the seeds against all seeds.
+
+    A cell built from fewer seeds can only be too large. It is exact when no seed
+    is closer than its own seed to any of its vertices, because the true cell is
+    convex and would then contain all of them.
+
+    Parameters:
+        tree (cKDTree): Tree over all generator points.
+        generators (ndarray): (n, 2) generator points.
+        index (int): Seed the cell belongs to.
+        coords (array-like): Vertex coordinates of the clipped cell.
+
+    Returns:
+        list of tuples: (vertex, radius) for every vertex with a closer seed.
+    """
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    own_distance = np.hypot(*(coords - generators[index]).T)
+    nearest_distance, _ = tree.query(coords)
+    closer = nearest_distance < own_distance - tolerance * np.maximum(own_distance, 1.0)
+    return [(coords[i], own_distance[i]) for i in np.flatnonzero(closer)]
+
+def voronoi_finite_polygons_2d(vor, radius=None, center=None):
+    """
+    Reconstruct infinite voronoi regions in a 2D diagram to finite
+    regions.
+    Parameters
+    ----------
+    vor : Voronoi
+        Input diagram
+    radius : float, optional
+        Distance to 'points at infinity'.
+    center : array_like, optional
+        Point infinite ridges are directed away from; defaults to the
+        mean of the input points.
+    Returns
+    -------
+    regions : list of tuples
+        Indices of vertices in each revised Voronoi regions.
+    vertices : list of tuples
+        Coordinates for revised Voronoi vertices. Same as coordinates
+        of input vertices, with 'points at infinity' appended to the
+        end.
+    """
+
+    if vor.points.shape[1] != 2:
+        raise ValueError("Requires 2D input")
+
+    new_regions = []
+    new_vertices = vor.vertices.tolist()
+
+    if center is None:
+        center = vor.points.mean(axis=0)
+    if radius is None:
+        radius = np.ptp(vor.points, axis=0).max() * 2
+
+    # Construct a map containing all ridges for a given point
+    all_ridges = {}
+    for (p1, p2), (v1, v2) in zip(vor.ridge_points, vor.ridge_vertices):
+        all_ridges.setdefault(p1, []).append((p2, v1, v2))
+        all_ridges.setdefault(p2, []).append((p1, v1, v2))
+
+    # Reconstruct infinite regions
+    for p1, region in enumerate(vor.point_region):
+        vertices = vor.regions[region]
+
+        if all(v >= 0 for v in vertices):
+            # finite region
+            new_regions.append(vertices)
+            continue
+
+        # reconstruct a non-finite region
+        ridges = all_ridges[p1]
+        new_region = [v for v in vertices if v >= 0]
+
+        for p2, v1, v2 in ridges:
+            if v2 < 0:
+                v1, v2 = v2, v1
+            if v1 >= 0:
+                # finite ridge: already in the region
+                continue
+
+            # Compute the missing endpoint of an infinite ridge
+            t = vor.points[p2] - vor.points[p1]  # tangent
+            t /= np.linalg.norm(t)
+            n = np.array([-t[1], t[0]])  # normal
+
+            midpoint = vor.points[[p1, p2]].mean(axis=0)
+            direction = np.sign(np.dot(midpoint - center, n)) * n
+            far_point = vor.vertices[v2] + direction * radius
+
+            new_region.append(len(new_vertices))
+            new_vertices.append(far_point.tolist())
+
+        # sort region counterclockwise
+        vs = np.asarray([new_vertices[v] for v in new_region])
+        c = vs.mean(axis=0)
+        angles = np.arctan2(vs[:, 1] - c[1], vs[:, 0] - c[0])
+        new_region = np.array(new_region)[np.argsort(angles)]
+
+        # finish
+        new_regions.append(new_region.tolist())
+
+    return new_regions, np.asarray(new_vertices)
+
+def edit_candidates(tree, generators, seed_neighbours, changed, previous):
+    """
+    Seeds a local diagram around an edit starts from.
+
+    These are the edited seeds, the old neighbours of the edited seeds and
+    their neighbours, and the neighbourhoods of the seeds nearest each edited
+    position.
+    """
+    candidates = set(changed) | neighbourhood(seed_neighbours, previous)
+    for index in changed:
+        _, nearest = tree.query(generators[index], k=min(8, len(generators)))
+        candidates |= neighbourhood(seed_neighbours, np.atleast_1d(nearest).tolist())
+    return candidates
+
+def local_voronoi_cells(generators, tree, changed, previous, candidates, bounding_box):
+    """
+    Compute the clipped cells of the changed seeds and their old and new neighbours
+    from a Voronoi diagram of nearby seeds only.
+
+    Cells are checked against all seeds with cell_violations; seeds found closer
+    to a cell vertex are added and the local diagram is recomputed.
+
+    Parameters:
+        generators (ndarray): (n, 2) generator points after the edit.
+        tree (cKDTree): Tree over generators.
+        changed (set): Indices of seeds that were moved or added.
+        previous (set): Indices of seeds that neighboured them before the edit.
+        candidates (set): Seeds the local diagram starts from.
+        bounding_box (Polygon): Map bounds the cells are clipped to.
+
+    Returns:
+        tuple: ({index: clipped Polygon or None}, {index: neighbour index set}).
+    """
+    center = generators.mean(axis=0)
+    radius = np.ptp(generators, axis=0).max() * 2
+    candidates = set(candidates)
+    while True:
+        if len(candidates) < 4:
+            candidates = set(range(len(generators)))
+        subset = np.array(sorted(candidates), dtype=np.int64)
+        position = {index: i for i, index in enumerate(subset.tolist())}
+        try:
+            local = Voronoi(generators[subset])
+        except QhullError:
+            if len(subset) == len(generators):
+                raise
+            candidates = set(range(len(generators)))
+            continue
+
+        local_neighbours = ridge_neighbours(local.ridge_points, len(subset))
+        affected = set(changed) | set(previous)
+        for index in changed:
+            affected.update(subset[list(local_neighbours[position[index]])].tolist())
+
+        regions, vertices = voronoi_finite_polygons_2d(local, radius=radius, center=center)
+        cells, violations = {}, []
+        for index in sorted(affected):
+            polygon = clip_polygon_to_bounds(Polygon(vertices[regions[position[index]]]), bounding_box)
+            cells[index] = polygon
+            if polygon is not None and len(subset) < len(generators):
+                violations += cell_violations(tree, generators, index, polygon.exterior.coords)
+
+        if not violations:
+            neighbours = {index: set(subset[list(local_neighbours[position[index]])].tolist()) for index in affected}
+            return cells, neighbours
+
+        logging.debug(f"Local diagram of {len(subset)} seeds missed closer seeds; widening it.")
+        for vertex, distance in violations:
+            candidates.update(tree.query_ball_point(vertex, distance))
+
+def apply_cells(cells, neighbours, seed_neighbours, rings):
+    """
+    Write new cells into the seed neighbour sets and region rings in place.
+
+    Parameters:
+        cells (dict): {index: clipped Polygon or None} from local_voronoi_cells.
+        neighbours (dict): {index: neighbour index set} from local_voronoi_cells.
+        seed_neighbours (list): Neighbour index set of every seed.
+        rings (dict): {index: (n, 2) ring} of every stored region.
+
+    Returns:
+        set: Region ids whose cell vanished; their rings are removed.
+    """
+    dropped_ids = set()
+    for index, polygon in cells.items():
+        old, new = seed_neighbours[index], neighbours[index]
+        for neighbour in old - new:
+            seed_neighbours[neighbour].discard(index)
+        for neighbour in new - old:
+            seed_neighbours[neighbour].add(index)
+        seed_neighbours[index] = new
+
+        if polygon is None:
+            rings.pop(index, None)
+            dropped_ids.add(index + 1)
+        else:
+            rings[index] = np.array(polygon.exterior.coords, dtype=np.float64)
+    return dropped_ids
+
+def relabel_edit(labels, land_mask, rings, seed_neighbours, changed_ids, old_rings, removed_id=None, renamed=None):
+    """
+    Redraw the label pixels an edit touches, window by window, and measure their new borders.
+
+    Parameters:
+        labels (ndarray): Writable label raster, e.g. a memmap.
+        land_mask (ndarray): Boolean land raster.
+        rings (dict): {index: ring} of every region after the edit.
+        seed_neighbours (list): Neighbour index set of every seed after the edit.
+        changed_ids (set): Regions whose cells were recomputed.
+        old_rings (list): Rings of those regions before the edit.
+        removed_id (int, optional): Region id of a removed region.
+        renamed (tuple, optional): (old_id, new_id) of a region that changed id only.
+
+    Returns:
+        tuple: (pairs, border_lengths) of every land border touching a redrawn region.
+    """
+    shape = labels.shape
+    redrawn_ids = set(changed_ids) | ({removed_id} if removed_id is not None else set())
+    if renamed is not None and renamed[1] in changed_ids:
+        redrawn_ids.add(renamed[0])
+    new_rings = [rings[region_id - 1] for region_id in changed_ids]
+
+    pairs, lengths = [], []
+    if old_rings or new_rings:
+        window = ring_window(old_rings + new_rings, shape)
+        drawn = {neighbour + 1 for region_id in changed_ids for neighbour in seed_neighbours[region_id - 1]}
+        drawn |= set(changed_ids)
+        relabel_window(labels, {region_id: rings[region_id - 1] for region_id in drawn if region_id - 1 in rings}, redrawn_ids, window)
+
+        x0, y0, x1, y1 = ring_window(old_rings + new_rings, shape, margin=1)
+        window_pairs, window_lengths = land_adjacency(labels[y0:y1, x0:x1], land_mask[y0:y1, x0:x1])
+        keep = np.isin(window_pairs, list(changed_ids)).any(axis=1)
+        pairs.append(window_pairs[keep])
+        lengths.append(window_lengths[keep])
+
+    if renamed is not None and renamed[1] not in changed_ids and renamed[1] - 1 in rings:
+        old_id, new_id = renamed
+        x0, y0, x1, y1 = ring_window([rings[new_id - 1]], shape, margin=1)
+        # A lower id also loses shared border pixels to its higher neighbours
+        drawn = {neighbour + 1 for neighbour in seed_neighbours[new_id - 1]} | {new_id}
+        relabel_window(labels, {region_id: rings[region_id - 1] for region_id in drawn if region_id - 1 in rings}, renamed, (x0, y0, x1, y1))
+        window_pairs, window_lengths = land_adjacency(labels[y0:y1, x0:x1], land_mask[y0:y1, x0:x1])
+        keep = (window_pairs == new_id).any(axis=1) & ~np.isin(window_pairs, list(changed_ids)).any(axis=1)
+        pairs.append(window_pairs[keep])
+        lengths.append(window_lengths[keep])
+
+    pairs = np.concatenate(pairs) if pairs else np.empty((0, 2), dtype=np.int64)
+    lengths = np.concatenate(lengths) if lengths else np.empty(0)
+    return pairs, lengths
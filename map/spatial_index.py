@@ -0,0 +1,110 @@
+import logging
+import numpy as np
+import shapely
+from shapely.geometry import Polygon, box
+from database.topology import load_topology
+
+class RegionIndex:
+    """
+    STRtree-backed lookup of regions by point or rectangle.
+
+    Edited regions are kept in a small side list and checked directly until more
+    than rebuild_threshold of them accumulate, at which point the tree is rebuilt.
+    Region id 0 means "no region" in point query results.
+    """
+
+    def __init__(self, rings=None, rebuild_threshold=64):
+        self.rebuild_threshold = rebuild_threshold
+        self.geometries = {}
+        self.tree = None
+        self.tree_ids = np.empty(0, dtype=np.int64)
+        self.stale = np.empty(0, dtype=bool)
+        self.pending = {}
+        if rings:
+            self.geometries = {int(region_id): Polygon(coords) for region_id, coords in rings.items()}
+        self.rebuild()
+
+    @classmethod
+    def from_topology(cls, topology, **kwargs):
+        return cls(topology.region_rings(), **kwargs)
+
+    @classmethod
+    def from_db(cls, db_path, **kwargs):
+        topology = load_topology(db_path)
+        return cls(topology.region_rings() if topology is not None else None, **kwargs)
+
+    def rebuild(self):
+        self.tree_ids = np.array(sorted(self.geometries), dtype=np.int64)
+        self.tree = shapely.STRtree([self.geometries[region_id] for region_id in self.tree_ids])
+        self.stale = np.zeros(len(self.tree_ids), dtype=bool)
+        self.pending = {}
+        logging.debug(f"Rebuilt region index with {len(self.tree_ids)} regions.")
+
+    def _mark_stale(self, region_id):
+        position = np.searchsorted(self.tree_ids, region_id)
+        if position < len(self.tree_ids) and self.tree_ids[position] == region_id:
+            self.stale[position] = True
+
+    def update_region(self, region_id, coords):
+        self.update_regions({region_id: coords})
+
+    def update_regions(self, rings):
+        for region_id, coords in rings.items():
+            region_id = int(region_id)
+            polygon = Polygon(coords)
+            self.geometries[region_id] = polygon
+            self._mark_stale(region_id)
+            self.pending[region_id] = polygon
+        if len(self.pending) > self.rebuild_threshold:
+            self.rebuild()
+
+    def remove_region(self, region_id):
+        region_id = int(region_id)
+        self.geometries.pop(region_id, None)
+        self._mark_stale(region_id)
+        self.pending[region_id] = None
+
+    def query_points(self, points):
+        """
+        Return the region id containing each point.
+
+        Parameters:
+            points (array-like): (n, 2) map coordinates.
+
+        Returns:
+            ndarray: (n,) region ids, 0 where no region contains the point. Points on
+            a shared border resolve to the lowest region id.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        geometries = shapely.points(points)
+        no_match = np.iinfo(np.int64).max
+        result = np.full(len(points), no_match, dtype=np.int64)
+
+        if len(self.tree_ids):
+            point_index, tree_index = self.tree.query(geometries, predicate='intersects')
+            current = ~self.stale[tree_index]
+            np.minimum.at(result, point_index[current], self.tree_ids[tree_index[current]])
+
+        for region_id, polygon in self.pending.items():
+            if polygon is not None:
+                hits = shapely.intersects(polygon, geometries)
+                result[hits] = np.minimum(result[hits], region_id)
+
+        result[result == no_match] = 0
+        return result
+
+    def region_at(self, x, y):
+        return int(self.query_points([(x, y)])[0])
+
+    def query_rect(self, min_x, min_y, max_x, max_y):
+        """Return the sorted ids of regions intersecting an axis-aligned rectangle."""
+        rect = box(min_x, min_y, max_x, max_y)
+        region_ids = set()
+        if len(self.tree_ids):
+            tree_index = self.tree.query(rect, predicate='intersects')
+            tree_index = tree_index[~self.stale[tree_index]]
+            region_ids.update(self.tree_ids[tree_index].tolist())
+        for region_id, polygon in self.pending.items():
+            if polygon is not None and polygon.intersects(rect):
+                region_ids.add(region_id)
+        return sorted(region_ids)
@@ -0,0 +1,151 @@
+import os
+import glob
+import logging
+import numpy as np
+
+# pyarrow is only needed when a run history is written or read
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+FORMATS = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("Run history export needs pyarrow (pip install pyarrow)")
+
+def history_schema():
+    """Arrow schema of a run history: the tick plus every NODE_STATE_DTYPE field; 0 stands for no node."""
+    _require_pyarrow()
+    return pa.schema([
+        ('tick', pa.int64()),
+        ('node_id', pa.int64()),
+        ('current_level', pa.int64()),
+        ('current_experience', pa.int64()),
+        ('vassal_to', pa.int64()),
+        ('regent_to', pa.int64()),
+    ])
+
+class RunHistoryWriter:
+    """
+    Stream per-tick node states of a simulation run into columnar files.
+
+    Ticks are buffered and written as one row group (Parquet) or record batch
+    (Arrow IPC) at a time, and a new part file is started every ticks_per_file
+    ticks, so finished parts can be read while the run goes on. Arrow IPC parts,
+    the default, are uncompressed and read_run_history maps them without copying;
+    Parquet parts are Snappy-compressed, so they are smaller on disk but are
+    decoded into memory when read.
+
+    Parameters:
+        directory (str): Directory of the run; created when missing.
+        file_format (str, optional): 'arrow' or 'parquet'.
+        row_group_ticks (int, optional): Ticks buffered per row group.
+        ticks_per_file (int, optional): Ticks per part file.
+        changes_only (bool, optional): After the first tick, only write the
+            nodes whose state changed since the previous tick.
+    """
+
+    def __init__(self, directory, file_format='arrow', row_group_ticks=50, ticks_per_file=1000, changes_only=False):
+        _require_pyarrow()
+        if file_format not in FORMATS:
+            raise ValueError(f"Unknown run history format '{file_format}'")
+        self.directory = directory
+        self.file_format = file_format
+        self.row_group_ticks = row_group_ticks
+        self.ticks_per_file = ticks_per_file
+        self.changes_only = changes_only
+        self.schema = history_schema()
+        self._buffer = []
+        self._buffered_ticks = 0
+        self._first_tick = None
+        self._previous = None
+        self._writer = None
+        self._file_ticks = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def append(self, tick, states):
+        """Record the NODE_STATE_DTYPE records of one tick."""
+        rows = states
+        if self.changes_only and self._previous is not None and len(self._previous) == len(states):
+            rows = states[states != self._previous]
+        self._previous = states.copy()
+        if not self._buffer:
+            self._first_tick = tick
+        # Fields of a structured array are strided views; copy them into contiguous columns
+        columns = [np.full(len(rows), tick, dtype=np.int64)] + [np.ascontiguousarray(rows[name]) for name in self.schema.names[1:]]
+        self._buffer.append(pa.record_batch(columns, schema=self.schema))
+        self._buffered_ticks += 1
+        if self._buffered_ticks >= self.row_group_ticks:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered ticks as one row group."""
+        if not self._buffer:
+            return
+        if self._writer is None:
+            self._open(self._first_tick)
+        table = pa.Table.from_batches(self._buffer, schema=self.schema).combine_chunks()
+        if self.file_format == 'parquet':
+            self._writer.write_table(table, row_group_size=table.num_rows)
+        else:
+            for batch in table.to_batches():
+                self._writer.write_batch(batch)
+        self._file_ticks += self._buffered_ticks
+        self._buffer, self._buffered_ticks = [], 0
+        if self._file_ticks >= self.ticks_per_file:
+            self._close_file()
+
+    def _open(self, first_tick):
+        path = os.path.join(self.directory, f"part-{first_tick:08d}{FORMATS[self.file_format]}")
+        if self.file_format == 'parquet':
+            self._writer = pq.ParquetWriter(path, self.schema)
+        else:
+            self._writer = ipc.new_file(path, self.schema)
+        logging.debug(f"Writing run history to {path}")
+
+    def _close_file(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            self._file_ticks = 0
+
+    def close(self):
+        """Write the remaining ticks and finish the open part file."""
+        try:
+            self.flush()
+        finally:
+            self._close_file()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def read_run_history(directory):
+    """
+    Return the finished part files of a run as one Arrow table.
+
+    Files are memory-mapped, so Arrow IPC parts are read without copying while
+    compressed Parquet parts are decoded; call to_pandas() on the result for a
+    DataFrame.
+    """
+    _require_pyarrow()
+    parts = sorted(glob.glob(os.path.join(directory, 'part-*')))
+    tables = []
+    for path in parts:
+        try:
+            if path.endswith(FORMATS['parquet']):
+                tables.append(pq.read_table(path, memory_map=True))
+            else:
+                tables.append(ipc.open_file(pa.memory_map(path)).read_all())
+        except (pa.ArrowInvalid, OSError) as e:
+            # The part of a running simulation has no footer until it is finished
+            logging.info(f"Skipping unfinished run history part {path}: {e}")
+    if not tables:
+        return history_schema().empty_table()
+    return pa.concat_tables(tables)
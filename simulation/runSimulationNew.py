@@ -1,7 +1,14 @@
-import sqlite3
+import os
 import random
 import time
+import logging
+import numpy as np
 from config import Settings
+from database.migrations import migrate
+from database.connection import get_database
+from database.repository import load_world, write_current_node_states
+from database.replica import Replica
+from simulation.history import RunHistoryWriter
 
 class SimulationControl:
     def __init__(self):
@@ -14,102 +21,83 @@ class SimulationControl:
         self.paused = False
 
 def initialize_database(db_path):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+    # One schema_version lookup when the database is current
+    migrate(db_path)
 
-    # Add 'vassal_to' column if it doesn't exist
-    cursor.execute("SELECT name FROM pragma_table_info('nodes') WHERE name='vassal_to'")
-    if not cursor.fetchone():
-        cursor.execute('ALTER TABLE nodes ADD COLUMN vassal_to INTEGER DEFAULT NULL')
+def reset_simulation_data(db_path):
+    get_database(db_path).execute('UPDATE nodes SET current_level = 0, current_experience = 0, vassal_to = NULL, regent_to = NULL')
 
-    # Add 'regent_to' column if it doesn't exist
-    cursor.execute("SELECT name FROM pragma_table_info('nodes') WHERE name='regent_to'")
-    if not cursor.fetchone():
-        cursor.execute('ALTER TABLE nodes ADD COLUMN regent_to INTEGER DEFAULT NULL')
+# Neighbour levels a node of each level can take as a vassal
+VASSAL_LEVELS = {3: (1, 2), 4: (3,), 5: (3, 4), 6: (5,)}
 
-    conn.commit()
-    conn.close()
+def can_level_up(index, current_level, world):
+    return not (world.states['current_level'][world.neighbours(index)] == current_level + 1).any()
 
-def reset_simulation_data(db_path):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute('UPDATE nodes SET current_level = 0, current_experience = 0, vassal_to = NULL, regent_to = NULL')
-    conn.commit()
-    conn.close()
-
-def can_level_up(node_id, current_level, cursor):
-    cursor.execute('SELECT adjacent_regions FROM regions WHERE region_id = ?', (node_id,))
-    adjacent_regions = cursor.fetchone()[0]
-    adjacent_regions = list(map(int, adjacent_regions.strip('[]').split(', ')))
-
-    for region_id in adjacent_regions:
-        cursor.execute('SELECT current_level FROM nodes WHERE node_id = ?', (region_id,))
-        adjacent_level = cursor.fetchone()[0]
-        if adjacent_level == current_level + 1:
-            return False
-
-    return True
-
-def find_vassal(node_id, level, cursor):
-    cursor.execute('SELECT adjacent_regions FROM regions WHERE region_id = ?', (node_id,))
-    adjacent_regions = cursor.fetchone()[0]
-    adjacent_regions = list(map(int, adjacent_regions.strip('[]').split(', ')))
-
-    potential_vassals = []
-    for region_id in adjacent_regions:
-        cursor.execute('SELECT current_level FROM nodes WHERE node_id = ?', (region_id,))
-        adjacent_level = cursor.fetchone()[0]
-        if level == 3 and adjacent_level in [1, 2]:
-            potential_vassals.append((region_id, adjacent_level))
-        elif level == 4 and adjacent_level == 3:
-            potential_vassals.append((region_id, adjacent_level))
-        elif level == 5 and adjacent_level in [3, 4]:
-            potential_vassals.append((region_id, adjacent_level))
-        elif level == 6 and adjacent_level == 5:
-            potential_vassals.append((region_id, adjacent_level))
-
-    if potential_vassals:
+def find_vassal(index, level, world):
+    neighbours = world.neighbours(index)
+    levels = world.states['current_level'][neighbours]
+    potential = np.isin(levels, VASSAL_LEVELS.get(level, ()))
+    if potential.any():
         # Select the highest level vassal, or randomly if tied
-        max_level = max(potential_vassals, key=lambda x: x[1])[1]
-        highest_vassals = [v[0] for v in potential_vassals if v[1] == max_level]
-        return random.choice(highest_vassals)
+        highest_vassals = neighbours[potential & (levels == levels[potential].max())]
+        return random.choice(highest_vassals.tolist())
     return None
 
-def update_vassal_relationships(node_id, level, cursor):
-    vassal_id = find_vassal(node_id, level, cursor)
-    if vassal_id:
-        cursor.execute('UPDATE nodes SET vassal_to = ? WHERE node_id = ?', (node_id, vassal_id))
-        cursor.execute('UPDATE nodes SET regent_to = ? WHERE node_id = ?', (vassal_id, node_id))
-
-def simulate(control, db_path, allow_exp_banking, real_time=True):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    ERL = {0: 15, 1: 60, 2: 360, 3: 840, 4: 2520, 5: 5040}
-
-    while True:
+def update_vassal_relationships(index, level, world):
+    vassal = find_vassal(index, level, world)
+    if vassal is not None:
+        states = world.states
+        states['vassal_to'][vassal] = states['node_id'][index]
+        states['regent_to'][index] = states['node_id'][vassal]
+
+ERL = {0: 15, 1: 60, 2: 360, 3: 840, 4: 2520, 5: 5040}
+
+def simulate_tick(world, allow_exp_banking):
+    # Nodes are updated in id order and later nodes see the levels gained earlier in the tick
+    states = world.states
+    for index in range(len(world)):
+        level, experience = int(states['current_level'][index]), int(states['current_experience'][index])
+
+        exp_gain = random.randint(1, 6)
+        atrophy = random.randint(0, 3)
+        new_experience = experience + exp_gain - atrophy
+
+        if new_experience >= ERL.get(level, float('inf')):
+            if can_level_up(index, level, world):
+                level += 1
+                update_vassal_relationships(index, level, world)
+            elif not allow_exp_banking and level < 3:
+                new_experience = ERL[level] - 1
+
+        states['current_level'][index] = level
+        states['current_experience'][index] = new_experience
+
+def simulate(control, db_path, allow_exp_banking, real_time=True, history=None, max_ticks=None):
+    # The simulation owns the node states: they are read once and every tick is
+    # written back as one transaction on the shared writer, so GUI reads never wait on it.
+    # A RunHistoryWriter passed as history also receives the states of every tick.
+    # Runs until interrupted, or for max_ticks ticks.
+    database = get_database(db_path)
+    world = load_world(db_path)
+    if world is None:
+        return
+
+    tick = 0
+    while max_ticks is None or tick < max_ticks:
         while control.paused:
             time.sleep(1)
 
-        for node_id in range(1, 101):
-            cursor.execute('SELECT current_level, current_experience FROM nodes WHERE node_id = ?', (node_id,))
-            level, experience = cursor.fetchone()
-
-            exp_gain = random.randint(1, 6)
-            atrophy = random.randint(0, 3)
-            new_experience = experience + exp_gain - atrophy
-
-            if new_experience >= ERL.get(level, float('inf')):
-                if can_level_up(node_id, level, cursor):
-                    level += 1
-                    update_vassal_relationships(node_id, level, cursor)
-                elif not allow_exp_banking and level < 3:
-                    new_experience = ERL[level] - 1
-
-            cursor.execute('UPDATE nodes SET current_level = ?, current_experience = ? WHERE node_id = ?',
-                           (level, new_experience, node_id))
-
-        conn.commit()
+        simulate_tick(world, allow_exp_banking)
+        tick += 1
+        if not database.write(write_current_node_states, world.states):
+            # A seed edit removed or renumbered nodes; continue from the stored states
+            logging.info("Node ids changed during the simulation; reloading the world.")
+            world = load_world(db_path)
+            if world is None:
+                return
+            continue
+        if history is not None:
+            history.append(tick, world.states)
 
         if real_time:
             time.sleep(3600)
@@ -122,7 +110,29 @@ if __name__ == "__main__":
     db_path = settings.get('db_path')
     control = SimulationControl()
     initialize_database(db_path)  # Ensure the database is properly initialized
-    reset_simulation_data(db_path)
 
+    # Headless runs work on an in-memory replica and write it back to disk on exit
+    replica = Replica(db_path)
+    # Zero the node states once; later runs restore this checkpoint instead of updating every node
+    reset_simulation_data(replica.db_path)
+    replica.checkpoint()
+    # Per-tick node states are exported when history_dir is set in the config;
+    # several runs of 'ticks' ticks each are made when 'runs' is set
+    history_dir = settings.get('history_dir')
+    runs, ticks = settings.get('runs', 1), settings.get('ticks')
     allow_exp_banking = True  # or False based on user input
-    simulate(control, db_path, allow_exp_banking, real_time=False)
+    history = None
+    try:
+        for run in range(runs):
+            if run:
+                replica.reset()
+            history = RunHistoryWriter(os.path.join(history_dir, f"run-{time.strftime('%Y%m%d-%H%M%S')}-{run + 1}")) if history_dir else None
+            simulate(control, replica.db_path, allow_exp_banking, real_time=False, history=history, max_ticks=ticks)
+            if history is not None:
+                history.close()
+                history = None
+    finally:
+        if history is not None:
+            history.close()
+        replica.snapshot()
+        replica.close()
@@ -0,0 +1,45 @@
+import os
+import sys
+import sqlite3
+import numpy as np
+import pytest
+from PIL import Image
+
+# Tests import the packages from the repository root, like the scripts do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from map.createNodes import VoronoiMap
+from database.connection import close_database
+
+def canonical(topology):
+    """Rings starting at their smallest vertex and border lengths, independent of vertex and edge ids."""
+    rings = {}
+    for region_id, ring in topology.region_rings().items():
+        points = [tuple(point) for point in np.round(ring[:-1], 6).tolist()]
+        start = points.index(min(points))
+        rings[region_id] = points[start:] + points[:start]
+    borders = {pair: round(length, 6) for pair, length in topology.border_lengths().items()}
+    return rings, borders, len(topology.vertices), len(topology.edges)
+
+@pytest.fixture
+def voronoi_map(tmp_path):
+    land = np.zeros((240, 320, 4), dtype=np.uint8)
+    yy, xx = np.mgrid[:240, :320]
+    land[..., 3] = np.where(((xx - 150) / 130.0) ** 2 + ((yy - 120) / 100.0) ** 2 <= 1, 255, 0)
+    image_path = str(tmp_path / 'map.png')
+    Image.fromarray(land).save(image_path)
+    db_path = str(tmp_path / 'map.db')
+
+    voronoi_map = VoronoiMap(image_path, db_path, str(tmp_path / 'map.log'), None)
+    voronoi_map.seed = 5
+    voronoi_map.num_points = 30
+    voronoi_map.num_iterations = 2
+    voronoi_map.setup_regions_table()
+    voronoi_map.run_voronoi_process()
+    voronoi_map.store_voronoi_regions_to_db()
+    voronoi_map.validate_and_correct_adjacency()
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany('INSERT INTO nodes (node_id, current_level, current_experience) VALUES (?, ?, ?)',
+                         [(node_id, node_id, 10 * node_id) for node_id in range(1, 31)])
+        conn.execute('UPDATE nodes SET vassal_to = 30 WHERE node_id = 1')
+    yield voronoi_map
+    close_database(db_path)
@@ -0,0 +1,43 @@
+import struct
+import numpy as np
+import pytest
+from PIL import Image
+from map.bitmask import PackedMask
+
+def land_image():
+    rgba = np.zeros((70, 90, 4), dtype=np.uint8)
+    rgba[..., :3] = (40, 120, 60)
+    yy, xx = np.mgrid[:70, :90]
+    rgba[..., 3] = np.where(((xx - 40) / 30.0) ** 2 + ((yy - 35) / 25.0) ** 2 <= 1, 255, 0)
+    rgba[5:9, 70:85, 3] = 128
+    return rgba
+
+def save_bmp_with_alpha(rgba, path):
+    # PIL writes RGBA as 32-bit BMP without an alpha mask, so write a V4 header with one
+    height, width = rgba.shape[:2]
+    pixels = rgba[::-1][..., [2, 1, 0, 3]].tobytes()
+    header = struct.pack('<IiiHHIIiiII4I', 108, width, height, 1, 32, 3, len(pixels), 2835, 2835, 0, 0,
+                         0x00FF0000, 0x0000FF00, 0x000000FF, 0xFF000000) + b'\0' * 52
+    with open(path, 'wb') as file:
+        file.write(b'BM' + struct.pack('<IHHI', 14 + len(header) + len(pixels), 0, 0, 14 + len(header)) + header + pixels)
+
+@pytest.mark.parametrize('name, options', [
+    ('map.png', {}),
+    ('map.tif', {}),
+    ('lzw.tif', {'compression': 'tiff_lzw'}),
+    ('map.bmp', None),
+    ('map.webp', {'lossless': True}),
+])
+def test_formats_round_trip_to_the_alpha_mask(tmp_path, name, options):
+    rgba = land_image()
+    image_path = str(tmp_path / name)
+    if options is None:
+        save_bmp_with_alpha(rgba, image_path)
+    else:
+        Image.fromarray(rgba).save(image_path, **options)
+    with Image.open(image_path) as image:
+        assert image.mode == 'RGBA'
+
+    mask = PackedMask.from_image(image_path, str(tmp_path / 'mask.npy'), strip_rows=16)
+    assert np.array_equal(np.asarray(mask), rgba[..., 3] != 0)
+    assert not (tmp_path / 'mask.npy.decoded').exists()
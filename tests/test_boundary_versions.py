@@ -0,0 +1,52 @@
+import sqlite3
+import numpy as np
+from conftest import canonical
+from database.boundaries import ROOT_VERSION, save_boundary_version, checkout_boundary_version, list_boundary_versions, load_boundary_version
+from database.lod import load_lod, simplify_topology
+from database.topology import build_topology, load_topology
+
+def move_vertex(db_path, name, offset):
+    """Save a version that moves the first inland vertex where three regions meet."""
+    topology = load_topology(db_path)
+    for vertex_id in range(len(topology.vertices)):
+        incident = (topology.edges == vertex_id).any(axis=1)
+        touching = set(topology.left_region[incident].tolist()) | set(topology.right_region[incident].tolist())
+        if len(touching) >= 3 and 0 not in touching:
+            break
+    x, y = topology.vertices[vertex_id] + offset
+    name, changed = save_boundary_version(db_path, [(vertex_id, x, y)], name)
+    assert set(changed) == touching
+    return name, changed
+
+def assert_matches_full_rebuild(db_path):
+    full = build_topology(load_boundary_version(db_path))
+    assert canonical(load_topology(db_path)) == canonical(full)
+    _, levels = load_lod(db_path)
+    expected = simplify_topology(full)
+    for lod, rings in expected.items():
+        assert sorted(levels[lod]) == sorted(rings)
+        for region_id, ring in rings.items():
+            assert np.allclose(levels[lod][region_id], ring)
+
+def test_checkout_patches_the_changed_regions_like_a_full_rebuild(voronoi_map):
+    db_path = voronoi_map.db_path
+    name, changed = move_vertex(db_path, 'moved', (2.5, -1.5))
+    assert name == 'moved' and len(changed) >= 3
+
+    assert checkout_boundary_version(db_path, ROOT_VERSION) == changed
+    assert_matches_full_rebuild(db_path)
+    assert checkout_boundary_version(db_path, 'moved') == changed
+    assert_matches_full_rebuild(db_path)
+
+def test_seed_edit_drops_the_boundary_versions(voronoi_map):
+    move_vertex(voronoi_map.db_path, 'moved', (2.0, 2.0))
+    assert [version['name'] for version in list_boundary_versions(voronoi_map.db_path)] == [ROOT_VERSION, 'moved']
+    voronoi_map.ensure_seed_state()
+    voronoi_map.move_seed(3, *(voronoi_map.generators[2] + (4.0, -3.0)))
+    assert list_boundary_versions(voronoi_map.db_path) == []
+
+def test_region_rows_hold_no_outlines(voronoi_map):
+    # The topology is the only stored copy of the current boundaries
+    move_vertex(voronoi_map.db_path, 'moved', (1.5, 1.0))
+    with sqlite3.connect(voronoi_map.db_path) as conn:
+        assert conn.execute('SELECT COUNT(*) FROM regions WHERE geometry IS NOT NULL').fetchone()[0] == 0
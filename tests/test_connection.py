@@ -0,0 +1,31 @@
+import sqlite3
+import threading
+import pytest
+from database.connection import Database
+
+def test_close_does_not_wait_for_readers_lent_to_other_threads(tmp_path):
+    database = Database(str(tmp_path / 'test.db'), pool_size=1)
+    database.execute('CREATE TABLE t (a INTEGER)')
+    held, release = threading.Event(), threading.Event()
+
+    def read():
+        with database.read() as conn:
+            conn.execute('SELECT COUNT(*) FROM t').fetchone()
+            held.set()
+            release.wait()
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    held.wait()
+    closer = threading.Thread(target=database.close)
+    closer.start()
+    closer.join(timeout=5)
+    assert not closer.is_alive()
+    with pytest.raises(sqlite3.ProgrammingError):
+        with database.read():
+            pass
+
+    release.set()
+    reader.join()
+    # The lent reader is closed when it comes back
+    assert database._opened == 0
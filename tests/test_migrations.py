@@ -0,0 +1,33 @@
+import os
+import shutil
+import sqlite3
+from database.migrations import SCHEMA_VERSION, migrate, schema_version
+
+BASELINE_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'database', 'nodes.db')
+
+def snapshot(db_path):
+    """Schema and row counts of every table."""
+    with sqlite3.connect(db_path) as conn:
+        tables = conn.execute("SELECT name, sql FROM sqlite_master WHERE type IN ('table', 'index') ORDER BY name").fetchall()
+        counts = {name: conn.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0]
+                  for name, sql in tables if sql and sql.startswith('CREATE TABLE')}
+    return tables, counts
+
+def test_baseline_database_migrates_to_current_version_once(tmp_path):
+    db_path = str(tmp_path / 'nodes.db')
+    shutil.copyfile(BASELINE_DB, db_path)
+    assert schema_version(db_path) == 0
+    with sqlite3.connect(db_path) as conn:
+        nodes_before = conn.execute('SELECT node_id, current_level, current_experience FROM nodes ORDER BY node_id').fetchall()
+
+    assert migrate(db_path) == SCHEMA_VERSION == 8
+    with sqlite3.connect(db_path) as conn:
+        assert [row[0] for row in conn.execute('SELECT version FROM schema_version ORDER BY version')] == list(range(1, 9))
+        assert conn.execute('SELECT node_id, current_level, current_experience FROM nodes ORDER BY node_id').fetchall() == nodes_before
+        columns = {row[1] for row in conn.execute("PRAGMA table_info('nodes')")}
+        assert {'x_coordinate', 'y_coordinate', 'vassal_to', 'regent_to'} <= columns
+        assert conn.execute('SELECT COUNT(*) FROM region_adjacency').fetchone()[0] > 0
+    migrated = snapshot(db_path)
+
+    assert migrate(db_path) == SCHEMA_VERSION
+    assert snapshot(db_path) == migrated
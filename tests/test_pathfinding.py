@@ -0,0 +1,17 @@
+import numpy as np
+from map.pathfinding import Pathfinder
+
+def test_square_k_nearest_table_is_not_read_as_dense(voronoi_map):
+    dense, _ = voronoi_map.build_travel_costs()
+    dense = np.array(dense)
+    num_nodes = len(voronoi_map.points)
+    voronoi_map.travel_cost_k = num_nodes
+    costs, neighbours = voronoi_map.build_travel_costs()
+    assert costs.shape == dense.shape and neighbours is not None
+
+    pathfinder = Pathfinder.from_voronoi_map(voronoi_map)
+    assert pathfinder.travel_neighbours is not None
+    pairs = [(from_id, to_id) for from_id in range(1, num_nodes + 1) for to_id in range(1, num_nodes + 1)]
+    expected = dense[[from_id - 1 for from_id, _ in pairs], [to_id - 1 for _, to_id in pairs]]
+    assert np.allclose(pathfinder.route_costs(pairs), expected)
+    assert pathfinder.travel_cost(2, 7) == dense[1, 6]
@@ -0,0 +1,37 @@
+import sqlite3
+import numpy as np
+from conftest import canonical
+from database.adjacency import load_adjacency
+from database.topology import build_topology, load_topology
+
+def assert_matches_full_rebuild(voronoi_map):
+    full = build_topology({index + 1: ring for index, ring in voronoi_map.regions_to_store.items()})
+    assert canonical(voronoi_map.topology) == canonical(full)
+    assert canonical(load_topology(voronoi_map.db_path)) == canonical(full)
+    pairs, lengths = load_adjacency(voronoi_map.db_path)
+    stored = {tuple(pair): round(length, 6) for pair, length in zip(pairs.astype(int).tolist(), lengths.tolist())}
+    assert stored == canonical(full)[1]
+
+def test_seed_edits_match_full_rebuild(voronoi_map):
+    voronoi_map.ensure_seed_state()
+    rng = np.random.default_rng(2)
+    for step in range(9):
+        if step % 3 == 0:
+            region_id = int(rng.integers(1, len(voronoi_map.generators) + 1))
+            x, y = voronoi_map.generators[region_id - 1] + rng.normal(0, 15, 2)
+            voronoi_map.move_seed(region_id, x, y)
+        elif step % 3 == 1:
+            voronoi_map.add_seed(*rng.uniform((40, 40), (280, 200)))
+        else:
+            voronoi_map.remove_seed(int(rng.integers(1, len(voronoi_map.generators) + 1)))
+        assert_matches_full_rebuild(voronoi_map)
+
+def test_remove_seed_moves_the_last_node_into_the_freed_id(voronoi_map):
+    voronoi_map.remove_seed(1)
+    with sqlite3.connect(voronoi_map.db_path) as conn:
+        nodes = {row[0]: row[1:] for row in conn.execute('SELECT node_id, current_level, current_experience, vassal_to FROM nodes')}
+        mapping = conn.execute('SELECT COUNT(*) FROM node_region_mapping').fetchone()[0]
+    assert sorted(nodes) == list(range(1, 30))
+    # Node 30 now lives in id 1; the link from the removed node 1 went with it
+    assert nodes[1] == (30, 300, None)
+    assert mapping == 29